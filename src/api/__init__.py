@@ -4,13 +4,75 @@
 # @Email :
 # @Desc :
 
+import threading
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from loguru import logger
 from starlette.middleware.cors import CORSMiddleware
 
 from .view import router
+from ..core.metrics import registry, REQUEST_LATENCY
+from ..core.presido import pii_engine
+
+
+class MetricsMiddleware:
+    """
+    纯 ASGI 中间件记录每个请求的耗时，endpoint 取路由处理函数名（路径参数不会产生新的标签值），未匹配的路由归为 unmatched
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            endpoint = getattr(scope.get('endpoint'), '__name__', 'unmatched')
+            REQUEST_LATENCY.observe(time.perf_counter() - start, scope['method'], endpoint, str(status[0]))
 
 
-app = FastAPI()
+def warmup():
+    stats = pii_engine.warmup()
+    logger.info(f"engine ready: import {stats['import_seconds']:.2f}s, warmup {stats['warmup_seconds']:.2f}s, "
+                f"time to ready {stats['ready_seconds']:.2f}s, models {pii_engine.loaded_languages()}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if pii_engine.ready.is_set():
+        # 生产模式：master 在 fork 前已完成预热，worker 中 fork 的长文档进程共享 master 加载的模型
+        pii_engine.start_long_doc_pool()
+    elif pii_engine.long_doc_pool_enabled():
+        # 长文档进程须在模型加载之后、引擎线程池创建任何线程之前 fork，才能共享模型：
+        # 先同步预热再 fork，预热完成后才开始接受请求
+        warmup()
+        pii_engine.start_long_doc_pool()
+    else:
+        # 预热在后台进行，期间 /pii/health/live 可用、/pii/health/ready 返回 503
+        threading.Thread(target=warmup, name='pii-warmup', daemon=True).start()
+    # 多进程模式下定期写入本 worker 的指标快照
+    registry.start_flusher()
+    yield
+    pii_engine.shutdown_long_doc_pool()
+    registry.dump()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=['*'],
@@ -20,4 +82,13 @@ app.add_middleware(
 )
 
 
+app.add_middleware(MetricsMiddleware)
+
+
 app.include_router(router, prefix="/pii")
+
+
+@app.get('/metrics', include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition format"""
+    return PlainTextResponse(registry.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/18 14:20
+# @Author : ltm
+# @Email :
+# @Desc : 引擎计算（spaCy、正则）专用的有界线程池，队列满时直接拒绝，避免突发流量下所有请求一起变慢
+
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Tuple
+
+
+class ExecutorBusyError(Exception):
+    """排队请求数达到上限"""
+
+
+class BoundedExecutor:
+    """
+    max_workers 个线程执行引擎任务，最多再排队 max_queue_depth 个，超出时 run 抛 ExecutorBusyError。
+    计数只在事件循环线程里修改，不需要加锁
+    """
+
+    def __init__(self, max_workers: int, max_queue_depth: int):
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        # 线程在首次提交任务时才创建，预加载后 fork 的 worker 不会继承 master 的线程
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pii-engine')
+        self._in_flight = 0
+        self._rejected = 0
+        self._completed = 0
+        self._wait_total = 0.
+        self._wait_max = 0.
+
+    @property
+    def queued(self) -> int:
+        return max(self._in_flight - self.max_workers, 0)
+
+    @property
+    def full(self) -> bool:
+        return self._in_flight >= self.max_workers + self.max_queue_depth
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Tuple[Any, float]:
+        """
+        在线程池中执行 fn
+        Returns: (fn 的返回值, 排队等待秒数)
+        """
+        if self.full:
+            self._rejected += 1
+            raise ExecutorBusyError(f'engine queue is full ({self.max_queue_depth} waiting), retry later')
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(self._timed_call, time.perf_counter(), fn, args, kwargs)
+            result, wait = await loop.run_in_executor(self._executor, call)
+        finally:
+            self._in_flight -= 1
+
+        self._completed += 1
+        self._wait_total += wait
+        self._wait_max = max(self._wait_max, wait)
+        return result, wait
+
+    @staticmethod
+    def _timed_call(submitted: float, fn: Callable, args: tuple, kwargs: dict) -> Tuple[Any, float]:
+        wait = time.perf_counter() - submitted
+        return fn(*args, **kwargs), wait
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.max_workers,
+            'max_queue_depth': self.max_queue_depth,
+            'in_flight': self._in_flight,
+            'queued': self.queued,
+            'completed': self._completed,
+            'rejected': self._rejected,
+            'queue_wait_avg_ms': round(self._wait_total / self._completed * 1000, 3) if self._completed else 0.,
+            'queue_wait_max_ms': round(self._wait_max * 1000, 3),
+        }
+
+
+# 满载时返回的 HTTP 状态码，429 或 503
+OVERLOAD_STATUS = int(os.getenv('PII_OVERLOAD_STATUS', 503))
+
+engine_executor = BoundedExecutor(
+    max_workers=int(os.getenv('PII_EXECUTOR_WORKERS', min(4, os.cpu_count() or 1))),
+    max_queue_depth=int(os.getenv('PII_MAX_QUEUE_DEPTH', 64)),
+)
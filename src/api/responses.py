@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/18 23:50
+# @Author : ltm
+# @Email :
+# @Desc : 响应编码：engine 输出已是普通 dict / list，直接用 orjson 编码为 bytes，不再经过 pydantic 或标准库 json
+
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时使用标准库 json
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+
+def dumps_line(content: Any) -> bytes:
+    """NDJSON 的一行"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_APPEND_NEWLINE)
+    return dumps(content) + b'\n'
+
+
+class FastJSONResponse(JSONResponse):
+    """与 JSONResponse 相同的输出，编码快数倍"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -16,6 +16,11 @@ class Lang(str, Enum):
     zh = "zh"
 
 
+class ResultFormat(str, Enum):
+    records = "records"
+    columnar = "columnar"
+
+
 class AnalyzeResult(BaseModel):
     entity_type: str
     start: int
@@ -38,6 +43,22 @@ class AnalyzeModel(BaseModel):
     with_anonymize: Optional[bool] = False
     llm_synthesize: Optional[bool] = False
     anonymize_operators: Optional[List[OperatorConf]] = None
+    tenant: Optional[str] = None
+    format: ResultFormat = Field(ResultFormat.records, description="columnar 时 analyze 为并列数组：entity_types 码表，"
+                                                                    "entity_type 为码表下标，start / end / score")
+
+
+class AnalyzeBatchModel(BaseModel):
+    texts: List[str]
+    lang: Lang = Lang.zh
+    entities: Optional[List[str]] = None
+    score_threshold: Optional[float] = 0
+    allow_list: Optional[List[str]] = None
+    batch_size: Optional[int] = Field(None, description="spaCy nlp.pipe batch size")
+    with_anonymize: Optional[bool] = False
+    llm_synthesize: Optional[bool] = False
+    anonymize_operators: Optional[List[OperatorConf]] = None
+    tenant: Optional[str] = None
 
 
 class Pattern(BaseModel):
@@ -53,6 +74,11 @@ class CustomAnalyzeModel(BaseModel):
     context: Optional[List[str]] = None
 
 
+class CustomRecognizerModel(CustomAnalyzeModel):
+    """持久化的命名自定义 recognizer，analyze 时与内置实体一起识别"""
+    lang: Lang = Lang.zh
+
+
 class CustomAnalyze(BaseModel):
     text: str
     lang: Lang
@@ -61,6 +87,7 @@ class CustomAnalyze(BaseModel):
     llm_synthesize: Optional[bool] = False
     anonymize_operators: Optional[List[OperatorConf]] = None
     allow_list: Optional[List[str]] = None
+    tenant: Optional[str] = None
 
 
 class OpenAIModel(str, Enum):
@@ -73,6 +100,13 @@ class AnonymizeModel(BaseModel):
     analyzer_results: List[AnalyzeResult]
     llm_synthesize: Optional[bool] = False
     operators: Optional[List[OperatorConf]] = None
+    tenant: Optional[str] = Field(None, description="假名库租户，同一原值总是替换为同一假数据，可用 /pii/deanonymize 还原")
+
+
+class DeanonymizeModel(BaseModel):
+    texts: List[str] = Field(..., description="含假数据的文本，如 LLM 的回复")
+    tenant: Optional[str] = Field(None, description="假名库租户，与 anonymize 时一致")
+    pseudonyms: Optional[List[str]] = Field(None, description="anonymize 返回的替换值，给出时返回未能还原的个数 unrestored")
 
 # 在 schema.py 中添加以下模型定义
 
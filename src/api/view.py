@@ -1,14 +1,21 @@
+import asyncio
+import codecs
 import json  # 在顶部导入
-import logging
 import os
 from fastapi import APIRouter, File, UploadFile, Form
-from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse
 from loguru import logger
-from pydantic import Field
 from typing import Dict, List, Optional
 
-from .schema import AnonymizeModel, AnalyzeModel, AnalyzeResult, OperatorConf, CustomAnalyze, FileAnalyzeModel, Lang
+from .executor import engine_executor, ExecutorBusyError, OVERLOAD_STATUS
+from .responses import FastJSONResponse, dumps_line
+from .schema import AnonymizeModel, AnalyzeModel, AnalyzeBatchModel, OperatorConf, CustomAnalyze, FileAnalyzeModel, Lang, \
+  DeanonymizeModel, ResultFormat, CustomRecognizerModel
+from ..core.custom_registry import definition_from_model
+from ..core.doc_context import DocContext
 from ..core.presido import pii_engine
+from ..core.streaming import WindowStream, sniff_encoding, SNIFF_SIZE, STREAM_READ_SIZE
+from ..core.vault import DEANONYMIZE_ENABLED
 
 router = APIRouter()
 
@@ -18,84 +25,267 @@ def validate_open_key(llm_synthesize=False):
     raise ValueError('OPENAI_API_KEY not configured, can not use llm_synthesize')
 
 
+async def run_in_engine(fn, *args):
+  """run a sync handler on the bounded engine executor, shed load when its queue is full"""
+  try:
+    response, queue_wait = await engine_executor.run(fn, *args)
+  except ExecutorBusyError as e:
+    logger.warning(f"{fn.__name__} rejected: {e}")
+    return FastJSONResponse(status_code=OVERLOAD_STATUS, headers={'Retry-After': '1'},
+                        content={'code': OVERLOAD_STATUS, 'message': str(e), 'data': []})
+
+  response.headers['X-Queue-Wait-Ms'] = f'{queue_wait * 1000:.1f}'
+  return response
+
+
+async def run_engine_step(fn, *args):
+  """one step of a streaming response, waits for a free slot instead of failing half way through the response"""
+  while True:
+    try:
+      result, _ = await engine_executor.run(fn, *args)
+      return result
+    except ExecutorBusyError:
+      await asyncio.sleep(0.05)
+
+
 @router.get('/supported_entities/{language}')
-def supported_entities(language: str):
+async def supported_entities(language: str):
   """Return a list of supported entities."""
+  return await run_in_engine(_supported_entities, language)
+
+
+def _supported_entities(language: str):
+  # 会重新加载有变化的自定义 recognizer，不在事件循环上执行
   try:
     entities_list = pii_engine.get_supported_entities(language)
   except Exception as e:
     msg = f"get_supported_entities {language} catch error: {e}"
     logger.exception(msg)
-    return JSONResponse(content={'code': 500, 'message': msg, 'data': []})
+    return FastJSONResponse(content={'code': 500, 'message': msg, 'data': []})
 
-  return JSONResponse(content={'code': 200, 'message': 'ok', 'data': entities_list})
+  return FastJSONResponse(content={'code': 200, 'message': 'ok', 'data': entities_list})
 
 
 @router.get('/supported_anonymizers')
-def supported_anonymizers():
+async def supported_anonymizers():
   try:
     operators = pii_engine.get_supported_anonymizers()
   except Exception as e:
     msg = f"get_supported_anonymizers error: {e}"
     logger.exception(msg)
-    return JSONResponse(content={'code': 500, 'message': msg, 'data': []})
+    return FastJSONResponse(content={'code': 500, 'message': msg, 'data': []})
+
+  return FastJSONResponse(content={'code': 200, 'message': 'ok', 'data': operators})
+
 
-  return JSONResponse(content={'code': 200, 'message': 'ok', 'data': operators})
+@router.get('/executor_stats')
+async def executor_stats():
+  """engine executor queue depth and queue wait time"""
+  return FastJSONResponse(content={'code': 200, 'message': 'ok', 'data': engine_executor.stats()})
+
+
+@router.get('/cache_stats')
+async def cache_stats():
+  """analysis result cache and custom analyzer cache hit / miss counters"""
+  return FastJSONResponse(content={'code': 200, 'message': 'ok', 'data': pii_engine.cache_stats()})
+
+
+@router.get('/health/live')
+async def health_live():
+  """liveness probe, the process is up and serving"""
+  return FastJSONResponse(content={'code': 200, 'message': 'ok', 'data': []})
+
+
+@router.get('/health/ready')
+async def health_ready():
+  """readiness probe, 503 until the engine warmup is done"""
+  data = dict(pii_engine.startup_stats, languages=pii_engine.loaded_languages())
+  if not pii_engine.ready.is_set():
+    return FastJSONResponse(status_code=503, content={'code': 503, 'message': 'warming up', 'data': data})
+  return FastJSONResponse(content={'code': 200, 'message': 'ok', 'data': data})
 
 
 @router.post('/anonymize')
-def anonymize(item: AnonymizeModel):
+async def anonymize(item: AnonymizeModel):
+  return await run_in_engine(_anonymize, item)
+
+
+def _anonymize(item: AnonymizeModel):
   try:
     validate_open_key(item.llm_synthesize)
-    result = pii_engine.anonymize(item.text, item.analyzer_results, item.llm_synthesize, item.operators)
+    result = pii_engine.anonymize(item.text, item.analyzer_results, item.llm_synthesize, item.operators,
+                                  tenant=item.tenant)
   except Exception as e:
     msg = f"anonymize error: {e}"
     logger.exception(msg)
-    return JSONResponse(content={'code': 500, 'message': msg, 'data': []})
+    return FastJSONResponse(content={'code': 500, 'message': msg, 'data': []})
+
+  return FastJSONResponse(content={'code': 200, 'message': 'ok', 'data': result})
+
 
-  return JSONResponse(content={'code': 200, 'message': 'ok', 'data': result})
+@router.post('/deanonymize')
+async def deanonymize(item: DeanonymizeModel):
+  return await run_in_engine(_deanonymize, item)
+
+
+def _deanonymize(item: DeanonymizeModel):
+  """restore the tenant's pseudonyms in texts (e.g. LLM responses) to the original values"""
+  if not DEANONYMIZE_ENABLED:
+    return FastJSONResponse(status_code=403, content={'code': 403, 'data': [],
+                                                      'message': 'deanonymize is disabled, set PII_DEANONYMIZE_ENABLED=1'})
+  try:
+    result = pii_engine.deanonymize(item.texts, item.tenant, item.pseudonyms)
+  except Exception as e:
+    msg = f"deanonymize error: {e}"
+    logger.exception(msg)
+    return FastJSONResponse(content={'code': 500, 'message': msg, 'data': []})
+
+  return FastJSONResponse(content={'code': 200, 'message': 'ok', 'data': result})
 
 
 @router.post('/analyze')
-def analyze(item: AnalyzeModel):
+async def analyze(item: AnalyzeModel):
+  return await run_in_engine(_analyze, item)
+
+
+def _analyze(item: AnalyzeModel):
   result = {"analyze": [], "anonymize": []}
   try:
     validate_open_key(item.llm_synthesize)
-    result_analyze = pii_engine.analyze(item.text, item.lang, item.entities, item.score_threshold, item.allow_list)
+    # 同一请求内 analyze 解析出的文档供 anonymize / llm 合成复用
+    ctx = DocContext(item.text, item.lang) if item.with_anonymize else None
+    result_analyze = pii_engine.analyze(item.text, item.lang, item.entities, item.score_threshold, item.allow_list,
+                                        ctx=ctx, result_format=item.format.value)
     if item.with_anonymize:
-      analyzer_results = [[AnalyzeResult(entity_type=r['entity_type'], start=r['start'], end=r['end'], score=r['score'])] for r in result_analyze]
-      result_anonymize = pii_engine.anonymize(item.text, analyzer_results, item.llm_synthesize, item.anonymize_operators)
+      # engine 输出直接传给 anonymize，不再逐个构造 pydantic 对象
+      result_anonymize = pii_engine.anonymize(item.text, result_analyze, item.llm_synthesize, item.anonymize_operators,
+                                              ctx=ctx, tenant=item.tenant)
       result["anonymize"] = result_anonymize
-    result["analyze"] = result_analyze
+    # columnar 结果在输出时才转换为并列数组
+    result["analyze"] = result_analyze.to_columns() if item.format == ResultFormat.columnar else result_analyze
   except Exception as e:
     msg = f"analyze error: {e}"
     logger.exception(msg)
-    return JSONResponse(content={'code': 500, 'message': msg, 'data': result})
+    return FastJSONResponse(content={'code': 500, 'message': msg, 'data': result})
+
+  return FastJSONResponse(content={'code': 200, 'message': 'ok', 'data': result})
+
+
+@router.post('/analyze_batch')
+async def analyze_batch(item: AnalyzeBatchModel):
+  return await run_in_engine(_analyze_batch, item)
+
+
+def _analyze_batch(item: AnalyzeBatchModel):
+  result = []
+  try:
+    validate_open_key(item.llm_synthesize)
+    results_analyze = pii_engine.analyze_batch(item.texts, item.lang, item.entities, item.score_threshold,
+                                               item.allow_list, item.batch_size)
+    for text, result_analyze in zip(item.texts, results_analyze):
+      result_anonymize = []
+      if item.with_anonymize:
+        result_anonymize = pii_engine.anonymize(text, result_analyze, item.llm_synthesize,
+                                                item.anonymize_operators, tenant=item.tenant)
+      result.append({"analyze": result_analyze, "anonymize": result_anonymize})
+  except Exception as e:
+    msg = f"analyze_batch error: {e}"
+    logger.exception(msg)
+    return FastJSONResponse(content={'code': 500, 'message': msg, 'data': []})
 
-  return JSONResponse(content={'code': 200, 'message': 'ok', 'data': result})
+  return FastJSONResponse(content={'code': 200, 'message': 'ok', 'data': result})
 
 
 @router.post('/custom_analyze')
-def custom_analyze(item: CustomAnalyze):
+async def custom_analyze(item: CustomAnalyze):
+  return await run_in_engine(_custom_analyze, item)
+
+
+def _custom_analyze(item: CustomAnalyze):
   result = {"analyze": [], "anonymize": []}
   try:
     validate_open_key(item.llm_synthesize)
-    result_analyze = pii_engine.custom_analyze(item.text, item.lang, item.entities, item.allow_list)
+    ctx = DocContext(item.text, item.lang) if item.with_anonymize else None
+    result_analyze = pii_engine.custom_analyze(item.text, item.lang, item.entities, item.allow_list, ctx=ctx)
     if item.with_anonymize:
-      analyzer_results = [[AnalyzeResult(entity_type=r['entity_type'], start=r['start'], end=r['end'], score=r['score'])] for r in result_analyze]
-      result_anonymize = pii_engine.anonymize(item.text, analyzer_results, item.llm_synthesize, item.anonymize_operators)
+      result_anonymize = pii_engine.anonymize(item.text, result_analyze, item.llm_synthesize, item.anonymize_operators,
+                                              ctx=ctx, tenant=item.tenant)
       result["anonymize"] = result_anonymize
     result["analyze"] = result_analyze
   except Exception as e:
     msg = f"analyze error: {e}"
     logger.exception(msg)
-    return JSONResponse(content={'code': 500, 'message': msg, 'data': result})
+    return FastJSONResponse(content={'code': 500, 'message': msg, 'data': result})
 
-  return JSONResponse(content={'code': 200, 'message': 'ok', 'data': result})
+  return FastJSONResponse(content={'code': 200, 'message': 'ok', 'data': result})
+
+
+@router.get('/custom_recognizers')
+async def list_custom_recognizers():
+  """persisted custom recognizers, run together with the built-in ones by /analyze"""
+  return await run_in_engine(_list_custom_recognizers)
+
+
+def _list_custom_recognizers():
+  return FastJSONResponse(content={'code': 200, 'message': 'ok', 'data': pii_engine.custom_recognizers.list()})
+
+
+@router.get('/custom_recognizers/{name}')
+async def get_custom_recognizer(name: str):
+  return await run_in_engine(_get_custom_recognizer, name)
+
+
+def _get_custom_recognizer(name: str):
+  definition = pii_engine.custom_recognizers.get(name)
+  if definition is None:
+    return FastJSONResponse(status_code=404, content={'code': 404, 'message': f'custom recognizer {name} not found', 'data': []})
+  return FastJSONResponse(content={'code': 200, 'message': 'ok', 'data': definition})
+
+
+@router.put('/custom_recognizers/{name}')
+async def put_custom_recognizer(name: str, item: CustomRecognizerModel):
+  return await run_in_engine(_put_custom_recognizer, name, item)
+
+
+def _put_custom_recognizer(name: str, item: CustomRecognizerModel):
+  """create or replace, compiled once here and hot-added to the registry of every worker"""
+  try:
+    created = pii_engine.custom_recognizers.put(name, definition_from_model(item.lang.value, item))
+  except ValueError as e:
+    return FastJSONResponse(status_code=400, content={'code': 400, 'message': str(e), 'data': []})
+  except Exception as e:
+    msg = f"put custom recognizer {name} error: {e}"
+    logger.exception(msg)
+    return FastJSONResponse(content={'code': 500, 'message': msg, 'data': []})
+
+  return FastJSONResponse(content={'code': 200, 'message': 'created' if created else 'updated',
+                                   'data': pii_engine.custom_recognizers.get(name)})
+
+
+@router.delete('/custom_recognizers/{name}')
+async def delete_custom_recognizer(name: str):
+  return await run_in_engine(_delete_custom_recognizer, name)
+
+
+def _delete_custom_recognizer(name: str):
+  try:
+    deleted = pii_engine.custom_recognizers.delete(name)
+  except Exception as e:
+    msg = f"delete custom recognizer {name} error: {e}"
+    logger.exception(msg)
+    return FastJSONResponse(content={'code': 500, 'message': msg, 'data': []})
+
+  if not deleted:
+    return FastJSONResponse(status_code=404, content={'code': 404, 'message': f'custom recognizer {name} not found', 'data': []})
+  return FastJSONResponse(content={'code': 200, 'message': 'ok', 'data': []})
 
 
 @router.post('/file_analyze')
-def file_analyze(item: FileAnalyzeModel):
+async def file_analyze(item: FileAnalyzeModel):
+  return await run_in_engine(_file_analyze, item)
+
+
+def _file_analyze(item: FileAnalyzeModel):
   """动态实体脱敏处理"""
   result_data = {"analyze": [], "anonymize": ""}
 
@@ -107,12 +297,14 @@ def file_analyze(item: FileAnalyzeModel):
     entities_to_process = list(item.entity_mapping.keys())
 
     # 执行分析
+    ctx = DocContext(item.text, item.lang.value) if item.with_anonymize else None
     result_analyze = pii_engine.analyze(
       text=item.text,
       language=item.lang.value,
       entities=entities_to_process,
       score_threshold=0.3,
-      allow_list=item.allow_list
+      allow_list=item.allow_list,
+      ctx=ctx
     )
 
     result_data["source"] = item.text
@@ -120,37 +312,16 @@ def file_analyze(item: FileAnalyzeModel):
 
     # 如果需要脱敏处理
     if item.with_anonymize:
-      # 构建分析结果对象列表
-      analyzer_results = []
-      for res in result_analyze:
-        analyzer_results.append(
-          AnalyzeResult(
-            entity_type=res['entity_type'],
-            start=res['start'],
-            end=res['end'],
-            score=res['score']
-          )
-        )
-
       # 构建操作符配置列表
-      operators = item.anonymize_operators or []
-      for entity_type, new_value in item.entity_mapping.items():
-        # 如果未在自定义操作符中配置，添加默认替换操作
-        if not any(op.entity_type == entity_type for op in (operators or [])):
-          operators.append(
-            OperatorConf(
-              entity_type=entity_type,
-              operator_name="replace",
-              params={"new_value": new_value}
-            )
-          )
+      operators = mapping_operators(item.entity_mapping, item.anonymize_operators)
 
       # 执行脱敏
       anonymize_result = pii_engine.anonymize(
         text=item.text,
-        analyzer_results=analyzer_results,
+        analyzer_results=result_analyze,
         llm_synthesize=item.llm_synthesize,
-        operators=operators
+        operators=operators,
+        ctx=ctx
       )
 
       result_data["anonymize"] = anonymize_result
@@ -158,9 +329,73 @@ def file_analyze(item: FileAnalyzeModel):
   except Exception as e:
     msg = f"文件脱敏处理错误: {e}"
     logger.exception(msg)
-    return JSONResponse(content={'code': 500, 'message': msg, 'data': result_data})
+    return FastJSONResponse(content={'code': 500, 'message': msg, 'data': result_data})
+
+  return FastJSONResponse(content={'code': 200, 'message': 'ok', 'data': result_data})
+
 
-  return JSONResponse(content={'code': 200, 'message': 'ok', 'data': result_data})
+def mapping_operators(entity_mapping: Dict[str, str], operators: Optional[List[OperatorConf]] = None) -> List[OperatorConf]:
+  operators = operators or []
+  for entity_type, new_value in entity_mapping.items():
+    # 如果未在自定义操作符中配置，添加默认替换操作
+    if not any(op.entity_type == entity_type for op in operators):
+      operators.append(
+        OperatorConf(
+          entity_type=entity_type,
+          operator_name="replace",
+          params={"new_value": new_value}
+        )
+      )
+  return operators
+
+
+async def stream_file_analyze(file: UploadFile, lang: Lang, entity_mapping: Dict[str, str], with_anonymize: bool,
+                              llm_synthesize: bool):
+  """
+  流式文件脱敏，NDJSON 每个窗口输出一行：
+  {"offset": 片段全局偏移, "source": 原文片段, "analyze": [全局偏移的实体], "anonymize": 脱敏后的片段}
+  最后一行 {"done": true, "length": 总字符数, "encoding": 编码}，出错时输出 {"error": 错误信息} 后结束
+  """
+  entities_to_process = list(entity_mapping.keys())
+  operators = mapping_operators(entity_mapping)
+  window_stream = WindowStream()
+  try:
+    data = await file.read(SNIFF_SIZE)
+    encoding = sniff_encoding(data)
+    # 嗅探之后出现的非法字节替换为 U+FFFD，不中断整个文件的处理
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    final = not data
+    while True:
+      window_stream.feed(decoder.decode(data, final=final))
+      while True:
+        window = window_stream.next_window(final)
+        if window is None:
+          break
+
+        result_analyze = await run_engine_step(pii_engine.analyze, window.text, lang.value, entities_to_process, 0.3)
+        chunk = window_stream.commit(window, result_analyze)
+        line = {
+          'offset': chunk.offset,
+          'source': chunk.text,
+          'analyze': [dict(r, start=r['start'] + chunk.offset, end=r['end'] + chunk.offset) for r in chunk.results],
+          'anonymize': '',
+        }
+        if with_anonymize:
+          result_anonymize = await run_engine_step(pii_engine.anonymize, chunk.text, chunk.results,
+                                                   llm_synthesize, operators)
+          line['anonymize'] = result_anonymize['text']
+        yield dumps_line(line)
+
+      if final:
+        break
+      data = await file.read(STREAM_READ_SIZE)
+      final = not data
+
+    yield dumps_line({'done': True, 'length': window_stream.total, 'encoding': encoding})
+  except Exception as e:
+    msg = f"文件流式脱敏处理错误: {e}"
+    logger.exception(msg)
+    yield dumps_line({'error': msg})
 
 
 @router.post('/file_upload_analyze')
@@ -169,13 +404,14 @@ async def file_upload_analyze(
   lang: str = Form("zh"),  # 使用Form参数
   entity_mapping: str = Form('{"PERSON": "[姓名]"}'),  # 使用Form参数
   with_anonymize: bool = Form(False),  # 使用Form参数
-  llm_synthesize: bool = Form(False)  # 使用Form参数
+  llm_synthesize: bool = Form(False),  # 使用Form参数
+  stream: bool = Form(False)  # 流式处理，返回 NDJSON，内存占用与文件大小无关
 ):
   """文件上传脱敏处理"""
   try:
     # 验证文件类型
     if not file.filename or not file.filename.endswith('.txt'):
-      return JSONResponse(
+      return FastJSONResponse(
         content={
           'status': 400,
           'msg': '只支持文本文件(.txt)',
@@ -183,6 +419,19 @@ async def file_upload_analyze(
         }
       )
 
+    if stream:
+      try:
+        mapping = json.loads(entity_mapping)
+      except json.JSONDecodeError as e:
+        return FastJSONResponse(content={'status': 400, 'msg': f'JSON格式错误: {str(e)}', 'data': {}})
+
+      validate_open_key(llm_synthesize)
+      if engine_executor.full:
+        return FastJSONResponse(status_code=OVERLOAD_STATUS, headers={'Retry-After': '1'},
+                            content={'code': OVERLOAD_STATUS, 'message': 'engine queue is full, retry later', 'data': []})
+      return StreamingResponse(stream_file_analyze(file, Lang(lang), mapping, with_anonymize, llm_synthesize),
+                               media_type='application/x-ndjson')
+
     # 读取文件内容 - 确保正确处理编码
     content_bytes = await file.read()
     try:
@@ -198,7 +447,7 @@ async def file_upload_analyze(
           continue
       else:
         # 所有编码尝试都失败
-        return JSONResponse(
+        return FastJSONResponse(
           content={
             'status': 400,
             'msg': '无法解码文件内容',
@@ -210,7 +459,7 @@ async def file_upload_analyze(
     try:
       mapping = json.loads(entity_mapping)
     except json.JSONDecodeError as e:
-      return JSONResponse(
+      return FastJSONResponse(
         content={
           'status': 400,
           'msg': f'JSON格式错误: {str(e)}',
@@ -228,9 +477,9 @@ async def file_upload_analyze(
     )
 
     # 调用处理函数
-    return file_analyze(request_data)
+    return await file_analyze(request_data)
 
   except Exception as e:
     msg = f"文件上传处理错误: {e}"
     logger.exception(msg)
-    return JSONResponse(content={'status': 500, 'msg': msg, 'data': {}})
\ No newline at end of file
+    return FastJSONResponse(content={'status': 500, 'msg': msg, 'data': {}})
\ No newline at end of file
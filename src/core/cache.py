@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/18 15:02
+# @Author : ltm
+# @Email :
+# @Desc : LRU + TTL 缓存（进程内 / 本机多进程共享的 sqlite），以及相同请求合并计算的 SingleFlight
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, Optional
+
+
+def create_private_file(path: str) -> None:
+    """创建只有属主可读写的文件（已存在时收紧权限）；sqlite 的 -wal / -shm 文件沿用数据库文件的权限"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+    os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+    for file in (path, path + '-wal', path + '-shm'):
+        if os.path.exists(file):
+            os.chmod(file, 0o600)
+
+
+class TTLLRUCache:
+    """
+    线程安全的 LRU 缓存，超过 maxsize 淘汰最久未使用的条目，超过 ttl 秒的条目视为失效。
+    指定 max_bytes 时按 sizeof(value) 估算占用，超出后同样从最久未使用的条目开始淘汰
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None, sizeof: Optional[Callable[[Any], int]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof if sizeof is not None else (json_size if max_bytes else None)
+        self.bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+
+            value, expire_at, size = item
+            if expire_at is not None and expire_at < time.monotonic():
+                del self._data[key]
+                self.bytes -= size
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+
+        expire_at = time.monotonic() + self.ttl if self.ttl else None
+        size = self.sizeof(value) if self.sizeof else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self._data[key] = (value, expire_at, size)
+            self.bytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes and self.bytes > self.max_bytes):
+                self.bytes -= self._data.popitem(last=False)[1][2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {'size': len(self._data), 'maxsize': self.maxsize, 'bytes': self.bytes, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses}
+
+
+class SqliteCache:
+    """
+    本机共享的 LRU + TTL 缓存，同一台机器上的多个 worker 进程使用同一个 sqlite 文件（建议放在 /dev/shm）。
+    值以 json 保存，超过 maxsize 条或 max_bytes 字节时淘汰最久未访问的条目。hits / misses 为本进程的计数
+    """
+
+    def __init__(self, path: str, maxsize: int = 10000, ttl: Optional[float] = None, max_bytes: Optional[int] = None):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self._sets = 0
+        # 缓存的是脱敏前后的文本，只允许属主读写
+        create_private_file(path)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache ('
+                         'key TEXT PRIMARY KEY, value TEXT, size INTEGER, expire_at REAL, accessed_at REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)')
+
+    def _connect(self) -> sqlite3.Connection:
+        # 每个线程（以及 fork 后的每个进程）各用一个连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute('SELECT value, expire_at FROM cache WHERE key = ?', (str(key),)).fetchone()
+            if row is not None and (row[1] is None or row[1] >= now):
+                conn.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (now, str(key)))
+                self.hits += 1
+                return json.loads(row[0])
+        except sqlite3.Error:
+            pass
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        if self.max_bytes and len(payload) > self.max_bytes:
+            return
+
+        try:
+            conn = self._connect()
+            conn.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)',
+                         (str(key), payload, len(payload), now + self.ttl if self.ttl else None, now))
+            self._sets += 1
+            # 淘汰有一定开销，每写入 64 次检查一次
+            if self._sets % 64 == 0:
+                self._evict(conn, now)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute('DELETE FROM cache WHERE expire_at IS NOT NULL AND expire_at < ?', (now,))
+        count, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache').fetchone()
+        if count > self.maxsize:
+            conn.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)',
+                         (count - self.maxsize,))
+        if self.max_bytes and total > self.max_bytes:
+            # 按访问时间从旧到新累计大小，删除超出部分
+            conn.execute('DELETE FROM cache WHERE key IN ('
+                         'SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC) AS kept FROM cache) '
+                         'WHERE kept > ?)', (self.max_bytes,))
+
+    def clear(self) -> None:
+        self._connect().execute('DELETE FROM cache')
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def stats(self) -> dict:
+        count, total = self._connect().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache').fetchone()
+        return {'size': count, 'maxsize': self.maxsize, 'bytes': total, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses}
+
+
+class SingleFlight:
+    """
+    相同 key 的并发调用只执行一次 fn，其余调用等待并共享结果（或异常）
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+def json_size(value: Any) -> int:
+    return len(json.dumps(value, ensure_ascii=False, default=str))
+
+
+def stable_hash(*parts: Any) -> str:
+    """json 规范化（排序键）后取 sha256，用作缓存 key"""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/18 18:50
+# @Author : ltm
+# @Email :
+# @Desc : 长文档切块：优先在段落、其次在句子边界切分，块之间带重叠；各块结果换算回原文偏移并合并接缝处的重复实体
+
+from dataclasses import dataclass
+from typing import List
+
+from .columnar import ColumnarResults
+
+# 句子结束符，没有换行时在这些字符之后切分
+SENTENCE_ENDS = '。！？!?；;'
+
+
+@dataclass
+class TextChunk:
+    start: int  # 块（含两侧重叠）在原文中的范围
+    end: int
+    own_start: int  # 本块负责输出的范围，各块的 [own_start, own_end) 恰好划分全文
+    own_end: int
+
+
+def find_boundary(text: str, lo: int, hi: int) -> int:
+    """
+    [lo, hi) 内最靠后的段落边界，没有时取句子边界
+    Returns: 边界之后的位置，找不到时为 -1
+    """
+    pos = text.rfind('\n', lo, hi)
+    if pos == -1:
+        pos = max(text.rfind(ch, lo, hi) for ch in SENTENCE_ENDS)
+    return pos + 1 if pos != -1 else -1
+
+
+def split_chunks(text: str, chunk_size: int, overlap: int) -> List[TextChunk]:
+    """
+    Args:
+        chunk_size: 每块负责输出的最大字符数，在后半段内找边界切分，找不到时硬切
+        overlap: 块两侧额外带上的字符数，需大于最长实体（含关键词等上下文）的长度
+    """
+    chunks = []
+    text_len = len(text)
+    own_start = 0
+    while own_start < text_len:
+        own_end = min(own_start + chunk_size, text_len)
+        if own_end < text_len:
+            boundary = find_boundary(text, own_start + chunk_size // 2, own_end)
+            if boundary != -1:
+                own_end = boundary
+        chunks.append(TextChunk(max(0, own_start - overlap), min(text_len, own_end + overlap), own_start, own_end))
+        own_start = own_end
+    return chunks
+
+
+def merge_chunk_results(chunks: List[TextChunk], chunk_results: List[ColumnarResults]) -> ColumnarResults:
+    """
+    每个实体只由其起点所在 own 范围的块输出（重叠区内重复识别的实体被丢弃），
+    来自不同块、同类型且相互重叠的实体（如被块边缘截断的地址）合并为一个，分数取最大值
+    """
+    # [块序号, entity_type, start, end, score, analysis_explanation]
+    owned = []
+    for idx, (chunk, results) in enumerate(zip(chunks, chunk_results)):
+        for entity_type, start, end, score, explanation in results.rows():
+            start += chunk.start
+            if chunk.own_start <= start < chunk.own_end:
+                owned.append([idx, entity_type, start, end + chunk.start, score, explanation])
+
+    owned.sort(key=lambda r: (r[1], r[2], -r[3]))
+    merged = []
+    last = {}
+    for r in owned:
+        prev = last.get(r[1])
+        if prev is not None and prev[0] != r[0] and r[2] < prev[3]:
+            prev[3] = max(prev[3], r[3])
+            prev[4] = max(prev[4], r[4])
+            continue
+        last[r[1]] = r
+        merged.append(r)
+
+    merged.sort(key=lambda r: (r[2], r[3]))
+    with_explanations = any(results.explanations is not None for results in chunk_results)
+    return ColumnarResults.from_rows((r[1:] for r in merged), with_explanations)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/19 00:50
+# @Author : ltm
+# @Email :
+# @Desc : 服务端持久化的命名自定义 recognizer：定义保存在本地 json 文件，启动时加载，增删改时编译一次并热更新到
+# 引擎的 registry，analyze 时与内置 recognizer 一起识别；同一台机器上的 worker 共享该文件，文件变化时各自重新加载
+
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import regex as re
+from presidio_analyzer import Pattern, RecognizerRegistry
+
+from .cache import stable_hash
+from .metrics import instrument_recognizer
+from .new_recognizer import DEFAULT_REGEX_FLAGS
+from .presidio_zh_patch import ZhPatternRecognizer
+
+logger = logging.getLogger("presidio-analyzer-patch")
+
+CUSTOM_RECOGNIZERS_PATH = os.getenv('PII_CUSTOM_RECOGNIZERS_PATH',
+                                    os.path.expanduser('~/.cache/zh_pii/custom_recognizers.json'))
+# registry 中自定义 recognizer 的 name 前缀，与内置 recognizer 区分
+NAME_PREFIX = 'custom:'
+NAME_PATTERN = re.compile(r'[\w\-.]{1,64}')
+
+
+def definition_from_model(lang: str, model) -> dict:
+    """CustomAnalyzeModel（或同样字段的对象）转为持久化的定义"""
+    return {
+        'lang': lang,
+        'entity': model.entity,
+        'deny_list': list(model.deny_list or []),
+        'patterns': [{'name': p.name, 'regex': p.regex, 'score': p.score} for p in model.patterns or []],
+        'context': list(model.context or []),
+    }
+
+
+def build_recognizer(name: str, definition: dict) -> ZhPatternRecognizer:
+    """编译定义，正则或定义不合法时抛出 ValueError"""
+    patterns = [Pattern(p['name'], p['regex'], p['score']) for p in definition['patterns']]
+    for pattern in patterns:
+        try:
+            # presidio 按正则字符串匹配，编译一次填充 regex 模块的缓存
+            re.compile(pattern.regex, flags=DEFAULT_REGEX_FLAGS)
+        except re.error as e:
+            raise ValueError(f'invalid regex of pattern {pattern.name}: {e}') from e
+    recognizer = ZhPatternRecognizer(
+        supported_entity=definition['entity'],
+        name=NAME_PREFIX + name,
+        supported_language=definition['lang'],
+        deny_list=definition['deny_list'] or None,
+        patterns=patterns,
+        context=definition['context'] or None,
+    )
+    instrument_recognizer(recognizer)
+    return recognizer
+
+
+class CustomRecognizerStore:
+    """
+    definitions 为 name -> 定义；version 为全部定义的哈希，作为 analyze 结果缓存 key 的一部分，定义变化后旧结果不再命中。
+    修改时持有文件锁，先读取最新的文件再写入，多个 worker 同时修改不会丢失更新
+    """
+
+    def __init__(self, path: str, registry: RecognizerRegistry):
+        self.path = path
+        self.registry = registry
+        self.definitions: Dict[str, dict] = {}
+        self.version = stable_hash({})
+        # name -> (定义哈希, recognizer)，定义未变化的 recognizer 重新加载时直接复用
+        self._compiled: Dict[str, tuple] = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> None:
+        """文件修改时间变化（本进程或其他 worker 修改）时重新加载，未变化时只有一次 stat"""
+        mtime = self._stat()
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            mtime = self._stat()
+            if mtime != self._mtime:
+                self._apply(self._read())
+                self._mtime = mtime
+
+    def _stat(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _read(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write(self, definitions: Dict[str, dict]) -> None:
+        # 写入临时文件后替换，读取方不会读到写了一半的文件
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(definitions, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def _apply(self, definitions: Dict[str, dict]) -> None:
+        compiled = {}
+        for name, definition in definitions.items():
+            definition_hash = stable_hash(definition)
+            cached = self._compiled.get(name)
+            if cached is not None and cached[0] == definition_hash:
+                compiled[name] = cached
+                continue
+            try:
+                compiled[name] = (definition_hash, build_recognizer(name, definition))
+            except ValueError as e:
+                logger.warning(f'skip custom recognizer {name}: {e}')
+
+        # 整体替换 recognizers 列表，正在进行的 analyze 使用的仍是旧列表
+        builtin = [r for r in self.registry.recognizers if not r.name.startswith(NAME_PREFIX)]
+        self.registry.recognizers = builtin + [recognizer for _, recognizer in compiled.values()]
+        self._compiled = compiled
+        self.definitions = definitions
+        self.version = stable_hash(definitions)
+
+    @contextmanager
+    def _modify(self):
+        """持有文件锁读取最新定义，yield 出去修改后写回并应用到本进程的 registry"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock_file, self._lock:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                definitions = self._read()
+                yield definitions
+                self._write(definitions)
+                self._apply(definitions)
+                self._mtime = self._stat()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def list(self) -> List[dict]:
+        self.refresh()
+        return [dict(definition, name=name) for name, definition in sorted(self.definitions.items())]
+
+    def get(self, name: str) -> Optional[dict]:
+        self.refresh()
+        definition = self.definitions.get(name)
+        return dict(definition, name=name) if definition is not None else None
+
+    def put(self, name: str, definition: dict) -> bool:
+        """
+        新建或替换，先编译，不合法时抛出 ValueError 且不保存
+        Returns: True 为新建
+        """
+        if not NAME_PATTERN.fullmatch(name):
+            raise ValueError(f'invalid recognizer name {name!r}, use 1-64 letters, digits, "_", "-" or "."')
+        recognizer = build_recognizer(name, definition)
+        with self._modify() as definitions:
+            created = name not in definitions
+            definitions[name] = definition
+            # 已编译的 recognizer 在 _apply 中直接复用
+            self._compiled[name] = (stable_hash(definition), recognizer)
+        return created
+
+    def delete(self, name: str) -> bool:
+        """Returns: False 为不存在"""
+        with self._modify() as definitions:
+            return definitions.pop(name, None) is not None
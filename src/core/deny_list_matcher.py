@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/18 15:40
+# @Author : ltm
+# @Email :
+# @Desc : 基于 Aho-Corasick 自动机的 deny list 匹配，一次线性扫描找出所有词条，用于替代超大的 (a|b|c|...) 正则
+
+from collections import deque
+from typing import Iterator, List, Tuple
+
+import regex as re
+
+try:
+    import ahocorasick
+except ImportError:  # 未安装 pyahocorasick 时使用纯 python 实现
+    ahocorasick = None
+
+
+NON_WORD = re.compile(r'\W')
+
+
+class _PyAutomaton:
+    """纯 python Aho-Corasick 自动机，outputs 中保存 (词条序号, 词条长度)"""
+
+    def __init__(self, terms: List[str]):
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        for idx, term in enumerate(terms):
+            state = 0
+            for ch in term:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                state = nxt
+            self.outputs[state].append((idx, len(term)))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fail = self.fail[state]
+                while fail and ch not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[nxt] = self.goto[fail].get(ch, 0)
+                self.outputs[nxt] = self.outputs[nxt] + self.outputs[self.fail[nxt]]
+
+    def iter(self, text: str) -> Iterator[Tuple[int, Tuple[int, int]]]:
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for value in outputs[state]:
+                yield i, value
+
+
+class DenyListMatcher:
+    """
+    与 ZhPatternRecognizer 的 deny list 正则结果一致：同一起点取 deny list 中靠前的词条，匹配之间不重叠；
+    word_boundary=True 时要求词条两侧为非单词字符或文本边界（en）
+    """
+
+    def __init__(self, deny_list: List[str], word_boundary: bool = False):
+        self.word_boundary = word_boundary
+        self.terms = list(dict.fromkeys(term for term in deny_list if term))
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for idx, term in enumerate(self.terms):
+                self._automaton.add_word(term, (idx, len(term)))
+            self._automaton.make_automaton()
+        else:
+            self._automaton = _PyAutomaton(self.terms)
+
+    def iter_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        if not self.terms:
+            return
+
+        # 每个起点只保留序号最小的词条，等价于正则分支按顺序尝试
+        best = {}
+        text_len = len(text)
+        for last, (idx, length) in self._automaton.iter(text):
+            start, end = last - length + 1, last + 1
+            if self.word_boundary and not (
+                (start == 0 or NON_WORD.match(text, start - 1)) and (end == text_len or NON_WORD.match(text, end))
+            ):
+                continue
+            current = best.get(start)
+            if current is None or idx < current[0]:
+                best[start] = (idx, end)
+
+        last_end = 0
+        for start in sorted(best):
+            if start < last_end:
+                continue
+            end = best[start][1]
+            yield start, end
+            last_end = end
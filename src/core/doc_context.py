@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/18 19:40
+# @Author : ltm
+# @Email :
+# @Desc : 单个请求内共享的文档上下文：analyze 解析出的 spaCy doc、句子边界，anonymize / LLM 合成阶段直接复用，按替换结果换算偏移而不重新解析
+
+from bisect import bisect_right
+from typing import List, Optional, Tuple
+
+import regex as re
+from spacy.tokens import Doc
+
+# 轻量中英文分句：句末标点（含其后的引号、括号）、换行，或英文句点后接空白
+SENTENCE_PATTERN = re.compile(r'.*?(?:[。！？!?；;…]+[”’"\'）)】]*|\.(?=\s)|\n+|$)', re.DOTALL)
+
+
+def split_sentences(text: str) -> List[int]:
+    """
+    Returns: 各句起点（第一个为 0），相邻起点之间即为一句，句子首尾相接覆盖全文
+    """
+    starts = [0]
+    for match in SENTENCE_PATTERN.finditer(text):
+        end = match.end()
+        if 0 < end < len(text) and end != starts[-1]:
+            starts.append(end)
+    return starts
+
+
+class OffsetMap:
+    """
+    原文位置 -> 替换后文本位置。replacements 为 [(原文 start, end, 新文本 start, end)]，按位置排序且互不重叠；
+    落在被替换片段内部的位置映射到替换结果的末尾
+    """
+
+    def __init__(self, replacements: List[Tuple[int, int, int, int]]):
+        self.replacements = replacements
+        self._ends = [r[1] for r in replacements]
+
+    def map(self, pos: int) -> int:
+        idx = bisect_right(self._ends, pos)
+        if idx < len(self.replacements):
+            start, end, new_start, new_end = self.replacements[idx]
+            if start < pos < end:
+                return new_end
+        if idx == 0:
+            return pos
+        _, end, _, new_end = self.replacements[idx - 1]
+        return pos + new_end - end
+
+
+class DocContext:
+    """
+    一个请求内 analyze -> anonymize -> LLM 合成共用的文档信息，只对应 text 这一段原文
+    """
+
+    def __init__(self, text: str, language: str):
+        self.text = text
+        self.language = language
+        self.doc: Optional[Doc] = None
+        self._sentence_starts: Optional[List[int]] = None
+
+    def set_doc(self, doc: Doc) -> None:
+        """analyze 阶段解析出的 doc，带句法分析时直接用其分句结果"""
+        if doc.text == self.text:
+            self.doc = doc
+
+    @property
+    def sentence_starts(self) -> List[int]:
+        if self._sentence_starts is None:
+            if self.doc is not None and self.doc.has_annotation('SENT_START'):
+                self._sentence_starts = [0] + [sent.start_char for sent in self.doc.sents if sent.start_char > 0]
+            else:
+                self._sentence_starts = split_sentences(self.text)
+        return self._sentence_starts
+
+    def sentences(self, offset_map: Optional[OffsetMap] = None, text: Optional[str] = None) -> List[str]:
+        """
+        Args:
+            offset_map: 原文到替换后文本的偏移映射
+            text: 替换后的文本，与 offset_map 一起给出时返回替换后文本按原句子边界切分的结果
+        """
+        if offset_map is None or text is None:
+            text, starts = self.text, self.sentence_starts
+        else:
+            starts = [offset_map.map(start) for start in self.sentence_starts]
+        bounds = starts + [len(text)]
+        return [text[bounds[i]:bounds[i + 1]] for i in range(len(starts)) if bounds[i] < bounds[i + 1]]
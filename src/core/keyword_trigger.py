@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/18 16:30
+# @Author : ltm
+# @Email :
+# @Desc : 关键词锚定识别器的公共触发阶段：所有锚定关键词一次扫描找出，识别器只在命中关键词之后的小窗口内跑正则
+
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import regex as re
+
+from .deny_list_matcher import ahocorasick
+
+
+class KeywordTriggerIndex:
+    """
+    汇总所有识别器注册的关键词，find 返回 关键词 -> 出现位置列表。
+    AnalyzerEngine 把同一个 text 对象依次交给各个识别器，按线程缓存最近一次的扫描结果，一段文本只扫描一次
+    """
+
+    def __init__(self):
+        self._keywords = set()
+        self._automaton = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def register(self, keywords: Iterable[str]) -> None:
+        with self._lock:
+            new_keywords = set(keywords) - self._keywords
+            if new_keywords:
+                self._keywords |= new_keywords
+                self._automaton = None
+
+    def _get_automaton(self):
+        with self._lock:
+            if self._automaton is None and ahocorasick is not None:
+                automaton = ahocorasick.Automaton()
+                for keyword in self._keywords:
+                    automaton.add_word(keyword, keyword)
+                automaton.make_automaton()
+                self._automaton = automaton
+            return self._automaton
+
+    def find(self, text: str) -> Dict[str, List[int]]:
+        local = self._local
+        if getattr(local, 'text', None) is text and local.keyword_count == len(self._keywords):
+            return local.hits
+
+        hits = defaultdict(list)
+        automaton = self._get_automaton()
+        if automaton is not None:
+            for last, keyword in automaton.iter(text):
+                hits[keyword].append(last - len(keyword) + 1)
+        else:
+            # 没有 pyahocorasick 时逐个关键词 str.find，仍然比在全文上跑变长后行断言快得多
+            for keyword in list(self._keywords):
+                start = text.find(keyword)
+                while start != -1:
+                    hits[keyword].append(start)
+                    start = text.find(keyword, start + 1)
+
+        local.text, local.hits, local.keyword_count = text, hits, len(self._keywords)
+        return hits
+
+
+trigger_index = KeywordTriggerIndex()
+
+
+class KeywordTriggerMixin:
+    """
+    TRIGGER_KEYWORDS: 正则后行断言中的锚定关键词
+    TRIGGER_PREFIX: 关键词与实体值之间允许出现的内容（分隔符等）
+    TRIGGER_WINDOW: 实体值（含前瞻断言）可能达到的最大长度
+    使用自定义 patterns 初始化时不启用触发，仍然全文匹配
+    """
+    TRIGGER_KEYWORDS: Tuple[str, ...] = ()
+    TRIGGER_PREFIX = r'[:：\s]*'
+    TRIGGER_WINDOW = 64
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.trigger_keywords = self.TRIGGER_KEYWORDS if self.patterns is getattr(self, 'PATTERNS', None) else ()
+        if self.trigger_keywords:
+            self._trigger_prefix = re.compile(self.TRIGGER_PREFIX)
+            trigger_index.register(self.trigger_keywords)
+
+    def trigger_windows(self, text: str) -> Optional[List[Tuple[int, int]]]:
+        """
+        Returns: 合并后的 (pos, endpos) 窗口列表，没有命中关键词时为空列表；未启用触发时为 None（全文匹配）
+        """
+        if not self.trigger_keywords:
+            return None
+
+        hits = trigger_index.find(text)
+        windows = []
+        text_len = len(text)
+        for keyword in self.trigger_keywords:
+            for start in hits.get(keyword, ()):
+                value_start = self._trigger_prefix.match(text, start + len(keyword)).end()
+                windows.append((start, min(value_start + self.TRIGGER_WINDOW, text_len)))
+
+        windows.sort()
+        merged = []
+        for start, end in windows:
+            if merged and start <= merged[-1][1]:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        return merged
+
+    def iter_trigger_matches(self, compiled, text: str):
+        """compiled.finditer limited to the trigger windows"""
+        windows = self.trigger_windows(text)
+        for pos, endpos in [(0, len(text))] if windows is None else windows:
+            yield from compiled.finditer(text, pos, endpos)
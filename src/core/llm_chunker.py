@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/18 22:00
+# @Author : ltm
+# @Email :
+# @Desc : LLM 合成前的切片：轻量中英文分句后按 token 预算贪心拼接，超长句子在 token 边界（且不切断字符）处拆分，所有片段拼接即为原文
+
+import os
+from functools import lru_cache
+from itertools import accumulate
+from typing import List, Optional, Tuple
+
+import tiktoken
+
+from .doc_context import split_sentences
+from .openai_fake_data_generator import create_messages, get_encoder, get_text_token, get_text_tokens
+
+# 模型 -> (上下文窗口, 最大输出 token 数)，最大输出为 None 时输入输出共享上下文窗口；按最长前缀匹配
+MODEL_TOKEN_LIMITS = {
+    'gpt-3.5-turbo': (4096, None),
+    'gpt-3.5-turbo-16k': (16385, None),
+    'gpt-4': (8192, None),
+    'gpt-4-32k': (32768, None),
+    'gpt-4-turbo': (128000, 4096),
+    'gpt-4o': (128000, 16384),
+    'gpt-4o-mini': (128000, 16384),
+}
+# 覆盖上表的上下文窗口，0 时按模型取值
+LLM_CONTEXT_WINDOW = int(os.getenv('PII_LLM_CONTEXT_WINDOW', 0))
+# 每个片段的 token 上限，0 时按模型计算，见 chunk_token_budget
+LLM_CHUNK_TOKENS = int(os.getenv('PII_LLM_CHUNK_TOKENS', 0))
+# 为消息格式、输出与输入 token 数的差异预留的 token 数
+RESERVED_TOKENS = 100
+
+
+def model_token_limits(model: str) -> Tuple[int, Optional[int]]:
+    prefixes = [prefix for prefix in MODEL_TOKEN_LIMITS if model.startswith(prefix)]
+    window, max_output = MODEL_TOKEN_LIMITS[max(prefixes, key=len)] if prefixes else (4096, None)
+    return LLM_CONTEXT_WINDOW or window, max_output
+
+
+@lru_cache(maxsize=None)
+def chunk_token_budget(model: str) -> int:
+    """
+    输出为输入片段的改写，长度相当：片段 token 数不超过 (上下文窗口 - prompt 模板 - 预留) / 2，
+    且不超过模型的最大输出
+    """
+    if LLM_CHUNK_TOKENS > 0:
+        return LLM_CHUNK_TOKENS
+    window, max_output = model_token_limits(model)
+    budget = (window - get_text_token(create_messages('')[0]['content'], model) - RESERVED_TOKENS) // 2
+    if max_output is not None:
+        budget = min(budget, max_output - RESERVED_TOKENS)
+    return max(budget, 1)
+
+
+def split_oversized(encoder: tiktoken.Encoding, sentence: str, budget: int) -> List[str]:
+    """
+    超过 budget 的句子按 token 切分，每段不超过 budget 个 token；
+    切分点落在多字节字符内部（一个汉字可能由多个 token 组成）时退到该字符之前
+    """
+    tokens = encoder.encode_ordinary(sentence)
+    data = sentence.encode('utf-8')
+    # 每个 token 结束处的字节偏移
+    ends = list(accumulate(len(b) for b in encoder.decode_tokens_bytes(tokens)))
+
+    pieces = []
+    start_token = start_byte = 0
+    while start_token < len(tokens):
+        end_token = min(start_token + budget, len(tokens))
+        # utf-8 后续字节为 0b10xxxxxx
+        while end_token < len(tokens) and data[ends[end_token - 1]] & 0xC0 == 0x80:
+            end_token -= 1
+            if end_token == start_token:
+                # budget 比单个字符的 token 数还小，向后取到字符结束
+                end_token = start_token + 1
+                while end_token < len(tokens) and data[ends[end_token - 1]] & 0xC0 == 0x80:
+                    end_token += 1
+                break
+        end_byte = ends[end_token - 1]
+        pieces.append(data[start_byte:end_byte].decode('utf-8'))
+        start_token, start_byte = end_token, end_byte
+    return pieces
+
+
+def pack_sentences(sentences: List[str], budget: int, model: str) -> List[str]:
+    """按顺序贪心拼接句子，每个片段的 token 数不超过 budget"""
+    counts = get_text_tokens(sentences, model)
+    chunks, current, current_tokens = [], [], 0
+    for sentence, count in zip(sentences, counts):
+        if current and current_tokens + count > budget:
+            chunks.append(''.join(current))
+            current, current_tokens = [], 0
+        if count > budget:
+            chunks.extend(split_oversized(get_encoder(model), sentence, budget))
+            continue
+        current.append(sentence)
+        current_tokens += count
+    if current:
+        chunks.append(''.join(current))
+    return chunks
+
+
+def split_for_llm(text: str, model: str, sentences: Optional[List[str]] = None) -> List[str]:
+    """
+    Args:
+        sentences: 已经切分好的句子（如 DocContext 中 analyze 阶段的分句结果），拼接后需等于 text
+    Returns: 各片段，按顺序拼接即为 text
+    """
+    if sentences is None:
+        starts = split_sentences(text) + [len(text)]
+        sentences = [text[starts[i]:starts[i + 1]] for i in range(len(starts) - 1) if starts[i] < starts[i + 1]]
+    return pack_sentences(sentences, chunk_token_budget(model), model)
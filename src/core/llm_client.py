@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/18 21:10
+# @Author : ltm
+# @Email :
+# @Desc : LLM 合成的异步客户端：各片段在后台事件循环中并发请求，限制并发数，单次调用超时，抖动退避重试，连续失败时熔断
+
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+import openai
+from openai import error as openai_error
+
+from .cache import TTLLRUCache, SqliteCache, stable_hash
+from .metrics import STAGE_LATENCY, LLM_TOKENS, LLM_CALLS, LLM_CACHE_REQUESTS
+from .openai_fake_data_generator import get_text_token
+
+LLM_MODEL = os.getenv('PII_LLM_MODEL', 'gpt-3.5-turbo')
+# 本进程同时进行的 LLM 调用数上限（所有请求共享）
+LLM_CONCURRENCY = int(os.getenv('PII_LLM_CONCURRENCY', 16))
+# 单次调用超时秒数
+LLM_TIMEOUT = float(os.getenv('PII_LLM_TIMEOUT', 30))
+# 超时、限流、5xx 等可重试错误的重试次数，重试间隔为 [0, min(max, base * 2^n)] 内的随机值
+LLM_RETRIES = int(os.getenv('PII_LLM_RETRIES', 3))
+LLM_BACKOFF_BASE = float(os.getenv('PII_LLM_BACKOFF_BASE', 0.5))
+LLM_BACKOFF_MAX = float(os.getenv('PII_LLM_BACKOFF_MAX', 8))
+# 连续失败该次数后熔断，熔断期间直接失败，reset 秒后放行一次试探调用；threshold <= 0 时不熔断
+LLM_BREAKER_THRESHOLD = int(os.getenv('PII_LLM_BREAKER_THRESHOLD', 5))
+LLM_BREAKER_RESET = float(os.getenv('PII_LLM_BREAKER_RESET', 30))
+
+# 合成结果缓存，按 模型、temperature、消息（prompt 模板 + 脱敏后的片段）缓存：memory 进程内（默认），sqlite 持久化到磁盘（文件权限 0600），none 不缓存
+LLM_CACHE_BACKEND = os.getenv('PII_LLM_CACHE_BACKEND', 'memory')
+LLM_CACHE_PATH = os.getenv('PII_LLM_CACHE_PATH', os.path.expanduser('~/.cache/zh_pii/llm_cache.sqlite'))
+LLM_CACHE_SIZE = int(os.getenv('PII_LLM_CACHE_SIZE', 100000))
+LLM_CACHE_MAX_BYTES = int(os.getenv('PII_LLM_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# 有效秒数，0 时不过期
+LLM_CACHE_TTL = float(os.getenv('PII_LLM_CACHE_TTL', 30 * 24 * 3600))
+# 1 时只复用 temperature 为 0 的结果，temperature > 0 的调用每次都请求模型
+LLM_CACHE_DETERMINISTIC_ONLY = int(os.getenv('PII_LLM_CACHE_DETERMINISTIC_ONLY', 0))
+
+
+def create_llm_cache():
+    if LLM_CACHE_BACKEND == 'sqlite':
+        return SqliteCache(LLM_CACHE_PATH, LLM_CACHE_SIZE, LLM_CACHE_TTL or None, max_bytes=LLM_CACHE_MAX_BYTES)
+    if LLM_CACHE_BACKEND == 'memory':
+        return TTLLRUCache(LLM_CACHE_SIZE, LLM_CACHE_TTL or None, max_bytes=LLM_CACHE_MAX_BYTES)
+    if LLM_CACHE_BACKEND == 'none':
+        return None
+    raise ValueError(f'unknown PII_LLM_CACHE_BACKEND {LLM_CACHE_BACKEND}, use sqlite, memory or none')
+
+
+class LLMUnavailableError(Exception):
+    """熔断中或重试用尽"""
+
+
+def is_retryable(e: Exception) -> bool:
+    if isinstance(e, (asyncio.TimeoutError, openai_error.Timeout, openai_error.APIConnectionError,
+                      openai_error.RateLimitError, openai_error.ServiceUnavailableError)):
+        return True
+    # 其余 APIError 只有服务端错误可重试
+    return isinstance(e, openai_error.APIError) and (e.http_status is None or e.http_status >= 500)
+
+
+class CircuitBreaker:
+    """
+    closed：正常调用，连续失败 threshold 次后 open；
+    open：reset_timeout 秒内直接拒绝；之后 half_open，只放行一次试探调用，成功则 closed，失败重新 open
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or 0 < self.threshold <= self.failures:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self):
+        """调用结束（含被取消）时调用：试探调用没有记录结果时结束试探，half_open 下放行下一次试探"""
+        with self._lock:
+            self._probing = False
+
+
+class LLMClient:
+    """
+    engine 线程通过 synthesize 同步调用，各片段的请求在后台事件循环中并发执行，结果按输入顺序返回
+    """
+
+    def __init__(self,
+                 concurrency: Optional[int] = None,
+                 timeout: Optional[float] = None,
+                 retries: Optional[int] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 cache=None):
+        self.concurrency = concurrency or LLM_CONCURRENCY
+        self.timeout = timeout or LLM_TIMEOUT
+        self.retries = LLM_RETRIES if retries is None else retries
+        self.breaker = breaker or CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_RESET)
+        self.cache = create_llm_cache() if cache is None else cache
+
+        self._loop = None
+        self._pid = None
+        self._semaphore = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """后台事件循环，首次使用时启动；fork 出的子进程中重新创建"""
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='pii-llm', daemon=True).start()
+                self._loop, self._pid, self._semaphore, self._session = loop, os.getpid(), None, None
+            return self._loop
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+    def setup(self):
+        """在事件循环内创建信号量和共享的 http 连接池（python 3.9 下二者创建时绑定当前循环）"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.concurrency))
+        # openai 使用 aiosession 中的连接池而不是每次调用新建 session，chat_all 中创建的 task 继承该设置
+        openai.aiosession.set(self._session)
+
+    async def chat(self, messages: list, model: Optional[str] = None, temperature: float = 0) -> str:
+        model = model or LLM_MODEL
+        self.setup()
+
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                LLM_CALLS.inc('circuit_open')
+                raise LLMUnavailableError('LLM circuit breaker is open, retry later')
+            try:
+                async with self._semaphore:
+                    with STAGE_LATENCY.time('llm_chat'):
+                        response = await asyncio.wait_for(
+                            openai.ChatCompletion.acreate(model=model, messages=messages, temperature=temperature,
+                                                          request_timeout=self.timeout),
+                            self.timeout)
+            except Exception as e:
+                self.breaker.record_failure()
+                if not is_retryable(e):
+                    LLM_CALLS.inc('error')
+                    raise
+                if attempt == self.retries:
+                    LLM_CALLS.inc('error')
+                    raise LLMUnavailableError(f'LLM call failed after {attempt + 1} attempts: {e!r}') from e
+                LLM_CALLS.inc('retry')
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            else:
+                self.breaker.record_success()
+            finally:
+                # 被 chat_all 取消（CancelledError）等未记录结果的情况下同样结束试探，否则熔断器一直拒绝调用
+                self.breaker.release()
+
+            LLM_CALLS.inc('ok')
+            content = response.choices[0].message.content
+            LLM_TOKENS.inc('prompt', amount=sum(get_text_token(m['content'], model) for m in messages))
+            LLM_TOKENS.inc('completion', amount=get_text_token(content, model))
+            return content
+
+    async def chat_all(self, messages_list: List[list], model: Optional[str] = None, temperature: float = 0) -> List[str]:
+        self.setup()
+        tasks = [asyncio.ensure_future(self.chat(messages, model, temperature)) for messages in messages_list]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            # 任一片段失败则整体失败，取消其余片段
+            for task in tasks:
+                task.cancel()
+            raise
+
+    def cacheable(self, temperature: float) -> bool:
+        return self.cache is not None and (temperature == 0 or not LLM_CACHE_DETERMINISTIC_ONLY)
+
+    def synthesize(self, messages_list: List[list], model: Optional[str] = None, temperature: float = 0) -> List[str]:
+        """
+        缓存命中的片段直接返回，不经过事件循环；同一次调用中相同的片段只请求一次
+        Returns: 各片段的合成结果，与 messages_list 顺序一致
+        """
+        model = model or LLM_MODEL
+        cacheable = self.cacheable(temperature)
+        results: List[Optional[str]] = [None] * len(messages_list)
+        # key -> 使用该结果的片段下标
+        pending: Dict[str, List[int]] = {}
+        for idx, messages in enumerate(messages_list):
+            if not cacheable:
+                pending[str(idx)] = [idx]
+                continue
+            key = stable_hash('llm_chat', model, temperature, messages)
+            content = self.cache.get(key)
+            if content is not None:
+                LLM_CACHE_REQUESTS.inc('hit')
+                results[idx] = content
+            elif key in pending:
+                LLM_CACHE_REQUESTS.inc('deduplicated')
+                pending[key].append(idx)
+            else:
+                LLM_CACHE_REQUESTS.inc('miss')
+                pending[key] = [idx]
+
+        if pending:
+            keys = list(pending)
+            contents = asyncio.run_coroutine_threadsafe(
+                self.chat_all([messages_list[pending[key][0]] for key in keys], model, temperature), self.loop).result()
+            for key, content in zip(keys, contents):
+                if cacheable:
+                    self.cache.set(key, content)
+                for idx in pending[key]:
+                    results[idx] = content
+        return results
+
+    def cache_stats(self) -> Optional[dict]:
+        if self.cache is None:
+            return None
+        return dict(self.cache.stats(), backend=LLM_CACHE_BACKEND, deterministic_only=bool(LLM_CACHE_DETERMINISTIC_ONLY))
+
+
+llm_client = LLMClient()
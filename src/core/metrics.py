@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/18 17:20
+# @Author : ltm
+# @Email :
+# @Desc : 进程内 Prometheus 文本格式指标：计数器与直方图，记录一次只是一次加锁和二分查找，满载时也可以常开；
+# 多 worker 时各进程定期把快照写入共享目录，/metrics 合并所有进程的快照
+
+import functools
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 多进程模式下各进程快照所在的目录（serve_prefork 未设置时创建临时目录），为空时只统计本进程
+METRICS_DIR = os.getenv('PII_METRICS_DIR', '')
+# 各进程写入快照的间隔秒数，/metrics 中其他 worker 的数据最多延迟这么久
+METRICS_FLUSH_INTERVAL = float(os.getenv('PII_METRICS_FLUSH_INTERVAL', 1))
+
+# 秒
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10., 30., 60.)
+# 字符数
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    @staticmethod
+    def merge(values: dict, snapshot: list) -> None:
+        for labels, value in snapshot:
+            labels = tuple(labels)
+            values[labels] = values.get(labels, 0) + value
+
+    def collect(self, values: Optional[dict] = None) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [每个桶的计数（非累计，最后一个为 +Inf）, sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            item = self._values.get(labels)
+            if item is None:
+                item = self._values[labels] = [[0] * (len(self.buckets) + 1), 0., 0]
+            item[0][idx] += 1
+            item[1] += value
+            item[2] += 1
+
+    @contextmanager
+    def time(self, *labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(labels), [list(item[0]), item[1], item[2]]] for labels, item in self._values.items()]
+
+    @staticmethod
+    def merge(values: dict, snapshot: list) -> None:
+        for labels, (counts, total, count) in snapshot:
+            labels = tuple(labels)
+            item = values.get(labels)
+            if item is None:
+                values[labels] = [list(counts), total, count]
+            else:
+                item[0] = [a + b for a, b in zip(item[0], counts)]
+                item[1] += total
+                item[2] += count
+
+    def collect(self, values: Optional[dict] = None) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        if values is None:
+            with self._lock:
+                values = {labels: (list(item[0]), item[1], item[2]) for labels, item in self._values.items()}
+        for labels, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % ('+Inf' if bound == float('inf') else _format_value(bound))
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    directory 为空时只输出本进程的指标。不为空时每个进程把快照写入 directory 下各自的文件，render 合并全部文件：
+    fork 前写入父进程的快照，子进程从零开始计数；已退出进程的文件保留，计数器不会因 worker 重启而变小
+    """
+
+    def __init__(self, directory: str = METRICS_DIR, flush_interval: float = METRICS_FLUSH_INTERVAL):
+        self._metrics = []
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._path = None
+        self._flusher_pid = None
+        if directory:
+            os.register_at_fork(before=self.dump, after_in_child=self._reset)
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def _reset(self):
+        """fork 出的子进程：清空继承的计数（已由父进程写入快照），锁可能在 fork 时被其他线程持有，一并重建"""
+        for metric in self._metrics:
+            metric._values = {}
+            metric._lock = threading.Lock()
+        self._path = None
+
+    def clear(self) -> None:
+        """master 启动时调用，删除之前运行留下的快照"""
+        os.makedirs(self.directory, exist_ok=True)
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            os.remove(path)
+
+    def dump(self) -> None:
+        if not self.directory:
+            return
+        try:
+            self._dump()
+        except OSError:
+            pass
+
+    def _dump(self) -> None:
+        if self._path is None:
+            # pid 可能被复用，加随机后缀
+            self._path = os.path.join(self.directory, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+        snapshot = {metric.name: metric.snapshot() for metric in self._metrics}
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self._path)
+
+    def start_flusher(self) -> None:
+        """每个 worker 启动时调用，后台定期写入快照"""
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='pii-metrics-flush', daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.dump()
+
+    def render(self) -> str:
+        merged = None
+        if self.directory:
+            self.dump()
+            merged = {metric.name: {} for metric in self._metrics}
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                try:
+                    with open(path) as f:
+                        snapshot = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                for metric in self._metrics:
+                    metric.merge(merged[metric.name], snapshot.get(metric.name, []))
+
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect(merged[metric.name] if merged is not None else None))
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    'pii_request_duration_seconds', 'HTTP request latency by endpoint', ('method', 'endpoint', 'status')))
+STAGE_LATENCY = registry.register(Histogram(
+    'pii_stage_duration_seconds', 'Engine stage latency (anonymize, llm_chat)', ('stage',)))
+SPACY_LATENCY = registry.register(Histogram(
+    'pii_spacy_duration_seconds', 'spaCy pipeline latency by pipeline profile, mode is parse or pipe (batch)', ('profile', 'mode')))
+RECOGNIZER_LATENCY = registry.register(Histogram(
+    'pii_recognizer_duration_seconds', 'Recognizer analyze latency', ('recognizer', 'language')))
+INPUT_SIZE = registry.register(Histogram(
+    'pii_input_chars', 'Input text size in characters', ('operation',), buckets=SIZE_BUCKETS))
+ENTITIES_FOUND = registry.register(Counter(
+    'pii_entities_total', 'Entities found by type', ('entity_type',)))
+LLM_CALLS = registry.register(Counter(
+    'pii_llm_calls_total', 'LLM chat calls by outcome (ok, retry, error, circuit_open)', ('outcome',)))
+LLM_CACHE_REQUESTS = registry.register(Counter(
+    'pii_llm_cache_requests_total', 'LLM synthesis cache lookups (hit, miss, deduplicated)', ('result',)))
+LLM_TOKENS = registry.register(Counter(
+    'pii_llm_tokens_total', 'LLM tokens spent, counted with tiktoken', ('kind',)))
+RESULT_CACHE_REQUESTS = registry.register(Counter(
+    'pii_result_cache_requests_total', 'Analysis result cache lookups (hit, miss, coalesced)', ('result',)))
+
+
+def count_entities(entity_types: Iterable[str]) -> None:
+    for entity_type in entity_types:
+        ENTITIES_FOUND.inc(entity_type)
+
+
+def timed_iter(iterable: Iterable, histogram: Histogram, *labels: str) -> Iterator:
+    """惰性迭代器（如 nlp.pipe）每产出一个元素记录一次耗时"""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        histogram.observe(time.perf_counter() - start, *labels)
+        yield item
+
+
+def instrument_recognizer(recognizer) -> None:
+    """在实例上包一层 analyze 计时，同一个 recognizer 只包一次"""
+    if getattr(recognizer, '_metrics_instrumented', False):
+        return
+
+    analyze = recognizer.analyze
+    labels = (recognizer.name, recognizer.supported_language)
+
+    @functools.wraps(analyze)
+    def timed_analyze(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return analyze(*args, **kwargs)
+        finally:
+            RECOGNIZER_LATENCY.observe(time.perf_counter() - start, *labels)
+
+    recognizer.analyze = timed_analyze
+    recognizer._metrics_instrumented = True
@@ -4,17 +4,74 @@
 # @Email :
 # @Desc :https://github.com/dongrixinyu/JioNLP/blob/3c0c2558ea91a4e39743d80e778b3f65db9304cb/jionlp/rule/extractor.py
 
-from presidio_analyzer import PatternRecognizer, Pattern, RecognizerResult, EntityRecognizer
+from presidio_analyzer import PatternRecognizer, Pattern, RecognizerResult, EntityRecognizer, AnalysisExplanation
 import regex as re
 from typing import List, Optional
+from contextvars import ContextVar
 from datetime import datetime  # 正确导入strptime所需的类
 import logging
 
 from presidio_analyzer.nlp_engine import NlpArtifacts
+
+from .keyword_trigger import KeywordTriggerMixin
 logger = logging.getLogger("presidio-analyzer-patch")
 
 
-class PatchPatternRecognizer(PatternRecognizer):
+# 为 True 时识别结果逐条构建 analysis_explanation（decision process），由调用方按请求设置
+decision_process = ContextVar('decision_process', default=False)
+
+DEFAULT_REGEX_FLAGS = re.DOTALL | re.MULTILINE
+
+# (regex, flags) -> 编译后的正则，同一正则的多个 recognizer 实例（如不同语言、不同 custom analyzer）共用
+_compiled_regexes = {}
+
+
+def compile_regex(regex: str, flags: int):
+    compiled = _compiled_regexes.get((regex, flags))
+    if compiled is None:
+        compiled = _compiled_regexes[(regex, flags)] = re.compile(regex, flags=flags)
+    return compiled
+
+
+class SharedExplanation(AnalysisExplanation):
+    """
+    one explanation shared by all results of a pattern when decision_process is off. The analyzer drops the
+    explanations of such results, so the context enhancer's updates are ignored instead of leaking between results
+    """
+
+    def set_improved_score(self, score: float) -> None:
+        pass
+
+    def set_supportive_context_word(self, word: str) -> None:
+        pass
+
+    def append_textual_explanation_line(self, text: str) -> None:
+        pass
+
+
+class PatchPatternRecognizer(KeywordTriggerMixin, PatternRecognizer):
+    """
+    patterns are compiled once at construction and matched against the original text (no copy),
+    results share one explanation per pattern unless decision_process is set
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._compiled_patterns = {}
+        self._shared_explanations = {}
+        self.compiled_patterns(DEFAULT_REGEX_FLAGS)
+
+    def compiled_patterns(self, flags: int = None) -> List[tuple]:
+        """
+        :return: [(pattern, compiled regex)] for the given flags
+        """
+        flags = flags if flags else DEFAULT_REGEX_FLAGS
+        compiled = self._compiled_patterns.get(flags)
+        if compiled is None:
+            compiled = [(pattern, compile_regex(pattern.regex, flags)) for pattern in self.patterns]
+            self._compiled_patterns[flags] = compiled
+        return compiled
+
     def analyze(
         self,
         text: str,
@@ -33,7 +90,6 @@ class PatchPatternRecognizer(PatternRecognizer):
         """
         results = []
         if self.patterns:
-            print('here')
             pattern_result = self._analyze_patterns(text, regex_flags)
             results.extend(pattern_result)
 
@@ -51,75 +107,99 @@ class PatchPatternRecognizer(PatternRecognizer):
         :param flags: regex flags
         :return: A list of RecognizerResult
         """
-        flags = flags if flags else re.DOTALL | re.MULTILINE
         results = []
-        text = ''.join(['#', text, '#'])
-        for pattern in self.patterns:
-            # 修复datetime调用方式
-            match_start_time = datetime.now()  # 修改点1
-            matches = re.finditer(pattern.regex, text, flags=flags)
-            match_time = datetime.now() - match_start_time  # 修改点2
-            logger.debug(
-                "--- match_time[%s]: %s.%s seconds",
-                pattern.name,
-                match_time.seconds,
-                match_time.microseconds,
-            )
+        windows = self.match_windows(text)
+        if not windows:
+            return results
+
+        with_explanation = decision_process.get()
+        compiled_patterns = self.compiled_patterns(flags)
+        # 触发窗口合并后互不相交，不同窗口的结果不会互相包含：按窗口去重，避免在全文结果上做 O(n²) 的 remove_duplicates
+        for pos, endpos in windows:
+            window_results = []
+            for pattern, compiled in compiled_patterns:
+                for match in compiled.finditer(text, pos, endpos):
+                    start, end = match.span()
+
+                    # Skip empty results
+                    if start == end:
+                        continue
 
-            for match in matches:
-                start, end = match.span()
-                current_match = text[start:end]
+                    current_match = match.group()
+                    score = pattern.score
+
+                    validation_result = self.validate_result(current_match)
+                    description = self.explanation(pattern.name, pattern.regex, score, validation_result)
+                    pattern_result = RecognizerResult(
+                        entity_type=self.supported_entities[0],
+                        start=start,
+                        end=end,
+                        score=score,
+                        analysis_explanation=description,
+                        recognition_metadata={
+                            RecognizerResult.RECOGNIZER_NAME_KEY: self.name,
+                            RecognizerResult.RECOGNIZER_IDENTIFIER_KEY: self.id,
+                        },
+                    )
+
+                    if validation_result is not None:
+                        if validation_result:
+                            pattern_result.score = EntityRecognizer.MAX_SCORE
+                        else:
+                            pattern_result.score = EntityRecognizer.MIN_SCORE
+
+                    invalidation_result = self.invalidate_result(current_match)
+                    if invalidation_result is not None and invalidation_result:
+                        pattern_result.score = EntityRecognizer.MIN_SCORE
 
-                # Skip empty results
-                if current_match == "":
-                    continue
+                    if pattern_result.score > EntityRecognizer.MIN_SCORE:
+                        window_results.append(pattern_result)
 
-                score = pattern.score
+                    # Update analysis explanation score following validation or invalidation
+                    if with_explanation:
+                        description.score = pattern_result.score
 
-                validation_result = self.validate_result(current_match)
-                description = self.build_regex_explanation(
-                    self.name, pattern.name, pattern.regex, score, validation_result
-                )
-                pattern_result = RecognizerResult(
-                    entity_type=self.supported_entities[0],
-                    start=start-1,
-                    end=end-1,
-                    score=score,
-                    analysis_explanation=description,
-                    recognition_metadata={
-                        RecognizerResult.RECOGNIZER_NAME_KEY: self.name,
-                        RecognizerResult.RECOGNIZER_IDENTIFIER_KEY: self.id,
-                    },
-                )
+            results.extend(EntityRecognizer.remove_duplicates(window_results))
 
-                if validation_result is not None:
-                    if validation_result:
-                        pattern_result.score = EntityRecognizer.MAX_SCORE
-                    else:
-                        pattern_result.score = EntityRecognizer.MIN_SCORE
+        # 与 remove_duplicates 的输出顺序相同
+        results.sort(key=lambda x: (-x.score, x.start, -(x.end - x.start)))
+        return results
 
-                invalidation_result = self.invalidate_result(current_match)
-                if invalidation_result is not None and invalidation_result:
-                    pattern_result.score = EntityRecognizer.MIN_SCORE
+    def explanation(self, pattern_name: str, pattern: str, score: float, validation_result: Optional[bool]):
+        """
+        a new explanation per result only for decision process, otherwise one read-only SharedExplanation per pattern
+        (the context enhancer still expects an explanation object on every result)
+        """
+        if decision_process.get():
+            return self.build_regex_explanation(self.name, pattern_name, pattern, score, validation_result)
 
-                if pattern_result.score > EntityRecognizer.MIN_SCORE:
-                    results.append(pattern_result)
+        description = self._shared_explanations.get(pattern_name)
+        if description is None:
+            description = SharedExplanation(recognizer=self.name, original_score=score,
+                                            pattern_name=pattern_name, pattern=pattern)
+            self._shared_explanations[pattern_name] = description
+        return description
 
-                # Update analysis explanation score following validation or invalidation
-                description.score = pattern_result.score
+    def match_windows(self, text: str) -> List[tuple]:
+        """trigger windows, the whole text when triggers are not used"""
+        windows = self.trigger_windows(text)
+        return [(0, len(text))] if windows is None else windows
 
-        results = EntityRecognizer.remove_duplicates(results)
-        return results
+    @staticmethod
+    def iter_windows(compiled, text: str, windows: List[tuple]):
+        for pos, endpos in windows:
+            yield from compiled.finditer(text, pos, endpos)
 
 
 class IDCardRecognizer(PatchPatternRecognizer):
-    ID_CARD_PATTERN = r'(?<=[^0-9a-zA-Z])' \
+    # 前后不能紧邻数字或字母，文本首尾同样视为边界
+    ID_CARD_PATTERN = r'(?<![0-9a-zA-Z])' \
                       r'((1[1-5]|2[1-3]|3[1-7]|4[1-6]|5[0-4]|6[1-5]|71|81|82|91)' \
                       r'(0[0-9]|1[0-9]|2[0-9]|3[0-4]|4[0-3]|5[1-3]|90)' \
                       r'(0[0-9]|1[0-9]|2[0-9]|3[0-9]|4[0-3]|5[1-7]|6[1-4]|7[1-4]|8[1-7])' \
                       r'(18|19|20)\d{2}(0[1-9]|1[0-2])(0[1-9]|[12][0-9]|3[01])' \
                       r'\d{3}[0-9xX])' \
-                      r'(?=[^0-9a-zA-Z])'
+                      r'(?![0-9a-zA-Z])'
 
     ID_CARD_CHECK_PATTERN = r'^(1[1-5]|2[1-3]|3[1-7]|4[1-6]|5[0-4]|6[1-5]|71|81|82|91)' \
                             r'(0[0-9]|1[0-9]|2[0-9]|3[0-4]|4[0-3]|5[1-3]|90)' \
@@ -180,6 +260,9 @@ class BirthDateRecognizer(PatchPatternRecognizer):
 
     CONTEXT = ["出生日期", "出生年月", "出生时间", "生日"]
 
+    TRIGGER_KEYWORDS = ("出生日期", "出生年月", "出生时间", "生日")
+    TRIGGER_WINDOW = 20
+
     def __init__(
       self,
       patterns: Optional[List[Pattern]] = None,
@@ -232,6 +315,9 @@ class HouseholdAddressRecognizer(PatchPatternRecognizer):
 
     CONTEXT = ["户籍地址", "户口所在地", "户籍地"]
 
+    TRIGGER_KEYWORDS = ("户籍地址", "户口所在地", "户籍地")
+    TRIGGER_WINDOW = 48
+
     def __init__(
         self,
         patterns: Optional[List[Pattern]] = None,
@@ -267,6 +353,10 @@ class ResidentialAddressRecognizer(PatchPatternRecognizer):
 
     CONTEXT = ["居住地址", "现住址", "现居住地", "住址"]
 
+    TRIGGER_KEYWORDS = ("居住地址", "现住址", "现居住地", "住址")
+    TRIGGER_PREFIX = r'[:：\s]*\(?[\u4e00-\u9fa5a-zA-Z0-9]*\)?'
+    TRIGGER_WINDOW = 48
+
     def __init__(
       self,
       patterns: Optional[List[Pattern]] = None,
@@ -327,6 +417,9 @@ class MailingAddressRecognizer(PatchPatternRecognizer):
 
     CONTEXT = ["通讯地址", "联系地址", "邮寄地址"]
 
+    TRIGGER_KEYWORDS = ("通讯地址", "联系地址", "邮寄地址")
+    TRIGGER_WINDOW = 48
+
     def __init__(
         self,
         patterns: Optional[List[Pattern]] = None,
@@ -363,6 +456,11 @@ class HomeAddressRecognizer(PatchPatternRecognizer):
     # 扩展上下文关键词
     CONTEXT = ["家庭地址", "家庭住址", "住宅地址", "家住", "家在"]
 
+    TRIGGER_KEYWORDS = ("家庭地址", "家庭住址", "住宅地址", "家住", "家在")
+    TRIGGER_WINDOW = 68
+
+    JIAZHU_PATTERN = re.compile(r'(家住|家在)[:：\s]*([^\n，。；！？]{5,60})')
+
     def __init__(
       self,
       patterns: Optional[List[Pattern]] = None,
@@ -378,7 +476,7 @@ class HomeAddressRecognizer(PatchPatternRecognizer):
             context=context,
             supported_language=supported_language,
         )
-        logger.debug(f"初始化家庭地址识别器（增强版），支持模式: {self.PATTERNS[0].regex}")
+        logger.debug("初始化家庭地址识别器（增强版），支持模式: %s", self.PATTERNS[0].regex)
 
     def validate_result(self, pattern_text: str) -> bool:
         """增强家庭地址验证逻辑"""
@@ -421,8 +519,7 @@ class HomeAddressRecognizer(PatchPatternRecognizer):
         """查找'家住'后的家庭地址"""
         results = []
         # 查找"家住"后的地址
-        jiazhu_pattern = r'(家住|家在)[:：\s]*([^\n，。；！？]{5,60})'
-        matches = re.finditer(jiazhu_pattern, text)
+        matches = self.iter_trigger_matches(self.JIAZHU_PATTERN, text)
 
         for match in matches:
             address_text = match.group(2)
@@ -433,9 +530,7 @@ class HomeAddressRecognizer(PatchPatternRecognizer):
                 continue
 
             # 创建结果对象
-            description = self.build_regex_explanation(
-                self.name, "HomeAfterJiazhu", jiazhu_pattern, self.PATTERNS[0].score, True
-            )
+            description = self.explanation("HomeAfterJiazhu", self.JIAZHU_PATTERN.pattern, self.PATTERNS[0].score, True)
             result = RecognizerResult(
                 entity_type=self.supported_entities[0],
                 start=start,
@@ -469,6 +564,10 @@ class CompanyNameRecognizer(PatchPatternRecognizer):
     # 保留原有上下文关键词
     CONTEXT = ["甲方", "乙方", "公司名称", "单位名称", "企业名称", "机构名称", "单位", "企业", "所属单位", "归", "所属公司"]
 
+    TRIGGER_KEYWORDS = ("甲方", "乙方", "公司名称", "单位名称", "企业名称", "机构名称", "所属单位", "归", "所属公司")
+    TRIGGER_PREFIX = r'[:：\s为]*'
+    TRIGGER_WINDOW = 68
+
     # 保留原有公司后缀
     COMPANY_SUFFIXES = ["公司", "有限公司", "股份公司", "集团", "分公司", "厂", "所", "中心", "事务所", "工作室", "分行", "支行", "分店"]
 
@@ -503,15 +602,15 @@ class CompanyNameRecognizer(PatchPatternRecognizer):
             context=context,
             supported_language=supported_language,
         )
-        logger.debug(f"初始化公司名称识别器（增强后缀排除版）")
+        logger.debug("初始化公司名称识别器（增强后缀排除版）")
 
     def validate_result(self, pattern_text: str) -> bool:
         """增强验证逻辑：添加后缀排除机制"""
-        logger.debug(f"验证公司名称: {pattern_text}")
+        logger.debug("验证公司名称: %s", pattern_text)
 
         # 1. 检查是否包含个人敏感词（黑名单）
         if any(keyword in pattern_text for keyword in self.PERSONAL_KEYWORD_BLACKLIST):
-            logger.debug(f"排除包含个人敏感词: {pattern_text}")
+            logger.debug("排除包含个人敏感词: %s", pattern_text)
             return False
 
         # 2. 检查是否包含公司后缀或白名单关键词
@@ -519,12 +618,12 @@ class CompanyNameRecognizer(PatchPatternRecognizer):
         has_company_keyword = any(keyword in pattern_text for keyword in self.COMPANY_KEYWORD_WHITELIST)
 
         if not (has_suffix or has_company_keyword):
-            logger.debug(f"不包含公司特征词: {pattern_text}")
+            logger.debug("不包含公司特征词: %s", pattern_text)
             return False
 
         # 3. 检查是否以排除后缀结尾
         if any(pattern_text.endswith(suffix) for suffix in self.EXCLUDE_SUFFIXES):
-            logger.debug(f"以排除后缀结尾: {pattern_text}")
+            logger.debug("以排除后缀结尾: %s", pattern_text)
             return False
 
         # 4. 保留原有长度和格式检查
@@ -536,12 +635,13 @@ class CompanyNameRecognizer(PatchPatternRecognizer):
       self, text: str, flags: int = None
     ) -> List[RecognizerResult]:
         """重写分析逻辑，准确提取公司名称"""
-        flags = flags if flags else re.DOTALL | re.MULTILINE
         results = []
-        text = ''.join(['#', text, '#'])  # 添加边界符
+        windows = self.match_windows(text)
+        if not windows:
+            return results
 
-        for pattern in self.patterns:
-            matches = re.finditer(pattern.regex, text, flags=flags)
+        for pattern, compiled in self.compiled_patterns(flags):
+            matches = self.iter_windows(compiled, text, windows)
 
             for match in matches:
                 # 获取匹配的公司名称部分（第二个捕获组）
@@ -556,23 +656,21 @@ class CompanyNameRecognizer(PatchPatternRecognizer):
                 # 新增：预过滤检查上下文
                 preceding_text = text[max(0, start - 20):start]
                 if any(keyword in preceding_text for keyword in self.PERSONAL_KEYWORD_BLACKLIST):
-                    logger.debug(f"跳过个人敏感词附近匹配: {company_text}")
+                    logger.debug("跳过个人敏感词附近匹配: %s", company_text)
                     continue
 
                 # 验证公司名称
                 validation_result = self.validate_result(company_text)
                 if not validation_result:
-                    logger.debug(f"验证失败: {company_text}")
+                    logger.debug("验证失败: %s", company_text)
                     continue
 
                 # 创建结果对象
-                description = self.build_regex_explanation(
-                    self.name, pattern.name, pattern.regex, pattern.score, validation_result
-                )
+                description = self.explanation(pattern.name, pattern.regex, pattern.score, validation_result)
                 pattern_result = RecognizerResult(
                     entity_type=self.supported_entities[0],
-                    start=start - 1,  # 减去边界符
-                    end=end - 1,  # 减去边界符
+                    start=start,
+                    end=end,
                     score=pattern.score,
                     analysis_explanation=description,
                     recognition_metadata={
@@ -601,6 +699,11 @@ class CompanyAddressRecognizer(PatchPatternRecognizer):
 
     CONTEXT = ["住所", "住 所", "办公地址", "公司所在地", "公司地址", "地址", "注册地址"]
 
+    # "住" 覆盖 住\s*所
+    TRIGGER_KEYWORDS = ("住", "办公地址", "公司所在地", "公司地址", "地址", "注册地址")
+    TRIGGER_PREFIX = r'\s*所?[:：\s]*'
+    TRIGGER_WINDOW = 68
+
     def __init__(
       self,
       patterns: Optional[List[Pattern]] = None,
@@ -616,11 +719,11 @@ class CompanyAddressRecognizer(PatchPatternRecognizer):
             context=context,
             supported_language=supported_language,
         )
-        logger.debug(f"初始化公司住所识别器，支持模式: {self.PATTERNS[0].regex}")
+        logger.debug("初始化公司住所识别器，支持模式: %s", self.PATTERNS[0].regex)
 
     def validate_result(self, pattern_text: str) -> bool:
         """增强公司地址验证逻辑"""
-        logger.debug(f"验证公司地址: {pattern_text}")
+        logger.debug("验证公司地址: %s", pattern_text)
 
         # 1. 检查地址特征词（加强版）
         address_features = ["区", "街道", "路", "号", "院", "楼", "栋", "室", "大厦", "层"]
@@ -643,7 +746,7 @@ class CompanyAddressRecognizer(PatchPatternRecognizer):
         return False
 
 
-class SalaryAmountRecognizer(PatternRecognizer):
+class SalaryAmountRecognizer(PatchPatternRecognizer):
     """工资金额识别器（完整版）"""
 
     # 匹配模式：灵活匹配各种工资表述
@@ -664,6 +767,12 @@ class SalaryAmountRecognizer(PatternRecognizer):
     # 扩展上下文关键词
     CONTEXT = ["工资", "月工资", "薪酬标准", "月薪", "年薪", "薪资", "报酬", "薪金", "收入", "待遇"]
 
+    TRIGGER_KEYWORDS = ("工资", "月工资", "薪酬标准", "月薪", "年薪", "薪资", "报酬", "薪金", "收入", "待遇")
+    TRIGGER_PREFIX = r'[:：\s为]*'
+    TRIGGER_WINDOW = 64
+
+    STANDALONE_PATTERN = re.compile(r'(?<=(薪酬标准|工资|月薪)[:：\s为]+)([\d,]+(\.\d{1,2})?)')
+
     # 中文大写数字映射
     CHINESE_NUMERALS = {
         '零': 0, '一': 1, '二': 2, '三': 3, '四': 4, '五': 5,
@@ -686,7 +795,7 @@ class SalaryAmountRecognizer(PatternRecognizer):
             context=context,
             supported_language=supported_language,
         )
-        logger.debug(f"初始化工资金额识别器，支持模式: {self.PATTERNS[0].regex}")
+        logger.debug("初始化工资金额识别器，支持模式: %s", self.PATTERNS[0].regex)
 
     def validate_result(self, pattern_text: str) -> bool:
         """验证金额格式是否合理"""
@@ -702,7 +811,7 @@ class SalaryAmountRecognizer(PatternRecognizer):
         except (ValueError, TypeError):
             return False
         except Exception as e:
-            logger.error(f"金额解析错误: {pattern_text} - {str(e)}")
+            logger.error("金额解析错误: %s - %s", pattern_text, e)
             return False
 
     def analyze(
@@ -713,7 +822,7 @@ class SalaryAmountRecognizer(PatternRecognizer):
       regex_flags: int = None,
     ) -> List[RecognizerResult]:
         """重写分析方法，增强工资金额识别"""
-        # 首先使用默认分析逻辑
+        # 首先使用默认分析逻辑：预编译的正则只在命中关键词的窗口内匹配
         results = super().analyze(text, entities, nlp_artifacts, regex_flags)
 
         # 额外尝试匹配纯数字金额（针对"薪酬标准：36000"格式）
@@ -726,8 +835,7 @@ class SalaryAmountRecognizer(PatternRecognizer):
         """查找独立数字金额"""
         results = []
         # 查找关键词后的数字金额
-        standalone_pattern = r'(?<=(薪酬标准|工资|月薪)[:：\s为]+)([\d,]+(\.\d{1,2})?)'
-        matches = re.finditer(standalone_pattern, text)
+        matches = self.iter_trigger_matches(self.STANDALONE_PATTERN, text)
 
         for match in matches:
             amount_text = match.group(2)
@@ -742,8 +850,8 @@ class SalaryAmountRecognizer(PatternRecognizer):
                 continue
 
             # 创建结果对象
-            description = self.build_regex_explanation(
-                self.name, "StandaloneSalary", standalone_pattern, self.PATTERNS[0].score, True
+            description = self.explanation(
+                "StandaloneSalary", self.STANDALONE_PATTERN.pattern, self.PATTERNS[0].score, True
             )
             result = RecognizerResult(
                 entity_type=self.supported_entities[0],
@@ -814,62 +922,6 @@ class SalaryAmountRecognizer(PatternRecognizer):
 
         return total
 
-    def _analyze_patterns(
-      self, text: str, flags: int = None
-    ) -> List[RecognizerResult]:
-        """重写分析逻辑，准确提取金额部分"""
-        flags = flags if flags else re.DOTALL | re.MULTILINE
-        results = []
-        text = ''.join(['#', text, '#'])  # 添加边界符
-
-        for pattern in self.patterns:
-            matches = re.finditer(pattern.regex, text, flags=flags)
-
-            for match in matches:
-                start, end = match.span()
-                full_match = text[start:end]
-
-                # 提取金额部分（正则表达式的第4组）
-                amount_text = match.group(4)
-                if not amount_text:
-                    logger.debug(f"未找到金额部分: {full_match}")
-                    continue
-
-                # 验证金额
-                try:
-                    amount = self.parse_amount(amount_text)
-                    if not (1000 <= amount <= 10000000):
-                        logger.debug(f"金额超出范围: {amount_text} ({amount})")
-                        continue
-                except Exception as e:
-                    logger.debug(f"金额解析失败: {amount_text} - {str(e)}")
-                    continue
-
-                # 计算金额部分的实际位置
-                amount_start = start + match.start(4)
-                amount_end = start + match.end(4)
-
-                # 创建结果对象
-                description = self.build_regex_explanation(
-                    self.name, pattern.name, pattern.regex, pattern.score, True
-                )
-                result = RecognizerResult(
-                    entity_type=self.supported_entities[0],
-                    start=amount_start - 1,  # 减去边界符
-                    end=amount_end - 1,  # 减去边界符
-                    score=pattern.score,
-                    analysis_explanation=description,
-                    recognition_metadata={
-                        RecognizerResult.RECOGNIZER_NAME_KEY: self.name,
-                        RecognizerResult.RECOGNIZER_IDENTIFIER_KEY: self.id,
-                        "amount": amount,
-                        "full_match": full_match
-                    },
-                )
-                results.append(result)
-
-        return EntityRecognizer.remove_duplicates(results)
-
 
 class BankCardRecognizer(PatchPatternRecognizer):
     """银行卡号识别器（修复版）"""
@@ -921,6 +973,11 @@ class BankCardRecognizer(PatchPatternRecognizer):
 
     CONTEXT = ["银行卡", "储蓄卡", "信用卡", "借记卡", "工资卡", "卡号", "账号", "账户"]
 
+    TRIGGER_KEYWORDS = ("银行卡", "储蓄卡", "信用卡", "借记卡", "工资卡", "卡号", "账号", "账户")
+    TRIGGER_WINDOW = 30
+
+    TABLE_PATTERN = re.compile(r'(工资卡卡号|银行卡号|卡号)[:：\s]*([0-9\s\-]{14,22})')
+
     def __init__(
       self,
       patterns: Optional[List[Pattern]] = None,
@@ -936,7 +993,7 @@ class BankCardRecognizer(PatchPatternRecognizer):
             context=context,
             supported_language=supported_language,
         )
-        logger.debug(f"初始化银行卡号识别器，支持模式: {self.PATTERNS[0].regex}")
+        logger.debug("初始化银行卡号识别器，支持模式: %s", self.PATTERNS[0].regex)
 
     def validate_result(self, pattern_text: str) -> bool:
         """验证银行卡号格式是否合法"""
@@ -945,12 +1002,12 @@ class BankCardRecognizer(PatchPatternRecognizer):
 
         # 2. 检查长度（中国银行卡号通常为16-19位）
         if not (16 <= len(clean_text) <= 19):
-            logger.debug(f"银行卡号长度无效: {clean_text} ({len(clean_text)}位)")
+            logger.debug("银行卡号长度无效: %s (%s位)", clean_text, len(clean_text))
             return False
 
         # 3. 检查是否为纯数字
         if not clean_text.isdigit():
-            logger.debug(f"银行卡号包含非数字字符: {clean_text}")
+            logger.debug("银行卡号包含非数字字符: %s", clean_text)
             return False
 
         # 4. 检查BIN前缀（银行标识号）
@@ -964,14 +1021,14 @@ class BankCardRecognizer(PatchPatternRecognizer):
                     bin_valid = True
                     matched_bank = bank
                     matched_prefix = prefix
-                    logger.debug(f"匹配到{matched_bank}的BIN前缀: {matched_prefix}")
+                    logger.debug("匹配到%s的BIN前缀: %s", matched_bank, matched_prefix)
                     break
             if bin_valid:
                 break
 
         # 5. Luhn算法验证（校验位检查）
         if not self.luhn_check(clean_text):
-            logger.debug(f"银行卡号校验失败(Luhn算法): {clean_text}")
+            logger.debug("银行卡号校验失败(Luhn算法): %s", clean_text)
             return False
 
         return True
@@ -1012,8 +1069,7 @@ class BankCardRecognizer(PatchPatternRecognizer):
         """查找表格格式的银行卡号"""
         results = []
         # 查找"工资卡卡号"后的银行卡号
-        table_pattern = r'(工资卡卡号|银行卡号|卡号)[:：\s]*([0-9\s\-]{14,22})'
-        matches = re.finditer(table_pattern, text)
+        matches = self.iter_trigger_matches(self.TABLE_PATTERN, text)
 
         for match in matches:
             card_text = match.group(2)
@@ -1024,9 +1080,7 @@ class BankCardRecognizer(PatchPatternRecognizer):
                 continue
 
             # 创建结果对象
-            description = self.build_regex_explanation(
-                self.name, "TableBankCard", table_pattern, self.PATTERNS[0].score, True
-            )
+            description = self.explanation("TableBankCard", self.TABLE_PATTERN.pattern, self.PATTERNS[0].score, True)
             result = RecognizerResult(
                 entity_type=self.supported_entities[0],
                 start=start,
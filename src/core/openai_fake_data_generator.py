@@ -2,18 +2,12 @@ import openai
 import tiktoken
 
 import os
+from functools import lru_cache
+from typing import List
 
 openai.api_key = os.getenv('OPENAI_API_KEY')
 
 
-def openai_chat(messages: list, model="gpt-3.5-turbo", temperature=0) -> str:
-    return openai.ChatCompletion.create(
-        model=model,
-        messages=messages,
-        temperature=temperature
-    ).choices[0].message.content
-
-
 def create_messages(anonymized_text: str) -> list:
     """
     Create the prompt with instructions to GPT-3.
@@ -53,7 +47,21 @@ output: """
     return messages
 
 
+@lru_cache(maxsize=None)
+def get_encoder(model='gpt-3.5-turbo') -> tiktoken.Encoding:
+    """每个模型只创建一次 encoder，未知模型使用 cl100k_base"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
+
+
 # https://tiktoken.aigc2d.com/
 def get_text_token(text: str, model='gpt-3.5-turbo'):
-    encoder = tiktoken.encoding_for_model(model)
-    return len(encoder.encode(text))
+    # encode_ordinary：文本中出现 <|endoftext|> 等特殊 token 字面量时按普通文本计数而不是报错
+    return len(get_encoder(model).encode_ordinary(text))
+
+
+def get_text_tokens(texts: List[str], model='gpt-3.5-turbo') -> List[int]:
+    """批量计算 token 数"""
+    return [len(tokens) for tokens in get_encoder(model).encode_ordinary_batch(texts)]
@@ -4,7 +4,7 @@
 # @Email :
 # @Desc :
 
-from presidio_analyzer import RecognizerRegistry, PatternRecognizer, Pattern
+from presidio_analyzer import RecognizerRegistry, PatternRecognizer, Pattern, RecognizerResult, EntityRecognizer
 from presidio_analyzer.predefined_recognizers import (
     CreditCardRecognizer,
     CryptoRecognizer,
@@ -25,14 +25,23 @@ from presidio_analyzer.predefined_recognizers import (
     AuAbnRecognizer,
     AuAcnRecognizer,
     AuTfnRecognizer,
-    AuMedicareRecognizer
+    AuMedicareRecognizer,
+    SpacyRecognizer
 )
 
-from presidio_analyzer.nlp_engine import NlpEngine, NlpArtifacts
+from presidio_analyzer.nlp_engine import NlpEngine, NlpArtifacts, SpacyNlpEngine
+from presidio_anonymizer import AnonymizerEngine
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 
+import os
+import threading
+import time
+import logging
 import regex as re
+import spacy
+
+from .deny_list_matcher import DenyListMatcher
 
 from .new_recognizer import (
     IDCardRecognizer,
@@ -48,13 +57,139 @@ from .new_recognizer import (
 )
 #from .new_recognizer import IDCardRecognizer
 
+logger = logging.getLogger("presidio-analyzer-patch")
+
+# deny list 词条数达到该值时改用 Aho-Corasick 自动机匹配
+DENY_LIST_AUTOMATON_THRESHOLD = int(os.getenv('PII_DENY_LIST_AUTOMATON_THRESHOLD', 1000))
+
+
+class LazySpacyModels(dict):
+    """
+    lang_code -> spaCy 模型，首次访问某个语言时才加载，并发访问只加载一次
+    """
+
+    def __init__(self, models: Dict[str, str]):
+        super().__init__()
+        self.models = models
+        self.load_seconds: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def __missing__(self, lang_code: str):
+        if lang_code not in self.models:
+            raise KeyError(lang_code)
+        with self._lock:
+            if not dict.__contains__(self, lang_code):
+                start = time.perf_counter()
+                # 与 SpacyNlpEngine 一致，不加载 parser
+                self[lang_code] = spacy.load(self.models[lang_code], disable=["parser"])
+                self.load_seconds[lang_code] = time.perf_counter() - start
+                logger.info("loaded spaCy model %s for %s in %.2fs",
+                            self.models[lang_code], lang_code, self.load_seconds[lang_code])
+        return dict.__getitem__(self, lang_code)
+
+    def loaded(self) -> List[str]:
+        return list(dict.keys(self))
+
+
+class LazySpacyNlpEngine(SpacyNlpEngine):
+    """
+    SpacyNlpEngine 在创建时加载全部模型，这里改为各语言首次使用时加载
+    """
+
+    def __init__(self, models: Optional[Dict[str, str]] = None):
+        self.nlp = LazySpacyModels(models or {"en": "en_core_web_lg"})
+
+
+class RecognizerIndex:
+    """(language, entity) -> recognizers 与 language -> recognizers，均保持注册顺序"""
+
+    def __init__(self, recognizers: List[EntityRecognizer]):
+        self.by_language: Dict[str, List[EntityRecognizer]] = {}
+        self.by_entity: Dict[tuple, List[EntityRecognizer]] = {}
+        for recognizer in recognizers:
+            self.by_language.setdefault(recognizer.supported_language, []).append(recognizer)
+            for entity in recognizer.supported_entities:
+                self.by_entity.setdefault((recognizer.supported_language, entity), []).append(recognizer)
+
 
 class OptimizeRecognizerRegistry(RecognizerRegistry):
+    """
+    按 (language, entity) 索引 recognizer，每次调用只取请求实体对应的 recognizer，不再遍历全部列表；
+    recognizers 被整体替换或经 add / remove_recognizer 修改时索引在下次查询时重建
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._index: Optional[RecognizerIndex] = None
+        super().__init__(*args, **kwargs)
+
+    @property
+    def recognizers(self) -> List[EntityRecognizer]:
+        return self._recognizers
+
+    @recognizers.setter
+    def recognizers(self, recognizers: List[EntityRecognizer]):
+        self._recognizers = recognizers
+        self._index = None
+
+    @property
+    def index(self) -> RecognizerIndex:
+        index = self._index
+        if index is None:
+            index = self._index = RecognizerIndex(self._recognizers)
+        return index
+
+    def add_recognizer(self, recognizer: EntityRecognizer) -> None:
+        super().add_recognizer(recognizer)
+        self._index = None
+
+    def get_recognizers(
+        self,
+        language: str,
+        entities: Optional[List[str]] = None,
+        all_fields: bool = False,
+        ad_hoc_recognizers: Optional[List[EntityRecognizer]] = None,
+    ) -> List[EntityRecognizer]:
+        """Same as RecognizerRegistry.get_recognizers, looked up in the index, in registration order"""
+        if ad_hoc_recognizers:
+            return super().get_recognizers(language, entities, all_fields, ad_hoc_recognizers)
+        if language is None:
+            raise ValueError("No language provided")
+        if entities is None and all_fields is False:
+            raise ValueError("No entities provided")
+
+        index = self.index
+        if all_fields:
+            to_return = list(index.by_language.get(language, ()))
+        else:
+            # 一个 recognizer 可能支持多个请求的实体，按 id 去重
+            selected = {}
+            for entity in entities:
+                subset = index.by_entity.get((language, entity))
+                if not subset:
+                    logger.warning("Entity %s doesn't have the corresponding recognizer in language : %s",
+                                   entity, language)
+                    continue
+                for recognizer in subset:
+                    selected.setdefault(id(recognizer), recognizer)
+            to_return = list(selected.values())
+
+        if not to_return:
+            raise ValueError("No matching recognizers were found to serve the request.")
+        return to_return
+
+    @staticmethod
+    def _get_nlp_recognizer(nlp_engine: NlpEngine):
+        # 基类按 type 严格比较，LazySpacyNlpEngine 会被当作未知引擎
+        if isinstance(nlp_engine, LazySpacyNlpEngine):
+            return SpacyRecognizer
+        return RecognizerRegistry._get_nlp_recognizer(nlp_engine)
+
     def load_predefined_recognizers(
         self, languages: Optional[List[str]] = None, nlp_engine: NlpEngine = None
     ) -> None:
         """
-        Load the existing recognizers into memory.
+        Load the existing recognizers into memory. Language specific recognizers (the zh ones written for
+        Chinese text, the US / UK / SG / AU ones for en) are only registered for their language.
 
         :param languages: List of languages for which to load recognizers
         :param nlp_engine: The NLP engine to use.
@@ -79,6 +214,21 @@ class OptimizeRecognizerRegistry(RecognizerRegistry):
                 AuMedicareRecognizer,
                 PhoneRecognizer
             ],
+            # 新增自定义Recognizer，正则、上下文词均为中文
+            "zh": [
+                IDCardRecognizer,
+                BirthDateRecognizer,
+                HouseholdAddressRecognizer,
+                ResidentialAddressRecognizer,
+                MailingAddressRecognizer,
+                HomeAddressRecognizer,
+                CompanyNameRecognizer,
+                CompanyAddressRecognizer,
+                SalaryAmountRecognizer,
+                BankCardRecognizer,
+                lambda: PhoneRecognizer(supported_language="zh", context=["电话", "号码", "手机"],
+                                        supported_regions=('CN',)),
+            ],
             "ALL": [
                 CreditCardRecognizer,
                 CryptoRecognizer,
@@ -89,31 +239,13 @@ class OptimizeRecognizerRegistry(RecognizerRegistry):
                 MedicalLicenseRecognizer,
                 nlp_recognizer,
                 UrlRecognizer,
-                # 新增自定义Recognizer
-                BirthDateRecognizer,
-                HouseholdAddressRecognizer,
-                ResidentialAddressRecognizer,
-                MailingAddressRecognizer,
-                HomeAddressRecognizer,
-                CompanyNameRecognizer,
-                CompanyAddressRecognizer,
-                SalaryAmountRecognizer,
-                BankCardRecognizer
             ],
         }
+        recognizers = list(self.recognizers)
         for lang in languages:
-            lang_recognizers = [rc() for rc in recognizers_map.get(lang, [])]
-            self.recognizers.extend(lang_recognizers)
-            all_recognizers = [
-                rc(supported_language=lang) for rc in recognizers_map.get("ALL", [])
-            ]
-            self.recognizers.extend(all_recognizers)
-
-        if 'zh' in languages:
-            phone_recognizer_zh = PhoneRecognizer(supported_language="zh", context=["电话", "号码", "手机"],
-                                                  supported_regions=('CN',))
-            self.recognizers.append(phone_recognizer_zh)
-            self.recognizers.append(IDCardRecognizer())
+            recognizers.extend(rc() for rc in recognizers_map.get(lang, []))
+            recognizers.extend(rc(supported_language=lang) for rc in recognizers_map.get("ALL", []))
+        self.recognizers = recognizers
 
 
 class ZhNlpArtifacts(NlpArtifacts):
@@ -148,15 +280,65 @@ class ZhNlpArtifacts(NlpArtifacts):
 
 
 class ZhPatternRecognizer(PatternRecognizer):
-    def _deny_list_to_regex(self, deny_list: List[str]) -> Pattern:
+    def __init__(self, *args, **kwargs):
+        self.deny_list_matcher = None
+        super().__init__(*args, **kwargs)
+        # 大 deny list 由自动机匹配，_deny_list_to_regex 返回的占位 None 不参与正则匹配
+        self.patterns = [pattern for pattern in self.patterns if pattern is not None]
+
+    def analyze(
+        self,
+        text: str,
+        entities: List[str],
+        nlp_artifacts: NlpArtifacts = None,
+        regex_flags: int = None,
+    ) -> List[RecognizerResult]:
+        results = super().analyze(text, entities, nlp_artifacts, regex_flags)
+        if self.deny_list_matcher is not None:
+            results.extend(self._analyze_deny_list(text))
+
+        return results
+
+    def _analyze_deny_list(self, text: str) -> List[RecognizerResult]:
+        """
+        Same results as the deny-list regex pattern, found with the Aho-Corasick matcher
+        """
+        if self.deny_list_score <= EntityRecognizer.MIN_SCORE:
+            return []
+
+        results = []
+        for start, end in self.deny_list_matcher.iter_spans(text):
+            description = self.build_regex_explanation(
+                self.name, "deny_list", "aho-corasick", self.deny_list_score, None
+            )
+            results.append(RecognizerResult(
+                entity_type=self.supported_entities[0],
+                start=start,
+                end=end,
+                score=self.deny_list_score,
+                analysis_explanation=description,
+                recognition_metadata={
+                    RecognizerResult.RECOGNIZER_NAME_KEY: self.name,
+                    RecognizerResult.RECOGNIZER_IDENTIFIER_KEY: self.id,
+                },
+            ))
+
+        return EntityRecognizer.remove_duplicates(results)
+
+    def _deny_list_to_regex(self, deny_list: List[str]) -> Optional[Pattern]:
         """
         Convert a list of words to a matching regex.
 
         To be analyzed by the analyze method as any other regex patterns.
+        Lists with DENY_LIST_AUTOMATON_THRESHOLD or more words are matched by DenyListMatcher instead,
+        None is returned in that case.
 
         :param deny_list: the list of words to detect
         :return:the regex of the words for detection
         """
+        if len(deny_list) >= DENY_LIST_AUTOMATON_THRESHOLD:
+            self.deny_list_matcher = DenyListMatcher(deny_list, word_boundary=self.supported_language != 'zh')
+            return None
 
         # Escape deny list elements as preparation for regex
         escaped_deny_list = [re.escape(element) for element in deny_list]
@@ -165,3 +347,17 @@ class ZhPatternRecognizer(PatternRecognizer):
         else:
             regex = r"(?:^|(?<=\W))(" + "|".join(escaped_deny_list) + r")(?:(?=\W)|$)"
         return Pattern(name="deny_list", regex=regex, score=self.deny_list_score)
+
+
+class OffsetAnonymizerEngine(AnonymizerEngine):
+    """
+    anonymize 的结果额外带上 replacements：[(原文 start, end, 新文本 start, end)]，
+    为冲突合并之后实际替换的位置，按位置排序，供后续阶段换算偏移
+    """
+
+    def _operate(self, text, pii_entities, operators_metadata, operator_type):
+        engine_result = super()._operate(text, pii_entities, operators_metadata, operator_type)
+        sources = sorted((entity.start, entity.end) for entity in pii_entities)
+        targets = sorted((item.start, item.end) for item in engine_result.items)
+        engine_result.replacements = [source + target for source, target in zip(sources, targets)]
+        return engine_result
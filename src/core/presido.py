@@ -4,23 +4,44 @@
 # @Email :
 # @Desc : https://github.com/microsoft/presidio
 # https://huggingface.co/spaces/presidio/presidio_demo/tree/main
-import json
+import time
+
+IMPORT_START = time.perf_counter()
+
+import multiprocessing
 import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
 
-from presidio_analyzer import AnalyzerEngine, RecognizerRegistry
-from presidio_analyzer.nlp_engine import NlpEngineProvider, NlpArtifacts
+from presidio_analyzer import AnalyzerEngine, RecognizerRegistry, PatternRecognizer
+from presidio_analyzer.predefined_recognizers import SpacyRecognizer
+from presidio_analyzer.nlp_engine import NlpArtifacts
+from spacy.tokens import Doc
 
-from presidio_anonymizer import AnonymizerEngine, DeanonymizeEngine
+from presidio_anonymizer import DeanonymizeEngine
 from presidio_anonymizer.entities import RecognizerResult, OperatorConfig, OperatorResult
 
-from .presidio_zh_patch import OptimizeRecognizerRegistry, ZhNlpArtifacts, ZhPatternRecognizer
-from .openai_fake_data_generator import create_messages, openai_chat, get_text_token
+from .presidio_zh_patch import (OptimizeRecognizerRegistry, ZhNlpArtifacts, ZhPatternRecognizer, OffsetAnonymizerEngine,
+                                LazySpacyNlpEngine)
+from .openai_fake_data_generator import create_messages
+from .llm_client import llm_client, LLM_MODEL
+from .llm_chunker import split_for_llm, chunk_token_budget
+from .surrogate import Surrogate  # noqa: F401 注册 surrogate 操作
+from .vault import pseudonym_vault, Pseudonymize, DEFAULT_TENANT, PSEUDONYMIZE
+from .cache import TTLLRUCache, SqliteCache, SingleFlight, stable_hash
+from .new_recognizer import decision_process, PatchPatternRecognizer, DEFAULT_REGEX_FLAGS
+from .chunking import split_chunks, merge_chunk_results
+from .columnar import ColumnarResults
+from .custom_registry import CustomRecognizerStore, CUSTOM_RECOGNIZERS_PATH
+from .doc_context import DocContext, OffsetMap
+from .metrics import STAGE_LATENCY, SPACY_LATENCY, INPUT_SIZE, RESULT_CACHE_REQUESTS, count_entities, instrument_recognizer, timed_iter
 
 from .schema_copy import AnalyzeResult, OperatorConf, CustomAnalyzeModel
 
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Union
 
-import math
+import regex as re
 import spacy
 
 
@@ -29,27 +50,81 @@ configuration = {
     "models": [
         {"lang_code": "zh", "model_name": "zh_core_web_sm"},
         {"lang_code": "en", "model_name": "en_core_web_lg"}
-    ]
+    ],
+    # 每次调用实际运行的 spaCy 组件，None 为加载的全部组件（parser 在加载时已关闭），按请求实体选用，见 pipeline_profile
+    "pipeline_profiles": {
+        # NER 实体 + 上下文增强
+        "full": None,
+        # 只有 NER 实体，recognizer 都不带上下文词
+        "ner-only": ["tok2vec", "ner"],
+        # 只有正则、关键词实体，上下文增强需要词性和词形
+        "tokens+lemmas": ["tok2vec", "tagger", "morphologizer", "attribute_ruler", "lemmatizer"],
+        # recognizer 都不带上下文词（如自定义 deny list），只分词
+        "tokens": [],
+    }
 }
 
-USED_TOEKN = get_text_token(str(create_messages('')))
+PROFILE_FULL, PROFILE_NER, PROFILE_LEMMAS, PROFILE_TOKENS = 'full', 'ner-only', 'tokens+lemmas', 'tokens'
+
+# analyze 的输出格式：records 为 dict 列表，columnar 为 ColumnarResults
+FORMAT_RECORDS, FORMAT_COLUMNAR = 'records', 'columnar'
+
+# nlp.pipe batch size used by analyze_batch
+BATCH_SIZE = int(os.getenv('PII_BATCH_SIZE', 64))
+
+# custom_analyze 按实体定义缓存编译好的 recognizer 及 AnalyzerEngine
+CUSTOM_ANALYZER_CACHE_SIZE = int(os.getenv('PII_CUSTOM_ANALYZER_CACHE_SIZE', 256))
+CUSTOM_ANALYZER_CACHE_TTL = float(os.getenv('PII_CUSTOM_ANALYZER_CACHE_TTL', 3600))
+
+# analyze / custom_analyze 结果缓存：memory 进程内，sqlite 本机所有 worker 共享，none 不缓存
+RESULT_CACHE_BACKEND = os.getenv('PII_RESULT_CACHE_BACKEND', 'memory')
+RESULT_CACHE_SIZE = int(os.getenv('PII_RESULT_CACHE_SIZE', 10000))
+RESULT_CACHE_TTL = float(os.getenv('PII_RESULT_CACHE_TTL', 3600))
+RESULT_CACHE_MAX_BYTES = int(os.getenv('PII_RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+RESULT_CACHE_PATH = os.getenv('PII_RESULT_CACHE_PATH', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'pii_result_cache.sqlite'))
+
+# 超过该字符数的文本按长文档切块，多进程并行分析
+LONG_DOC_THRESHOLD = int(os.getenv('PII_LONG_DOC_THRESHOLD', 100000))
+LONG_DOC_CHUNK_SIZE = int(os.getenv('PII_LONG_DOC_CHUNK_SIZE', 20000))
+LONG_DOC_CHUNK_OVERLAP = int(os.getenv('PII_LONG_DOC_CHUNK_OVERLAP', 512))
+# 长文档分析的进程数，<= 1 时在当前进程内逐块分析；多进程模式下每个 worker 各有一个进程池，
+# 默认按 worker 数（serve_prefork 写入 PII_WORKERS）平分 cpu 核数，避免 workers x cpu 核数个进程争抢 cpu
+WORKERS = int(os.getenv('PII_WORKERS', 0))
+LONG_DOC_PROCESSES = int(os.getenv('PII_LONG_DOC_PROCESSES', max(1, (os.cpu_count() or 1) // max(1, WORKERS))))
+
+# 启动预热时加载模型的语言，逗号分隔，未列出的语言在首次请求时加载；为空时全部延迟加载
+PRELOAD_LANGUAGES = [lang.strip() for lang in os.getenv('PII_PRELOAD_LANGUAGES', 'zh,en').split(',') if lang.strip()]
+# 启动时是否预热：加载上述模型、编译所有 recognizer 正则并分析示例文本，0 时关闭
+WARMUP = int(os.getenv('PII_WARMUP', 1))
+WARMUP_TEXTS = {
+    'zh': '李雷的电话号码是13122832932，身份证号110101199003074514，家住北京市朝阳区光华路7号，邮箱lilei@example.com。',
+    'en': 'John Smith lives in New York, his phone number is 212-555-5555 and email is john@example.com.',
+}
 
-mul_lang_model = "xx_sent_ud_sm"
-try:
-    nlp = spacy.load(mul_lang_model)
-except:
-    spacy.cli.download(mul_lang_model)
-    nlp = spacy.load(mul_lang_model)
+
+def create_result_cache():
+    if RESULT_CACHE_BACKEND == 'memory':
+        return TTLLRUCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL, max_bytes=RESULT_CACHE_MAX_BYTES)
+    if RESULT_CACHE_BACKEND == 'sqlite':
+        return SqliteCache(RESULT_CACHE_PATH, RESULT_CACHE_SIZE, RESULT_CACHE_TTL, max_bytes=RESULT_CACHE_MAX_BYTES)
+    if RESULT_CACHE_BACKEND == 'none':
+        return None
+    raise ValueError(f'unknown PII_RESULT_CACHE_BACKEND {RESULT_CACHE_BACKEND}, use memory, sqlite or none')
 
 
 class PresidioEngine:
     def __init__(self):
         lang = ["zh", "en"]
-        provider = NlpEngineProvider(nlp_configuration=configuration)
-        self.nlp_engine_with_zh = provider.create_engine()
+        self.nlp_engine_with_zh = LazySpacyNlpEngine({m['lang_code']: m['model_name'] for m in configuration['models']})
 
         registry = OptimizeRecognizerRegistry()
         registry.load_predefined_recognizers(nlp_engine=self.nlp_engine_with_zh, languages=lang)
+        for recognizer in registry.recognizers:
+            instrument_recognizer(recognizer)
+        # 持久化的命名自定义 recognizer，加入同一个 registry，与内置 recognizer 一起识别
+        self.custom_recognizers = CustomRecognizerStore(CUSTOM_RECOGNIZERS_PATH, registry)
+        self.custom_recognizers.refresh()
 
         self.analyzer = AnalyzerEngine(
             registry=registry,
@@ -57,9 +132,67 @@ class PresidioEngine:
             supported_languages=lang
         )
 
-        self.anonymizer = AnonymizerEngine()
+        self.anonymizer = OffsetAnonymizerEngine()
         self.deanoymizer = DeanonymizeEngine()
 
+        self.custom_analyzer_cache = TTLLRUCache(CUSTOM_ANALYZER_CACHE_SIZE, CUSTOM_ANALYZER_CACHE_TTL)
+        self.result_cache = create_result_cache()
+        self.result_flight = SingleFlight()
+
+        self.long_doc_pool = None
+        self._long_doc_pool_lock = threading.Lock()
+
+        self.ready = threading.Event()
+        self._warmup_lock = threading.Lock()
+        self.startup_stats = {'import_seconds': None, 'warmup_seconds': None, 'ready_seconds': None}
+
+    def warmup(self, languages: Optional[List[str]] = None) -> dict:
+        """
+        load the models of languages (default PRELOAD_LANGUAGES), compile every recognizer regex and
+        analyze WARMUP_TEXTS once, so the first request doesn't pay the cold start. Sets ready when done,
+        calling it again is a no-op.
+        Returns: startup_stats
+        """
+        with self._warmup_lock:
+            if self.ready.is_set():
+                return self.startup_stats
+
+            start = time.perf_counter()
+            if WARMUP:
+                languages = PRELOAD_LANGUAGES if languages is None else languages
+                for language in languages:
+                    self.load_language(language)
+                    if language in WARMUP_TEXTS:
+                        self.analyze_text(WARMUP_TEXTS[language], language, None, None, None)
+                if os.getenv('OPENAI_API_KEY'):
+                    # 加载 tokenizer 编码表
+                    chunk_token_budget(LLM_MODEL)
+
+            self.startup_stats['warmup_seconds'] = time.perf_counter() - start
+            self.startup_stats['ready_seconds'] = time.perf_counter() - IMPORT_START
+            self.ready.set()
+            return self.startup_stats
+
+    def load_language(self, language: str):
+        """load the spaCy model of the language and compile its recognizer regexes"""
+        self.analyzer.nlp_engine.nlp[language]
+        self.compile_recognizers(language)
+
+    def compile_recognizers(self, language: str):
+        """
+        compile the regexes of all pattern recognizers of the language, presidio's PatternRecognizer
+        relies on the regex module cache so compiling once here fills it
+        """
+        for recognizer in self.analyzer.registry.get_recognizers(language=language, all_fields=True):
+            if isinstance(recognizer, PatchPatternRecognizer):
+                recognizer.compiled_patterns(DEFAULT_REGEX_FLAGS)
+            elif isinstance(recognizer, PatternRecognizer):
+                for pattern in recognizer.patterns:
+                    re.compile(pattern.regex, flags=DEFAULT_REGEX_FLAGS)
+
+    def loaded_languages(self) -> List[str]:
+        return self.analyzer.nlp_engine.nlp.loaded()
+
     def get_supported_entities(self, language='zh'):
         """
         get all entities' name the language supported
@@ -71,6 +204,7 @@ class PresidioEngine:
         """
         # recognizers_list = self.analyzer.get_recognizers(language)
         # names = [o.name for o in recognizers_list]
+        self.custom_recognizers.refresh()
         entity_list = self.analyzer.get_supported_entities(language)
 
         return entity_list
@@ -80,7 +214,10 @@ class PresidioEngine:
                 language='zh',
                 entities: Optional[List[str]] = None,
                 score_threshold: Optional[float] = None,
-                allow_list: Optional[List[str]] = None):
+                allow_list: Optional[List[str]] = None,
+                return_decision_process: bool = False,
+                ctx: Optional[DocContext] = None,
+                result_format: str = FORMAT_RECORDS):
         """
         Analyze text by fixed language and entities
         Args:
@@ -90,22 +227,184 @@ class PresidioEngine:
             score_threshold:
             allow_list:
             deny_list:
+            return_decision_process: attach analysis_explanation to every result
+            ctx: request document context, the parsed doc is kept there for the later stages
+            result_format: FORMAT_RECORDS or FORMAT_COLUMNAR
 
-        Returns:
+        Returns: list of {'entity_type', 'start', 'end', 'score'} dicts, or ColumnarResults for FORMAT_COLUMNAR
 
         """
-        nlp_artifacts = None
-        if language == 'zh':
-            nlp_artifacts = self.zh_doc_to_nlp_artifact(text, language)
-        result = self.analyzer.analyze(text,
-                                       language=language,
-                                       entities=entities,
-                                       score_threshold=score_threshold,
-                                       allow_list=allow_list,
-                                       nlp_artifacts=nlp_artifacts)
-        return [{'entity_type': r.entity_type, 'start': r.start, 'end': r.end, 'score': r.score} for r in result]
+        INPUT_SIZE.observe(len(text), 'analyze')
+        self.custom_recognizers.refresh()
+        key = stable_hash('analyze', text, language, sorted(entities) if entities is not None else None,
+                          score_threshold, sorted(allow_list) if allow_list is not None else None,
+                          return_decision_process, self.custom_recognizers.version)
+        if len(text) > LONG_DOC_THRESHOLD:
+            compute = lambda: self.analyze_long(text, language, entities, score_threshold, allow_list,
+                                                return_decision_process)
+        else:
+            compute = lambda: self.analyze_text(text, language, entities, score_threshold, allow_list,
+                                                return_decision_process, ctx)
+        results = self.cached_results(key, compute)
+        count_entities(results.entity_type_names())
+        return results if result_format == FORMAT_COLUMNAR else results.to_records()
+
+    def cached_results(self, key: str, compute):
+        """
+        look up the result cache, on a miss concurrent calls with the same key are coalesced into one compute().
+        compute returns ColumnarResults, the cache keeps them as plain columns (json serializable for sqlite)
+        Returns: a new ColumnarResults, callers may modify it
+        """
+        if self.result_cache is None:
+            return compute()
+
+        columns = self.result_cache.get(key)
+        if columns is not None:
+            RESULT_CACHE_REQUESTS.inc('hit')
+            return ColumnarResults.from_columns(columns)
+
+        computed = []
+
+        def compute_and_store():
+            computed.append(True)
+            value = compute().to_columns()
+            self.result_cache.set(key, value)
+            return value
+
+        columns = self.result_flight.do(key, compute_and_store)
+        RESULT_CACHE_REQUESTS.inc('miss' if computed else 'coalesced')
+        return ColumnarResults.from_columns(columns)
+
+    def cache_stats(self) -> dict:
+        stats = {'custom_analyzer_cache': self.custom_analyzer_cache.stats(), 'result_cache': None,
+                 'llm_cache': llm_client.cache_stats(), 'vault': pseudonym_vault.stats()}
+        if self.result_cache is not None:
+            stats['result_cache'] = dict(self.result_cache.stats(), backend=RESULT_CACHE_BACKEND,
+                                         coalesced=self.result_flight.coalesced)
+        return stats
+
+    def analyze_text(self,
+                     text: str,
+                     language='zh',
+                     entities: Optional[List[str]] = None,
+                     score_threshold: Optional[float] = None,
+                     allow_list: Optional[List[str]] = None,
+                     return_decision_process: bool = False,
+                     ctx: Optional[DocContext] = None):
+        """analyze the whole text in one pass, see analyze"""
+        profile = self.pipeline_profile(self.analyzer, language, entities)
+        nlp_artifacts = self.zh_doc_to_nlp_artifact(text, language, ctx, profile)
+        token = decision_process.set(return_decision_process)
+        try:
+            result = self.analyzer.analyze(text,
+                                           language=language,
+                                           entities=entities,
+                                           score_threshold=score_threshold,
+                                           allow_list=allow_list,
+                                           nlp_artifacts=nlp_artifacts,
+                                           return_decision_process=return_decision_process)
+        finally:
+            decision_process.reset(token)
+        return ColumnarResults.from_recognizer_results(result, return_decision_process)
+
+    def analyze_long(self,
+                     text: str,
+                     language='zh',
+                     entities: Optional[List[str]] = None,
+                     score_threshold: Optional[float] = None,
+                     allow_list: Optional[List[str]] = None,
+                     return_decision_process: bool = False):
+        """
+        Long document mode: split on paragraph / sentence boundaries with overlap, analyze the chunks in parallel
+        processes, offsets are mapped back to the original text and duplicates at the chunk edges are merged
+        """
+        chunks = split_chunks(text, LONG_DOC_CHUNK_SIZE, LONG_DOC_CHUNK_OVERLAP)
+        args = [(text[c.start:c.end], language, entities, score_threshold, allow_list, return_decision_process)
+                for c in chunks]
+
+        pool = self.start_long_doc_pool()
+        if pool is None:
+            chunk_results = [self.analyze_text(*arg) for arg in args]
+        else:
+            chunk_results = list(pool.map(analyze_chunk, *zip(*args)))
+
+        return merge_chunk_results(chunks, chunk_results)
+
+    @staticmethod
+    def long_doc_pool_enabled() -> bool:
+        return LONG_DOC_PROCESSES > 1 and 'fork' in multiprocessing.get_all_start_methods()
+
+    def start_long_doc_pool(self) -> Optional[ProcessPoolExecutor]:
+        """
+        fork the long document worker processes, they share the loaded models copy-on-write.
+        Called at app startup after warmup, so the fork happens after the models are loaded and before
+        any engine thread exists.
+        Returns: None when LONG_DOC_PROCESSES <= 1 or fork is not available
+        """
+        if not self.long_doc_pool_enabled():
+            return None
+
+        with self._long_doc_pool_lock:
+            if self.long_doc_pool is None:
+                # 只有 fork 前加载的模型才由子进程共享，否则每个子进程各自加载一份；
+                # 不论 PII_WARMUP / PII_PRELOAD_LANGUAGES 如何配置，fork 前加载全部语言的模型，已加载时为空操作
+                for language in self.analyzer.supported_languages:
+                    self.load_language(language)
+                pool = ProcessPoolExecutor(LONG_DOC_PROCESSES, mp_context=multiprocessing.get_context('fork'))
+                # fork 上下文在第一次提交任务时一次性创建全部子进程
+                pool.submit(os.getpid).result()
+                self.long_doc_pool = pool
+            return self.long_doc_pool
+
+    def shutdown_long_doc_pool(self):
+        with self._long_doc_pool_lock:
+            if self.long_doc_pool is not None:
+                self.long_doc_pool.shutdown(cancel_futures=True)
+                self.long_doc_pool = None
+
+    def analyze_batch(self,
+                      texts: List[str],
+                      language='zh',
+                      entities: Optional[List[str]] = None,
+                      score_threshold: Optional[float] = None,
+                      allow_list: Optional[List[str]] = None,
+                      batch_size: Optional[int] = None):
+        """
+        Analyze many texts in one call, the spaCy model runs over them with `nlp.pipe`
+        Args:
+            texts:
+            language:
+            entities: default is all entities
+            score_threshold:
+            allow_list:
+            batch_size: nlp.pipe batch size, default is BATCH_SIZE
+
+        Returns: one result list per text, same order as texts
 
-    def custom_analyze(self, text: str, lang: str, entities: List[CustomAnalyzeModel], allow_list: List[str]):
+        """
+        self.custom_recognizers.refresh()
+        nlp = self.analyzer.nlp_engine.nlp[language]
+        batch_size = batch_size or BATCH_SIZE
+        profile = self.pipeline_profile(self.analyzer, language, entities)
+        docs = nlp.pipe(texts, batch_size=batch_size, disable=self.profile_disabled(nlp, profile))
+        docs = timed_iter(docs, SPACY_LATENCY, profile, 'pipe')
+
+        results = []
+        for text, doc in zip(texts, docs):
+            INPUT_SIZE.observe(len(text), 'analyze_batch')
+            result = self.analyzer.analyze(text,
+                                           language=language,
+                                           entities=entities,
+                                           score_threshold=score_threshold,
+                                           allow_list=allow_list,
+                                           nlp_artifacts=self.doc_to_nlp_artifact(doc, language))
+            count_entities(r.entity_type for r in result)
+            results.append([{'entity_type': r.entity_type, 'start': r.start, 'end': r.end, 'score': r.score}
+                            for r in result])
+        return results
+
+    def custom_analyze(self, text: str, lang: str, entities: List[CustomAnalyzeModel], allow_list: List[str],
+                       ctx: Optional[DocContext] = None):
         """
         custom detect key-words and pattern
         Args:
@@ -113,10 +412,51 @@ class PresidioEngine:
             lang:
             entities: entity name
             allow_list:
+            ctx: request document context
 
         Returns:
 
         """
+        INPUT_SIZE.observe(len(text), 'custom_analyze')
+        definitions_key = self.custom_definitions_key(lang, entities)
+        key = stable_hash('custom_analyze', text, definitions_key,
+                          sorted(allow_list) if allow_list is not None else None)
+
+        def compute():
+            analyzer, entities_ = self.get_custom_analyzer(lang, entities, definitions_key)
+
+            profile = self.pipeline_profile(analyzer, lang, entities_)
+            nlp_artifacts = self.zh_doc_to_nlp_artifact(text, lang, ctx, profile)
+            results = analyzer.analyze(text, language=lang, entities=entities_, allow_list=allow_list, nlp_artifacts=nlp_artifacts)
+            return ColumnarResults.from_recognizer_results(results)
+
+        results = self.cached_results(key, compute)
+        count_entities(results.entity_type_names())
+        return results.to_records()
+
+    @staticmethod
+    def custom_definitions_key(lang: str, entities: List[CustomAnalyzeModel]) -> str:
+        """canonical hash of the custom entity definitions and language"""
+        definitions = sorted(
+            stable_hash(custom_entity.entity,
+                        custom_entity.deny_list or [],
+                        [[p.name, p.regex, p.score] for p in custom_entity.patterns or []],
+                        custom_entity.context or [])
+            for custom_entity in entities
+        )
+        return stable_hash(lang, definitions)
+
+    def get_custom_analyzer(self, lang: str, entities: List[CustomAnalyzeModel], key: Optional[str] = None):
+        """
+        AnalyzerEngine for the custom entities, cached by a canonical hash of the definitions and language.
+        The analyzer shares the engine's nlp models instead of creating the default nlp engine.
+        Returns: (analyzer, entity names)
+        """
+        key = key or self.custom_definitions_key(lang, entities)
+        cached = self.custom_analyzer_cache.get(key)
+        if cached is not None:
+            return cached
+
         entities_ = []
         new_registry = RecognizerRegistry()
         for custom_entity in entities:
@@ -124,43 +464,99 @@ class PresidioEngine:
                 supported_entity=custom_entity.entity,
                 supported_language=lang,
                 deny_list=custom_entity.deny_list,
-                patterns=custom_entity.patterns,
+                patterns=list(custom_entity.patterns or []),
                 context=custom_entity.context
             )
-            # custom_recognizer.analyze(text=text, entities=[entity])
+            instrument_recognizer(custom_recognizer)
             new_registry.add_recognizer(custom_recognizer)
             entities_.append(custom_entity.entity)
-        analyzer = AnalyzerEngine(registry=new_registry, supported_languages=[lang])
+        analyzer = AnalyzerEngine(registry=new_registry, nlp_engine=self.nlp_engine_with_zh, supported_languages=[lang])
 
-        nlp_artifacts = None
-        if lang == 'zh':
-            nlp_artifacts = self.zh_doc_to_nlp_artifact(text, lang)
-        results = analyzer.analyze(text, language=lang, entities=entities_, allow_list=allow_list, nlp_artifacts=nlp_artifacts)
+        self.custom_analyzer_cache.set(key, (analyzer, entities_))
+        return analyzer, entities_
 
-        return [{'entity_type': r.entity_type, 'start': r.start, 'end': r.end, 'score': r.score} for r in results]
+    @staticmethod
+    def pipeline_profile(analyzer: AnalyzerEngine, language: str, entities: Optional[List[str]]) -> str:
+        """
+        the spaCy pipeline profile the requested recognizers need: NER based recognizers need the ner
+        component, context enhancement needs POS tags and lemmas (keywords and lemmas of the context window),
+        pattern recognizers without context words only need the tokens
+        """
+        need_ner = need_lemmas = False
+        for recognizer in analyzer.registry.get_recognizers(language=language, entities=entities, all_fields=not entities):
+            need_ner = need_ner or isinstance(recognizer, SpacyRecognizer)
+            need_lemmas = need_lemmas or bool(recognizer.context)
+        if need_ner:
+            return PROFILE_FULL if need_lemmas else PROFILE_NER
+        return PROFILE_LEMMAS if need_lemmas else PROFILE_TOKENS
 
-    def zh_doc_to_nlp_artifact(self, text: str, language: str) -> NlpArtifacts:
-        doc = self.analyzer.nlp_engine.nlp[language](text)
-        lemmas = [token for token in doc]
+    @staticmethod
+    def profile_disabled(nlp: spacy.Language, profile: str) -> List[str]:
+        """components of nlp to disable for the profile"""
+        enabled = configuration['pipeline_profiles'][profile]
+        if enabled is None:
+            return []
+        return [name for name in nlp.pipe_names if name not in enabled]
+
+    def zh_doc_to_nlp_artifact(self, text: str, language: str, ctx: Optional[DocContext] = None,
+                               profile: str = PROFILE_FULL) -> NlpArtifacts:
+        """
+        run the spaCy pipeline of the profile, see pipeline_profile
+        """
+        nlp = self.analyzer.nlp_engine.nlp[language]
+        with SPACY_LATENCY.time(profile, 'parse'):
+            doc = nlp(text, disable=self.profile_disabled(nlp, profile))
+        if ctx is not None:
+            ctx.set_doc(doc)
+        return self.doc_to_nlp_artifact(doc, language)
+
+    def doc_to_nlp_artifact(self, doc: Doc, language: str) -> NlpArtifacts:
+        """
+        wrap a parsed spaCy doc, zh docs keep the tokens as lemmas (see ZhNlpArtifacts)
+        """
         tokens_indices = [token.idx for token in doc]
         entities = doc.ents
+        if language == 'zh':
+            return ZhNlpArtifacts(
+                entities=entities,
+                tokens=doc,
+                tokens_indices=tokens_indices,
+                lemmas=[token for token in doc],
+                nlp_engine=self.analyzer.nlp_engine,
+                language=language
+            )
 
-        return ZhNlpArtifacts(
+        return NlpArtifacts(
             entities=entities,
             tokens=doc,
             tokens_indices=tokens_indices,
-            lemmas=lemmas,
+            lemmas=[token.lemma_ for token in doc],
             nlp_engine=self.analyzer.nlp_engine,
             language=language
         )
 
     def anonymize(self,
                   text: str,
-                  analyzer_results: List[AnalyzeResult],
+                  analyzer_results: Union[List[Union[AnalyzeResult, dict]], ColumnarResults],
                   llm_synthesize: Optional[bool] = False,
-                  operators: Optional[List[OperatorConf]] = None):
-        analyzer_results_build = [RecognizerResult(entity_type=r.entity_type, start=r.start, end=r.end, score=r.score)
-                                  for r in analyzer_results]
+                  operators: Optional[List[OperatorConf]] = None,
+                  ctx: Optional[DocContext] = None,
+                  tenant: Optional[str] = None):
+        """
+        ctx: request document context of text, llm synthesis reuses its sentence boundaries (shifted by the
+        replacements) and token counts instead of parsing the anonymized text again
+        tenant: pseudonym vault namespace, entities default to the pseudonymize operator of this tenant so the
+        same value always gets the same surrogate and deanonymize can restore it
+        analyzer_results: AnalyzeResult from the client, or the output of analyze (dicts or ColumnarResults) as it is
+        """
+        if isinstance(analyzer_results, ColumnarResults):
+            analyzer_results_build = [RecognizerResult(entity_type=entity_type, start=start, end=end, score=score)
+                                      for entity_type, start, end, score, _ in analyzer_results.rows()]
+        else:
+            analyzer_results_build = [
+                RecognizerResult(entity_type=r['entity_type'], start=r['start'], end=r['end'], score=r['score'])
+                if isinstance(r, dict) else RecognizerResult(entity_type=r.entity_type, start=r.start, end=r.end, score=r.score)
+                for r in analyzer_results]
 
         if llm_synthesize:
             operators_build = {"DEFAULT": OperatorConfig("replace", None)}
@@ -170,54 +566,57 @@ class PresidioEngine:
                 operators_build = {}
                 for o in operators:
                     operators_build[o.entity_type] = OperatorConfig(o.operator_name, o.params)
+            if tenant is not None:
+                operators_build = operators_build or {}
+                operators_build.setdefault("DEFAULT", OperatorConfig(PSEUDONYMIZE))
+                for config in operators_build.values():
+                    if config.operator_name == PSEUDONYMIZE:
+                        config.params.setdefault(Pseudonymize.TENANT, tenant)
+
+        INPUT_SIZE.observe(len(text), 'anonymize')
+        with STAGE_LATENCY.time('anonymize'):
+            result = self.anonymizer.anonymize(
+                text=text,
+                analyzer_results=analyzer_results_build,
+                operators=operators_build
+            )
 
-        result = self.anonymizer.anonymize(
-            text=text,
-            analyzer_results=analyzer_results_build,
-            operators=operators_build
-        )
-
-        response = json.loads(result.to_json())
+        # 直接取字段，不经过 to_json / json.loads；replacements 只在内部用于换算句子边界，不放入响应
+        response = {'text': result.text,
+                    'items': [{'start': item.start, 'end': item.end, 'entity_type': item.entity_type,
+                               'text': item.text, 'operator': item.operator} for item in result.items]}
 
         if llm_synthesize:
-            splited_text = []
-            max_step_len = (4096 - USED_TOEKN - 100) // 2
-            doc = nlp(result.text)
-            tmp_len = 0
-            tmp_text = ''
-            for sent in doc.sents:
-                current_len = get_text_token(sent.text)
-                if tmp_len + current_len < max_step_len:
-                    tmp_text += sent.text
-                    tmp_len += current_len
-                else:
-                    if tmp_text:
-                        splited_text.append(tmp_text)
-
-                    if current_len > max_step_len:
-                        text_step = math.ceil(current_len / math.ceil(current_len / max_step_len))
-                        i = 0
-                        while text_step*i < current_len:
-                            splited_text.append(sent.text[i*text_step: min((i+1)*text_step, current_len-1)])
-                            i += 1
-
-                        tmp_text = ''
-                        tmp_len = 0
-                    else:
-                        tmp_text = sent.text
-                        tmp_len = current_len
-            if tmp_text:
-                splited_text.append(tmp_text)
-
-            fake = ''
-            for split_text in splited_text:
-                messages = create_messages(split_text)
-                fake += openai_chat(messages, temperature=0.3)
-            response['text'] = fake
+            sentences = None
+            if ctx is not None and ctx.text == text:
+                sentences = ctx.sentences(OffsetMap(result.replacements), result.text)
+            splited_text = split_for_llm(result.text, LLM_MODEL, sentences)
+
+            # 各片段并发合成，按片段顺序拼接
+            fakes = llm_client.synthesize([create_messages(split_text) for split_text in splited_text], temperature=0.3)
+            response['text'] = ''.join(fakes)
             response['items'] = []
 
         return response
 
+    @staticmethod
+    def deanonymize(texts: List[str], tenant: Optional[str] = None,
+                    pseudonyms: Optional[List[str]] = None) -> List[dict]:
+        """
+        restore the pseudonyms of the tenant's vault found in texts (e.g. LLM responses) to the original values
+        Args:
+            pseudonyms: 调用方 anonymize 得到的替换值，给出时 unrestored 为还原后文本中仍然存在的替换值个数
+        """
+        expected = {p for p in pseudonyms if p} if pseudonyms is not None else None
+        results = []
+        for text in texts:
+            restored, items = pseudonym_vault.restore(tenant or DEFAULT_TENANT, text)
+            result = {'text': restored, 'items': items}
+            if expected is not None:
+                result['unrestored'] = sum(restored.count(p) for p in expected)
+            results.append(result)
+        return results
+
     def deanoymize(self,
                    text: str,
                    entities: List[OperatorResult],
@@ -232,7 +631,15 @@ class PresidioEngine:
 
     @staticmethod
     def get_supported_anonymizers():
-        return ['replace', 'redact', 'hash', 'mask', 'encrypt']
+        return ['replace', 'redact', 'hash', 'mask', 'encrypt', 'surrogate', 'pseudonymize']
 
 
 pii_engine = PresidioEngine()
+pii_engine.startup_stats['import_seconds'] = time.perf_counter() - IMPORT_START
+
+
+def analyze_chunk(*args):
+    """long document chunk analysis, runs in the forked pool processes which inherit pii_engine"""
+    # 进程池在启动时 fork，之后增删的自定义 recognizer 从文件同步
+    pii_engine.custom_recognizers.refresh()
+    return pii_engine.analyze_text(*args)
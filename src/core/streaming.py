@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/18 18:05
+# @Author : ltm
+# @Email :
+# @Desc : 大文件流式处理：开头字节嗅探编码后增量解码，按重叠窗口切分文本，结果换算为全局偏移且窗口接缝处不重复
+
+import codecs
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+# 每个窗口的最大字符数
+STREAM_WINDOW_SIZE = int(os.getenv('PII_STREAM_WINDOW_SIZE', 32768))
+# 相邻窗口的重叠字符数，需大于最长实体（含关键词等上下文）的长度
+STREAM_WINDOW_OVERLAP = int(os.getenv('PII_STREAM_WINDOW_OVERLAP', 512))
+# 用于嗅探编码的开头字节数
+SNIFF_SIZE = 64 * 1024
+# 之后每次读取的字节数
+STREAM_READ_SIZE = int(os.getenv('PII_STREAM_READ_SIZE', 256 * 1024))
+
+
+def sniff_encoding(head: bytes) -> str:
+    """
+    根据文件开头的字节判断编码：BOM，其次 utf-8、gbk（gb2312 的超集），都失败时使用 latin-1
+    """
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+
+    for encoding in ('utf-8', 'gbk'):
+        try:
+            # final=False：开头片段末尾被截断的多字节字符不算解码失败
+            codecs.getincrementaldecoder(encoding)().decode(head, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return 'latin-1'
+
+
+@dataclass
+class Window:
+    text: str
+    offset: int  # text[0] 的全局偏移
+    commit: int  # 本窗口最多输出到这里，之后的实体留给下一个窗口
+    out: int  # 已输出文本在本窗口中的结束位置
+    final: bool
+
+
+@dataclass
+class Chunk:
+    text: str  # 本次输出的原文片段，所有片段按顺序拼接即为全文
+    offset: int  # 片段的全局偏移
+    results: List[dict]  # 片段内的实体，偏移相对片段
+
+
+class WindowStream:
+    """
+    feed 追加解码后的文本，next_window 取出待分析的窗口，分析结果交给 commit 换算成输出片段。
+
+    窗口 [0, end) 的输出位置 cut 取 commit = end - overlap，若有实体（任意类型）跨过 cut，把 cut 前移到该实体起点，
+    直到没有实体跨过 cut；起点位于 [out, cut) 的实体在本窗口输出，它们都完整地落在输出的片段内。
+    长度不超过 overlap 的实体总是完整地落在窗口内；下一个窗口从 cut - overlap 开始，保留足够的前文供后行断言匹配，
+    起点早于已输出位置的实体已由之前的窗口输出，直接丢弃。因此相互重叠的不同类型实体各输出一次。
+    内存占用只与窗口大小有关，与文件大小无关
+    """
+
+    def __init__(self, window_size: int = None, overlap: int = None):
+        self.window_size = window_size or STREAM_WINDOW_SIZE
+        self.overlap = STREAM_WINDOW_OVERLAP if overlap is None else overlap
+        # 已输出位置最多比窗口起点靠后 2 * overlap，窗口需大于 3 * overlap 才能保证每个窗口都有进展
+        if self.window_size <= 3 * self.overlap:
+            raise ValueError(f'window size {self.window_size} must be larger than 3 times the overlap {self.overlap}')
+
+        self.buffer = ''
+        self.base = 0  # buffer[0] 的全局偏移
+        self.out_pos = 0  # 已输出文本的全局结束位置
+        self.total = 0
+
+    def feed(self, text: str) -> None:
+        self.buffer += text
+        self.total += len(text)
+
+    def next_window(self, final: bool = False) -> Optional[Window]:
+        """
+        Args:
+            final: 输入已经结束
+        Returns: 缓冲区不足一个窗口且输入未结束时返回 None
+        """
+        out = self.out_pos - self.base
+        if len(self.buffer) > self.window_size:
+            # 尽量在换行处切分，切分点保证 commit 比已输出位置靠后 overlap 以上：从已输出位置开始、长度不超过 overlap 的实体
+            # 不会跨过 commit，输出位置前移到实体起点后仍在已输出位置之后
+            lower = out + 2 * self.overlap + 1
+            end = self.buffer.rfind('\n', lower, self.window_size) + 1 or self.window_size
+            return Window(self.buffer[:end], self.base, end - self.overlap, out, False)
+
+        if final and out < len(self.buffer):
+            return Window(self.buffer, self.base, len(self.buffer), out, True)
+        return None
+
+    def commit(self, window: Window, results: List[dict]) -> Chunk:
+        """
+        Args:
+            window: next_window 返回的窗口
+            results: 窗口文本的分析结果，偏移相对窗口
+        Returns: 本窗口输出的原文片段及其中的实体
+        """
+        if window.final:
+            end = len(window.text)
+            kept = [r for r in results if window.out <= r['start']]
+        else:
+            end = self.cut(window, results)
+            if end is None:
+                # 实体连成一片盖住了 [out, commit)：退回到在 commit 之后结束，跨过 commit 的实体只保留起点在 commit 之前的
+                kept = [r for r in results if window.out <= r['start'] < window.commit]
+                end = max([window.commit] + [r['end'] for r in kept])
+            else:
+                kept = [r for r in results if window.out <= r['start'] < end]
+
+        chunk = Chunk(
+            text=window.text[window.out:end],
+            offset=window.offset + window.out,
+            results=[dict(r, start=r['start'] - window.out, end=r['end'] - window.out) for r in kept],
+        )
+
+        self.out_pos = window.offset + end
+        if window.final:
+            self.buffer = ''
+            self.base = self.out_pos
+        else:
+            drop = max(0, min(end, window.commit) - self.overlap)
+            self.buffer = self.buffer[drop:]
+            self.base += drop
+        return chunk
+
+    @staticmethod
+    def cut(window: Window, results: List[dict]) -> Optional[int]:
+        """
+        Returns: 不晚于 commit、不在任何实体内部的最靠后的输出位置，不大于 out 时为 None
+        """
+        cut = window.commit
+        moved = True
+        while moved:
+            moved = False
+            for r in results:
+                if r['start'] < cut < r['end']:
+                    cut = r['start']
+                    moved = True
+        return cut if cut > window.out else None
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/18 22:40
+# @Author : ltm
+# @Email :
+# @Desc : 本地假数据替换（surrogate 操作）：按实体类型生成格式合法的中文假数据，替代 LLM 合成；
+# 随机数取自以 seed 为 key 的 (实体类型, 原值) 的带密钥哈希，相同原值总是得到相同的替换值
+
+import logging
+import os
+from datetime import date
+from hashlib import blake2b
+from typing import Callable, Dict
+
+import regex as re
+from presidio_anonymizer.operators import Operator, OperatorType, OperatorsFactory
+from presidio_anonymizer.entities import InvalidParamException
+from presidio_anonymizer.services.validators import validate_type
+
+logger = logging.getLogger("presidio-analyzer-patch")
+
+# 默认 seed，作为哈希的密钥，必须保密：知道 seed 即可对手机号、身份证号等取值空间小的原值穷举反查。
+# 未配置（且请求未指定 seed）时 surrogate / pseudonymize 操作拒绝执行
+SURROGATE_SEED = os.getenv('PII_SURROGATE_SEED', '')
+if not SURROGATE_SEED:
+    logger.warning('PII_SURROGATE_SEED is not set, the surrogate and pseudonymize operators are disabled; '
+                   'set it to a random secret, e.g. python -c "import secrets; print(secrets.token_hex(32))"')
+MISSING_SEED_MESSAGE = 'PII_SURROGATE_SEED is not configured, surrogate values would be reversible by anyone'
+
+SURNAMES = tuple('王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤'
+            ) + ('欧阳', '司马', '上官', '诸葛', '东方', '皇甫')
+GIVEN_CHARS = ('伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超霞平刚桂华建国文辉力鹏宇浩然子轩思雨欣怡梓涵一诺嘉豪俊杰晨阳博文雅婷佳琪'
+               '志强海燕玉兰春梅晓东红梅丹凤雪松天翔宏伟振华立新亚楠瑞琳昊天若曦紫萱沐辰泽宇皓轩铭哲雨桐诗涵可馨语嫣')
+# (6 位行政区划代码, 省市区)
+REGIONS = (
+    ('110101', '北京市东城区'), ('110105', '北京市朝阳区'), ('110108', '北京市海淀区'), ('120101', '天津市和平区'),
+    ('130102', '河北省石家庄市长安区'), ('140105', '山西省太原市小店区'), ('150102', '内蒙古自治区呼和浩特市新城区'),
+    ('210102', '辽宁省沈阳市和平区'), ('220102', '吉林省长春市南关区'), ('230102', '黑龙江省哈尔滨市道里区'),
+    ('310101', '上海市黄浦区'), ('310104', '上海市徐汇区'), ('310115', '上海市浦东新区'), ('320102', '江苏省南京市玄武区'),
+    ('320505', '江苏省苏州市虎丘区'), ('330102', '浙江省杭州市上城区'), ('330106', '浙江省杭州市西湖区'),
+    ('340103', '安徽省合肥市庐阳区'), ('350102', '福建省福州市鼓楼区'), ('360102', '江西省南昌市东湖区'),
+    ('370102', '山东省济南市历下区'), ('370202', '山东省青岛市市南区'), ('410105', '河南省郑州市金水区'),
+    ('420102', '湖北省武汉市江岸区'), ('430102', '湖南省长沙市芙蓉区'), ('440103', '广东省广州市荔湾区'),
+    ('440106', '广东省广州市天河区'), ('440304', '广东省深圳市福田区'), ('440305', '广东省深圳市南山区'),
+    ('450103', '广西壮族自治区南宁市青秀区'), ('460105', '海南省海口市秀英区'), ('500103', '重庆市渝中区'),
+    ('510104', '四川省成都市锦江区'), ('510107', '四川省成都市武侯区'), ('520102', '贵州省贵阳市南明区'),
+    ('530102', '云南省昆明市五华区'), ('610102', '陕西省西安市新城区'), ('620102', '甘肃省兰州市城关区'),
+    ('630102', '青海省西宁市城东区'), ('640104', '宁夏回族自治区银川市兴庆区'), ('650102', '新疆维吾尔自治区乌鲁木齐市天山区'),
+)
+ROADS = ('人民路', '解放路', '中山路', '建设路', '和平路', '光华路', '长江路', '黄河路', '文化路', '胜利路',
+         '新华路', '青年路', '朝阳路', '东风路', '幸福路', '学府路', '科技路', '滨江路', '南京路', '北京路')
+# 借记卡 BIN：工行、建行、农行、中行、招行、交行、邮储、浦发
+BANK_BINS = ('622202', '621700', '622848', '621661', '622588', '622262', '621799', '622521')
+MOBILE_PREFIXES = ('130', '131', '132', '133', '135', '136', '137', '138', '139', '150', '151', '152', '153', '155',
+                   '156', '157', '158', '159', '166', '173', '175', '176', '177', '178', '180', '181', '182', '183',
+                   '185', '186', '187', '188', '189', '198', '199')
+COMPANY_WORDS = ('华信', '恒远', '天成', '博思', '鼎盛', '瑞丰', '中科', '新元', '宏达', '嘉禾', '启明', '云帆')
+INDUSTRIES = ('科技', '贸易', '信息技术', '实业', '咨询', '物流', '电子', '文化传媒', '建设工程', '餐饮管理')
+# RFC 2606 保留域名，不会对应真实邮箱
+EMAIL_DOMAINS = ('example.com', 'example.cn', 'example.org', 'example.net')
+ID_WEIGHTS = (7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2)
+ID_CHECK_CODES = '10X98765432'
+BIRTH_START, BIRTH_END = date(1950, 1, 1).toordinal(), date(2005, 12, 31).toordinal()
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+DIGIT_PATTERN = re.compile(r'\d')
+NUMBER_PATTERN = re.compile(r'\d+')
+# 省市区中的城市名：北京市东城区 -> 北京，内蒙古自治区呼和浩特市新城区 -> 呼和浩特
+CITY_PATTERN = re.compile(r'(?:省|自治区)?([^省区市]+?)市')
+
+
+def seed_key(seed: str) -> bytes:
+    """blake2b 的 key 最长 64 字节，更长的 seed 先哈希"""
+    if not seed:
+        raise ValueError(MISSING_SEED_MESSAGE)
+    key = seed.encode('utf-8')
+    return key if len(key) <= 64 else blake2b(key).digest()
+
+
+class Draw:
+    """
+    从以 seed 为 key 的 (实体类型, 原值) 的 256 位 blake2b 中依次取随机数，同一输入得到同一序列；
+    剩余位数不足时加序号作为 salt 重新哈希。没有 seed 时无法由原值算出替换值
+    """
+    __slots__ = ('value', 'key', 'message', 'round')
+
+    def __init__(self, seed: str, entity_type: str, text: str):
+        self.key = seed_key(seed)
+        self.message = f'{entity_type}\x1f{text}'.encode('utf-8')
+        self.round = 0
+        self.value = int.from_bytes(blake2b(self.message, digest_size=32, key=self.key).digest(), 'big')
+
+    def below(self, n: int) -> int:
+        if self.value < n << 64:
+            self.round += 1
+            digest = blake2b(self.message, digest_size=32, key=self.key, salt=self.round.to_bytes(16, 'big')).digest()
+            self.value = int.from_bytes(digest, 'big')
+        self.value, r = divmod(self.value, n)
+        return r
+
+    def choice(self, seq):
+        return seq[self.below(len(seq))]
+
+    def digits(self, k: int) -> str:
+        return str(self.below(10 ** k)).zfill(k)
+
+
+def fill_digits(original: str, digits: str) -> str:
+    """原值的数字个数与生成值相同时保留原格式（空格、横线、+86 等），只替换其中的数字"""
+    if len(DIGIT_PATTERN.findall(original)) != len(digits):
+        return digits
+    it = iter(digits)
+    return DIGIT_PATTERN.sub(lambda m: next(it), original)
+
+
+def id_check_code(body: str) -> str:
+    return ID_CHECK_CODES[sum(int(d) * w for d, w in zip(body, ID_WEIGHTS)) % 11]
+
+
+def luhn_check_digit(payload: str) -> str:
+    total = 0
+    for i, d in enumerate(reversed(payload)):
+        d = int(d)
+        if i % 2 == 0:
+            d = d * 2 - 9 if d > 4 else d * 2
+        total += d
+    return str(-total % 10)
+
+
+def surrogate_person(draw: Draw, text: str) -> str:
+    given = ''.join(draw.choice(GIVEN_CHARS) for _ in range(1 + draw.below(2)))
+    return draw.choice(SURNAMES) + given
+
+
+def surrogate_id_card(draw: Draw, text: str) -> str:
+    birth = date.fromordinal(BIRTH_START + draw.below(BIRTH_END - BIRTH_START + 1))
+    body = draw.choice(REGIONS)[0] + birth.strftime('%Y%m%d') + draw.digits(3)
+    return body + id_check_code(body)
+
+
+def surrogate_bank_card(draw: Draw, text: str) -> str:
+    # 保留原卡号长度（16 - 19 位）
+    length = len(DIGIT_PATTERN.findall(text))
+    length = length if 16 <= length <= 19 else 19
+    bin_ = draw.choice(BANK_BINS)
+    payload = bin_ + draw.digits(length - len(bin_) - 1)
+    return fill_digits(text, payload + luhn_check_digit(payload))
+
+
+def surrogate_phone(draw: Draw, text: str) -> str:
+    return fill_digits(text, draw.choice(MOBILE_PREFIXES) + draw.digits(8))
+
+
+def surrogate_address(draw: Draw, text: str) -> str:
+    address = f'{draw.choice(REGIONS)[1]}{draw.choice(ROADS)}{1 + draw.below(300)}号'
+    if draw.below(2):
+        address += f'{1 + draw.below(20)}栋{1 + draw.below(6)}单元{1 + draw.below(30)}0{1 + draw.below(4)}室'
+    return address
+
+
+def surrogate_location(draw: Draw, text: str) -> str:
+    return draw.choice(REGIONS)[1]
+
+
+def surrogate_company(draw: Draw, text: str) -> str:
+    city = CITY_PATTERN.search(draw.choice(REGIONS)[1]).group(1)
+    return f'{city}{draw.choice(COMPANY_WORDS)}{draw.choice(INDUSTRIES)}有限公司'
+
+
+def surrogate_amount(draw: Draw, text: str) -> str:
+    """金额保留格式和位数，只替换数字（每段数字首位不为 0）"""
+    def repl(m):
+        number = m.group(0)
+        return str(1 + draw.below(9)) + draw.digits(len(number) - 1) if len(number) > 1 else str(1 + draw.below(9))
+    return NUMBER_PATTERN.sub(repl, text) if NUMBER_PATTERN.search(text) else text
+
+
+def surrogate_date(draw: Draw, text: str) -> str:
+    """以 4 位年份开头的 年[月[日]] 替换为合法的出生日期并保留分隔符和单位，其他格式只替换数字"""
+    numbers = NUMBER_PATTERN.findall(text)
+    if not 1 <= len(numbers) <= 3 or len(numbers[0]) != 4:
+        return NUMBER_PATTERN.sub(lambda m: draw.digits(len(m.group(0))), text)
+    birth = date.fromordinal(BIRTH_START + draw.below(BIRTH_END - BIRTH_START + 1))
+    parts = iter(str(value).zfill(len(number)) for value, number in zip((birth.year, birth.month, birth.day), numbers))
+    return NUMBER_PATTERN.sub(lambda m: next(parts), text)
+
+
+def surrogate_email(draw: Draw, text: str) -> str:
+    name = ''.join(draw.choice(LETTERS) for _ in range(5 + draw.below(6)))
+    return f'{name}{draw.digits(2)}@{draw.choice(EMAIL_DOMAINS)}'
+
+
+def surrogate_ip(draw: Draw, text: str) -> str:
+    if ':' in text:
+        return surrogate_chars(draw, text)
+    return f'10.{draw.below(256)}.{draw.below(256)}.{1 + draw.below(254)}'
+
+
+def surrogate_url(draw: Draw, text: str) -> str:
+    return f'https://{"".join(draw.choice(LETTERS) for _ in range(6))}.example.com'
+
+
+def surrogate_chars(draw: Draw, text: str) -> str:
+    """其他实体：数字、字母、汉字分别替换为同类字符，保留标点和长度"""
+    out = []
+    for ch in text:
+        if ch.isdigit():
+            out.append(str(draw.below(10)))
+        elif 'a' <= ch <= 'z':
+            out.append(draw.choice(LETTERS))
+        elif 'A' <= ch <= 'Z':
+            out.append(draw.choice(LETTERS).upper())
+        elif '\u4e00' <= ch <= '\u9fff':
+            out.append(draw.choice(GIVEN_CHARS))
+        else:
+            out.append(ch)
+    return ''.join(out)
+
+
+SURROGATE_GENERATORS: Dict[str, Callable[[Draw, str], str]] = {
+    'PERSON': surrogate_person,
+    'ID_CARD': surrogate_id_card,
+    'BANK_CARD': surrogate_bank_card,
+    'CREDIT_CARD': surrogate_bank_card,
+    'PHONE_NUMBER': surrogate_phone,
+    'LOCATION': surrogate_location,
+    'HOME_ADDRESS': surrogate_address,
+    'HOUSEHOLD_ADDRESS': surrogate_address,
+    'RESIDENTIAL_ADDRESS': surrogate_address,
+    'MAILING_ADDRESS': surrogate_address,
+    'COMPANY_ADDRESS': surrogate_address,
+    'COMPANY_NAME': surrogate_company,
+    'SALARY_AMOUNT': surrogate_amount,
+    'BIRTH_DATE': surrogate_date,
+    'DATE_TIME': surrogate_date,
+    'EMAIL_ADDRESS': surrogate_email,
+    'IP_ADDRESS': surrogate_ip,
+    'URL': surrogate_url,
+}
+
+
+def surrogate(entity_type: str, text: str, seed: str = SURROGATE_SEED) -> str:
+    generator = SURROGATE_GENERATORS.get(entity_type, surrogate_chars)
+    return generator(Draw(seed, entity_type, text), text)
+
+
+def validate_seed(seed: str = None) -> None:
+    if not (seed or SURROGATE_SEED):
+        raise InvalidParamException(MISSING_SEED_MESSAGE)
+
+
+class Surrogate(Operator):
+    """Replace the PII text with a format-valid fake value, deterministic per (seed, entity type, text)."""
+
+    SEED = 'seed'
+
+    def operate(self, text: str = None, params: Dict = None) -> str:
+        params = params or {}
+        return surrogate(params.get('entity_type', ''), text or '', params.get(self.SEED) or SURROGATE_SEED)
+
+    def validate(self, params: Dict = None) -> None:
+        seed = (params or {}).get(self.SEED)
+        validate_type(seed, self.SEED, str)
+        validate_seed(seed)
+
+    def operator_name(self) -> str:
+        return 'surrogate'
+
+    def operator_type(self) -> OperatorType:
+        return OperatorType.Anonymize
+
+
+# OperatorsFactory 首次使用时扫描 Operator 的子类并缓存，已缓存时手动加入
+OperatorsFactory.get_anonymizers().setdefault('surrogate', Surrogate)
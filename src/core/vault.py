@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/18 23:20
+# @Author : ltm
+# @Email :
+# @Desc : 假名库：按租户（namespace）记录 原值 <-> 替换值 的映射，同一原值在后续请求中复用同一替换值，
+# 并把 LLM 回复等文本中的替换值还原为原值。映射全部索引在内存中，新映射由后台线程批量写入 sqlite（write-behind）
+
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from presidio_anonymizer.operators import Operator, OperatorType, OperatorsFactory
+from presidio_anonymizer.services.validators import validate_type
+
+from .cache import create_private_file
+from .surrogate import surrogate, validate_seed, Draw, SURROGATE_SEED
+
+logger = logging.getLogger("presidio-analyzer-patch")
+
+# memory（仅本进程，重启后丢失）或 sqlite（持久化，本机 worker 共享）。sqlite 中以明文保存原值，须显式开启
+VAULT_BACKEND = os.getenv('PII_VAULT_BACKEND', 'memory')
+VAULT_PATH = os.getenv('PII_VAULT_PATH', os.path.expanduser('~/.cache/zh_pii/vault.sqlite'))
+# 新映射最多缓冲多少秒或多少条后写入 sqlite；其他 worker 在写入后才能还原这些替换值
+VAULT_FLUSH_INTERVAL = float(os.getenv('PII_VAULT_FLUSH_INTERVAL', 1))
+VAULT_FLUSH_SIZE = int(os.getenv('PII_VAULT_FLUSH_SIZE', 1000))
+# 还原时只匹配不短于该长度的替换值，避免单个数字、汉字被误还原
+VAULT_MIN_LENGTH = int(os.getenv('PII_VAULT_MIN_LENGTH', 2))
+# /pii/deanonymize 把替换值还原为原值返回给调用方，且不校验调用方与 tenant 的关系，须显式开启
+DEANONYMIZE_ENABLED = int(os.getenv('PII_DEANONYMIZE_ENABLED', 0))
+WORKERS = int(os.getenv('PII_WORKERS', 0))
+DEFAULT_TENANT = 'default'
+PSEUDONYMIZE = 'pseudonymize'
+# 替换值与本租户已有的替换值冲突时换一个再试的次数，后一半加数字后缀（取值空间小的类型如 LOCATION 很快用尽）
+MAX_SURROGATE_ATTEMPTS = 16
+
+
+def is_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+class Namespace:
+    """
+    一个租户的内存索引：forward 按 (实体类型, 原值) 查替换值，reverse 按替换值查 (实体类型, 原值)；
+    prefix_lengths 为 替换值前两个字符 -> 替换值长度（从长到短），还原时每个位置只需一次字典查找
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.forward: Dict[Tuple[str, str], str] = {}
+        self.reverse: Dict[str, Tuple[str, str]] = {}
+        self.prefix_lengths: Dict[str, Tuple[int, ...]] = {}
+        # 已从 sqlite 加载的最大行 id
+        self.synced_id = 0
+        self.synced_at = 0.0
+
+    def add(self, entity_type: str, original: str, pseudonym: str) -> None:
+        old = self.forward.get((entity_type, original))
+        if old is not None and old != pseudonym:
+            self.reverse.pop(old, None)
+        self.forward[(entity_type, original)] = pseudonym
+        self.reverse[pseudonym] = (entity_type, original)
+        if len(pseudonym) >= VAULT_MIN_LENGTH:
+            prefix = pseudonym[:2]
+            lengths = self.prefix_lengths.get(prefix, ())
+            if len(pseudonym) not in lengths:
+                # 替换为新的 tuple，并发还原时读到的总是完整的值
+                self.prefix_lengths[prefix] = tuple(sorted(lengths + (len(pseudonym),), reverse=True))
+
+    def remove(self, entity_type: str, original: str) -> None:
+        pseudonym = self.forward.pop((entity_type, original), None)
+        if pseudonym is not None and self.reverse.get(pseudonym) == (entity_type, original):
+            del self.reverse[pseudonym]
+
+    def restore(self, text: str) -> Tuple[str, List[dict]]:
+        """从左到右取最长匹配，字母数字开头 / 结尾的替换值要求两侧不是字母数字"""
+        out, items = [], []
+        last = i = size = 0
+        n = len(text)
+        while i < n - 1:
+            for length in self.prefix_lengths.get(text[i:i + 2], ()):
+                end = i + length
+                hit = self.reverse.get(text[i:end]) if end <= n else None
+                if hit is None:
+                    continue
+                if (i > 0 and is_word_char(text[i]) and is_word_char(text[i - 1])) or \
+                        (end < n and is_word_char(text[end - 1]) and is_word_char(text[end])):
+                    continue
+                entity_type, original = hit
+                out.append(text[last:i])
+                out.append(original)
+                start = size + i - last
+                size = start + len(original)
+                items.append({'start': start, 'end': size, 'entity_type': entity_type,
+                              'text': original, 'pseudonym': text[i:end]})
+                last = i = end
+                break
+            else:
+                i += 1
+        out.append(text[last:])
+        return ''.join(out), items
+
+
+class PseudonymVault:
+    """
+    path 为 None 时只在内存中。各租户首次使用时从 sqlite 加载全部映射，之后按行 id 增量同步其他 worker 写入的映射；
+    本进程生成的映射立即可用，由后台线程每 flush_interval 秒或攒够 flush_size 条批量写入
+    """
+
+    def __init__(self, path: Optional[str] = None,
+                 flush_interval: float = VAULT_FLUSH_INTERVAL,
+                 flush_size: int = VAULT_FLUSH_SIZE):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.namespaces: Dict[str, Namespace] = {}
+        self._pending: List[tuple] = []
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._flusher_pid = None
+        self._flush_event = threading.Event()
+        self.flushed = 0
+        self.conflicts = 0
+        if path is not None:
+            create_private_file(path)
+            with self._connect() as conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS pseudonyms ('
+                             'id INTEGER PRIMARY KEY, namespace TEXT NOT NULL, entity_type TEXT NOT NULL, '
+                             'original TEXT NOT NULL, pseudonym TEXT NOT NULL, created_at REAL, '
+                             'UNIQUE (namespace, entity_type, original), UNIQUE (namespace, pseudonym))')
+                conn.execute('CREATE INDEX IF NOT EXISTS pseudonyms_sync ON pseudonyms (namespace, id)')
+            atexit.register(self.flush)
+
+    def _connect(self) -> sqlite3.Connection:
+        # 每个线程（以及 fork 后的每个进程）各用一个连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def namespace(self, name: str, sync: bool = False) -> Namespace:
+        """sync 为 False 时最多每 flush_interval 秒同步一次"""
+        ns = self.namespaces.get(name)
+        if ns is None:
+            with self._lock:
+                ns = self.namespaces.setdefault(name, Namespace(name))
+        if self.path is not None and (sync or time.monotonic() - ns.synced_at >= self.flush_interval):
+            self._sync(ns)
+        return ns
+
+    def _sync(self, ns: Namespace) -> None:
+        with self._lock:
+            try:
+                rows = self._connect().execute(
+                    'SELECT id, entity_type, original, pseudonym FROM pseudonyms WHERE namespace = ? AND id > ? '
+                    'ORDER BY id', (ns.name, ns.synced_id)).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f'vault sync {ns.name} failed: {e}')
+                return
+            for row_id, entity_type, original, pseudonym in rows:
+                # sqlite 中的映射为准，与本进程未写入的映射冲突时，本进程的映射在写入时被丢弃
+                ns.add(entity_type, original, pseudonym)
+                ns.synced_id = row_id
+            ns.synced_at = time.monotonic()
+
+    def pseudonym(self, tenant: str, entity_type: str, original: str, seed: str = SURROGATE_SEED) -> str:
+        """原值已有替换值时直接返回，否则生成一个本租户内未使用的替换值"""
+        ns = self.namespace(tenant)
+        pseudonym = ns.forward.get((entity_type, original))
+        if pseudonym is not None:
+            return pseudonym
+
+        with self._lock:
+            pseudonym = ns.forward.get((entity_type, original))
+            if pseudonym is not None:
+                return pseudonym
+            for attempt in range(MAX_SURROGATE_ATTEMPTS):
+                key = original if attempt == 0 else f'{original}\x1f{attempt}'
+                pseudonym = surrogate(entity_type, key, seed)
+                if attempt >= MAX_SURROGATE_ATTEMPTS // 2:
+                    pseudonym += Draw(seed, entity_type, key).digits(attempt // 4)
+                if pseudonym != original and pseudonym not in ns.reverse:
+                    break
+            else:
+                raise ValueError(f'can not find an unused pseudonym for {entity_type} in tenant {tenant}')
+            ns.add(entity_type, original, pseudonym)
+            if self.path is not None:
+                self._pending.append((tenant, entity_type, original, pseudonym, time.time()))
+                self._start_flusher()
+                if len(self._pending) >= self.flush_size:
+                    self._flush_event.set()
+        return pseudonym
+
+    def restore(self, tenant: str, text: str) -> Tuple[str, List[dict]]:
+        """
+        Returns: 还原后的文本，以及各还原位置 {start, end, entity_type, text, pseudonym}（还原后文本中的偏移）
+        """
+        return self.namespace(tenant, sync=True).restore(text)
+
+    def _start_flusher(self) -> None:
+        if self._flusher_pid != os.getpid():
+            # fork 出的子进程中后台线程不存在，重新启动
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_loop, name='pii-vault-flush', daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        写入缓冲的映射，返回写入条数。与其他 worker 同时为同一原值或同一替换值写入时以先写入的为准，
+        本进程冲突的映射从内存中移除，下次同步时加载 sqlite 中的映射
+        """
+        with self._lock:
+            rows, self._pending = self._pending, []
+        if not rows:
+            return 0
+
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN')
+            inserted = 0
+            conflicted = []
+            for row in rows:
+                cursor = conn.execute('INSERT OR IGNORE INTO pseudonyms '
+                                      '(namespace, entity_type, original, pseudonym, created_at) VALUES (?, ?, ?, ?, ?)', row)
+                if cursor.rowcount:
+                    inserted += 1
+                else:
+                    conflicted.append(row)
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            with self._lock:
+                self._pending = rows + self._pending
+            logger.warning(f'vault flush of {len(rows)} rows failed, will retry: {e}')
+            return 0
+
+        if conflicted:
+            with self._lock:
+                for tenant, entity_type, original, pseudonym, _ in conflicted:
+                    stored = conn.execute('SELECT pseudonym FROM pseudonyms WHERE namespace = ? AND entity_type = ? '
+                                          'AND original = ?', (tenant, entity_type, original)).fetchone()
+                    if stored is None or stored[0] != pseudonym:
+                        self.conflicts += 1
+                        self.namespaces[tenant].remove(entity_type, original)
+                        self.namespaces[tenant].synced_at = 0.0
+            if self.conflicts:
+                logger.warning(f'vault flush: {self.conflicts} pseudonyms conflicted with other workers so far')
+        self.flushed += inserted
+        return inserted
+
+    def stats(self) -> dict:
+        return {
+            'backend': VAULT_BACKEND,
+            'tenants': len(self.namespaces),
+            'mappings': sum(len(ns.forward) for ns in list(self.namespaces.values())),
+            'pending': len(self._pending),
+            'flushed': self.flushed,
+            'conflicts': self.conflicts,
+        }
+
+
+def create_vault() -> PseudonymVault:
+    if VAULT_BACKEND == 'sqlite':
+        return PseudonymVault(VAULT_PATH)
+    if VAULT_BACKEND == 'memory':
+        if DEANONYMIZE_ENABLED and WORKERS > 1:
+            # 各 worker 的内存假名库互不相通，发到其他 worker 的还原请求会原样返回文本
+            raise ValueError('PII_DEANONYMIZE_ENABLED with PII_WORKERS > 1 needs PII_VAULT_BACKEND=sqlite, '
+                             'the memory vault is not shared between workers')
+        return PseudonymVault(None)
+    raise ValueError(f'unknown PII_VAULT_BACKEND {VAULT_BACKEND}, use sqlite or memory')
+
+
+pseudonym_vault = create_vault()
+
+
+class Pseudonymize(Operator):
+    """Replace the PII text with a surrogate value recorded in the tenant's pseudonym vault, reusing earlier ones."""
+
+    TENANT = 'tenant'
+    SEED = 'seed'
+
+    def operate(self, text: str = None, params: Dict = None) -> str:
+        params = params or {}
+        return pseudonym_vault.pseudonym(params.get(self.TENANT) or DEFAULT_TENANT, params.get('entity_type', ''),
+                                         text or '', params.get(self.SEED) or SURROGATE_SEED)
+
+    def validate(self, params: Dict = None) -> None:
+        params = params or {}
+        validate_type(params.get(self.TENANT), self.TENANT, str)
+        validate_type(params.get(self.SEED), self.SEED, str)
+        validate_seed(params.get(self.SEED))
+
+    def operator_name(self) -> str:
+        return PSEUDONYMIZE
+
+    def operator_type(self) -> OperatorType:
+        return OperatorType.Anonymize
+
+
+# OperatorsFactory 首次使用时扫描 Operator 的子类并缓存，已缓存时手动加入
+OperatorsFactory.get_anonymizers().setdefault(PSEUDONYMIZE, Pseudonymize)
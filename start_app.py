@@ -10,9 +10,104 @@ import os
 if os.path.exists('.env'):
     dotenv.load_dotenv()
 
+import argparse
+import gc
+import shutil
+import signal
+import socket
+import tempfile
+import time
+
 import uvicorn
+from loguru import logger
+
+
+def serve_prefork(host: str, port: int, workers: int):
+    """
+    生产模式：master 进程加载一次 PresidioEngine 及 spaCy 模型后 fork 出 workers 个子进程，
+    子进程通过 copy-on-write 共享模型内存，master 只负责监听信号并拉起退出的子进程
+    """
+    # 引擎按 worker 数确定每个 worker 的长文档进程数，须在导入前设置
+    os.environ['PII_WORKERS'] = str(workers)
+    # 各 worker 的指标快照写入同一目录，/metrics 返回所有 worker 合并后的数据
+    metrics_dir = None
+    if not os.getenv('PII_METRICS_DIR'):
+        metrics_dir = os.environ['PII_METRICS_DIR'] = tempfile.mkdtemp(prefix='pii_metrics_')
+    load_start = time.perf_counter()
+    from src.api import app, warmup
+    from src.core.metrics import registry
+    registry.clear()
+    logger.info(f"app loaded in {time.perf_counter() - load_start:.2f}s")
+    # fork 前完成预热，worker 共享已加载的模型和编译好的正则
+    warmup()
+    logger.info(f"forking {workers} workers")
+
+    # 模型加载完成后把现存对象移出 gc 跟踪，避免子进程 gc 扫描时写脏共享内存页
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            config = uvicorn.Config(app=app, log_level="info")
+            uvicorn.Server(config).run(sockets=[sock])
+            os._exit(0)
+        children.add(pid)
+        logger.info(f"worker {pid} started")
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            logger.warning(f"worker {pid} exited with status {status}, restarting")
+            spawn()
+
+    sock.close()
+    if metrics_dir is not None:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=int(os.getenv('PII_WORKERS', 0)),
+                        help='> 0 启用生产模式：预加载模型后 fork 多个 worker，默认单进程 reload 开发模式')
+    args = parser.parse_args()
+
     # 启动服务
-    uvicorn.run(app="src.api:app", host="0.0.0.0", port=8080, log_level="info", reload=True)
+    if args.workers > 0:
+        serve_prefork(args.host, args.port, args.workers)
+    else:
+        uvicorn.run(app="src.api:app", host=args.host, port=args.port, log_level="info", reload=True)
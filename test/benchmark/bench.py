@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/19 02:40
+# @Author : ltm
+# @Email :
+# @Desc : 基准测试：new_recognizer 中各 recognizer 的单独耗时、PresidioEngine 的 analyze / custom_analyze / anonymize、
+# 进程内 FastAPI 接口；输出吞吐、p50 / p99 延迟、峰值内存的 JSON，并与保存的基线比较
+# $ python test/benchmark/bench.py --sizes 1KB,100KB --output bench.json
+# $ python test/benchmark/bench.py --save-baseline                 # 保存为 test/benchmark/baseline.json
+# $ python test/benchmark/bench.py --fail-on-regression            # p50 比基线慢超过 --tolerance 时退出码为 1
+
+import argparse
+import inspect
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT)
+
+# 测的是识别本身：关闭结果缓存，假名库只放内存，不加载本机注册的自定义 recognizer（均可用环境变量覆盖）
+os.environ.setdefault('PII_RESULT_CACHE_BACKEND', 'none')
+os.environ.setdefault('PII_VAULT_BACKEND', 'memory')
+os.environ.setdefault('PII_CUSTOM_RECOGNIZERS_PATH', os.path.join(tempfile.mkdtemp(), 'custom_recognizers.json'))
+
+from loguru import logger
+
+from corpus import DEFAULT_SEED, DEFAULT_SIZES, KINDS, format_size, generate_document, parse_size
+
+SUITES = ('recognizers', 'engine', 'api')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# 不小于该字节数的文档不做预热轮，避免 10MB 文档多跑一遍
+WARMUP_MAX_BYTES = 1024 * 1024
+
+# 与 test/presido_case_custom.py 相同的实体与替换值
+ENTITY_MAPPING = {
+    "PERSON": "[姓名]",
+    "ID_CARD": "[证件号码]",
+    "PHONE_NUMBER": "[手机号码]",
+    "EMAIL_ADDRESS": "[电子邮箱]",
+    "BIRTH_DATE": "[出生日期]",
+    "HOUSEHOLD_ADDRESS": "[户口所在地]",
+    "RESIDENTIAL_ADDRESS": "[现居住地址]",
+    "MAILING_ADDRESS": "[通讯地址]",
+    "HOME_ADDRESS": "[家庭地址]",
+    "COMPANY_NAME": "[公司名称]",
+    "COMPANY_ADDRESS": "[公司地址]",
+    "SALARY_AMOUNT": "[工资金额]",
+    "BANK_CARD": "[银行卡号]",
+}
+SCORE_THRESHOLD = 0.3
+# custom_analyze 的实体：正则（工号）+ 上下文词，deny_list（部门名称）
+CUSTOM_ENTITIES = [
+    {'entity': 'EMPLOYEE_ID', 'patterns': [{'name': 'employee_id', 'regex': r'EMP\d{6}', 'score': 0.6}],
+     'context': ['工号']},
+    {'entity': 'DEPARTMENT', 'deny_list': ['软件部', '财务部', '人力资源部', '市场部', '研发中心', '行政部', '销售部', '运营部']},
+]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """nearest-rank 百分位，轮数少时 p99 即最大值"""
+    return sorted_values[max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))]
+
+
+class Runner:
+    """
+    每个基准先跑一轮预热（1MB 以上的文档除外），再至少跑 min_rounds 轮、累计不少于 min_time 秒（不超过 max_rounds 轮）；
+    峰值内存为额外一轮在 tracemalloc 下的 Python 堆分配峰值（长文档子进程中的分配不计入）
+    """
+
+    def __init__(self, min_rounds: int = 5, min_time: float = 1.0, max_rounds: int = 1000, memory: bool = True,
+                 name_filter: Optional[str] = None):
+        self.min_rounds = min_rounds
+        self.min_time = min_time
+        self.max_rounds = max_rounds
+        self.memory = memory
+        self.name_filter = name_filter
+        self.results: Dict[str, dict] = {}
+
+    def selected(self, name: str) -> bool:
+        return not self.name_filter or self.name_filter in name
+
+    def run(self, name: str, fn: Callable, nbytes: int) -> Optional[dict]:
+        if not self.selected(name):
+            return None
+        if nbytes < WARMUP_MAX_BYTES:
+            fn()
+
+        times = []
+        start = time.perf_counter()
+        while len(times) < self.min_rounds or (time.perf_counter() - start < self.min_time
+                                               and len(times) < self.max_rounds):
+            t = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t)
+
+        peak = None
+        if self.memory:
+            tracemalloc.start()
+            try:
+                fn()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        times.sort()
+        total = sum(times)
+        result = {
+            'rounds': len(times),
+            'bytes': nbytes,
+            'mean_ms': total / len(times) * 1000,
+            'p50_ms': percentile(times, 0.5) * 1000,
+            'p99_ms': percentile(times, 0.99) * 1000,
+            'min_ms': times[0] * 1000,
+            'ops_per_sec': len(times) / total,
+            'mb_per_sec': nbytes * len(times) / total / (1024 * 1024),
+            'peak_memory_bytes': peak,
+        }
+        self.results[name] = result
+        logger.info(f"{name}: p50 {result['p50_ms']:.3f}ms p99 {result['p99_ms']:.3f}ms "
+                    f"{result['mb_per_sec']:.2f}MB/s ({result['rounds']} rounds)")
+        return result
+
+
+def bench_recognizers(runner: Runner, documents: Dict[str, str]):
+    """new_recognizer 中的每个 recognizer 单独识别整篇文档，不经过 AnalyzerEngine 和 nlp"""
+    from presidio_analyzer import PatternRecognizer
+    from src.core import new_recognizer
+
+    recognizer_classes = [
+        cls for _, cls in inspect.getmembers(new_recognizer, inspect.isclass)
+        if issubclass(cls, PatternRecognizer) and cls.__module__ == new_recognizer.__name__
+        and cls is not new_recognizer.PatchPatternRecognizer
+    ]
+    for cls in recognizer_classes:
+        recognizer = cls()
+        for label, text in documents.items():
+            runner.run(f'recognizer/{cls.__name__}/{label}',
+                       lambda: recognizer.analyze(text, recognizer.supported_entities, None), len(text.encode('utf-8')))
+
+
+def bench_engine(runner: Runner, documents: Dict[str, str]):
+    from src.core.presido import CustomAnalyzeModel, OperatorConf, pii_engine
+
+    entities = list(ENTITY_MAPPING)
+    custom_entities = [CustomAnalyzeModel(**entity) for entity in CUSTOM_ENTITIES]
+    operators = [OperatorConf(entity_type=entity_type, operator_name='replace', params={'new_value': new_value})
+                 for entity_type, new_value in ENTITY_MAPPING.items()]
+    for label, text in documents.items():
+        nbytes = len(text.encode('utf-8'))
+        runner.run(f'engine/analyze/{label}',
+                   lambda: pii_engine.analyze(text, 'zh', entities, SCORE_THRESHOLD), nbytes)
+        runner.run(f'engine/custom_analyze/{label}',
+                   lambda: pii_engine.custom_analyze(text, 'zh', custom_entities, None), nbytes)
+        if runner.selected(f'engine/anonymize/{label}'):
+            results = pii_engine.analyze(text, 'zh', entities, SCORE_THRESHOLD)
+            runner.run(f'engine/anonymize/{label}',
+                       lambda: pii_engine.anonymize(text, results, False, operators), nbytes)
+
+
+def bench_api(runner: Runner, documents: Dict[str, str]):
+    """进程内调用 FastAPI 接口，包含请求校验、线程池调度和响应编码"""
+    from starlette.testclient import TestClient
+    from src.api import app
+    from src.core.presido import pii_engine
+
+    operators = [{'entity_type': entity_type, 'operator_name': 'replace', 'params': {'new_value': new_value}}
+                 for entity_type, new_value in ENTITY_MAPPING.items()]
+
+    def post(client: TestClient, path: str, body: dict):
+        response = client.post(path, json=body)
+        data = response.json()
+        if response.status_code != 200 or data['code'] != 200:
+            raise RuntimeError(f"{path} failed: {response.status_code} {data.get('message')}")
+        return data
+
+    with TestClient(app) as client:
+        pii_engine.ready.wait()
+        for label, text in documents.items():
+            nbytes = len(text.encode('utf-8'))
+            analyze_body = {'text': text, 'lang': 'zh', 'entities': list(ENTITY_MAPPING),
+                            'score_threshold': SCORE_THRESHOLD, 'with_anonymize': True,
+                            'anonymize_operators': operators}
+            runner.run(f'api/analyze/{label}', lambda: post(client, '/pii/analyze', analyze_body), nbytes)
+            custom_body = {'text': text, 'lang': 'zh', 'entities': CUSTOM_ENTITIES}
+            runner.run(f'api/custom_analyze/{label}', lambda: post(client, '/pii/custom_analyze', custom_body),
+                       nbytes)
+            if runner.selected(f'api/anonymize/{label}'):
+                analyzer_results = post(client, '/pii/analyze', dict(analyze_body, with_anonymize=False))['data']['analyze']
+                anonymize_body = {'text': text, 'analyzer_results': analyzer_results, 'operators': operators}
+                runner.run(f'api/anonymize/{label}', lambda: post(client, '/pii/anonymize', anonymize_body), nbytes)
+
+
+BENCHMARKS = {
+    'recognizers': bench_recognizers,
+    'engine': bench_engine,
+    'api': bench_api,
+}
+
+
+def compare(results: Dict[str, dict], baseline: dict, tolerance: float) -> dict:
+    """按 p50 判断：比基线慢超过 tolerance 为 regression，快超过同样比例为 improvement"""
+    benchmarks = {}
+    for name, current in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base or not base.get('p50_ms'):
+            continue
+        ratio = current['p50_ms'] / base['p50_ms']
+        if ratio > 1 + tolerance:
+            status = 'regression'
+        elif ratio < 1 / (1 + tolerance):
+            status = 'improvement'
+        else:
+            status = 'unchanged'
+        memory_ratio = None
+        if current.get('peak_memory_bytes') and base.get('peak_memory_bytes'):
+            memory_ratio = current['peak_memory_bytes'] / base['peak_memory_bytes']
+        benchmarks[name] = {
+            'status': status,
+            'p50_ratio': ratio,
+            'p99_ratio': current['p99_ms'] / base['p99_ms'] if base.get('p99_ms') else None,
+            'throughput_ratio': current['mb_per_sec'] / base['mb_per_sec'] if base.get('mb_per_sec') else None,
+            'peak_memory_ratio': memory_ratio,
+            'baseline_p50_ms': base['p50_ms'],
+            'p50_ms': current['p50_ms'],
+        }
+    return {
+        'tolerance': tolerance,
+        'baseline_meta': baseline.get('meta'),
+        'benchmarks': benchmarks,
+        'regressions': sorted(name for name, row in benchmarks.items() if row['status'] == 'regression'),
+        'improvements': sorted(name for name, row in benchmarks.items() if row['status'] == 'improvement'),
+        # 基线中没有的基准
+        'new': sorted(set(results) - set(baseline.get('results', {}))),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def meta(args, sizes: List[str]) -> dict:
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'suites': args.suites,
+        'sizes': sizes,
+        'kind': args.kind,
+        'seed': args.seed,
+        # Linux 上 ru_maxrss 单位为 KB
+        'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='benchmark recognizers, engine and api on a synthetic zh corpus')
+    parser.add_argument('--suites', default=','.join(SUITES), help=f'comma separated, from {",".join(SUITES)}')
+    parser.add_argument('--sizes', default=','.join(DEFAULT_SIZES), help='document sizes, e.g. 100B,10KB,1MB')
+    parser.add_argument('--kind', choices=KINDS, default='mixed', help='synthetic document kind')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--filter', default=None, help='only run benchmarks whose name contains this string')
+    parser.add_argument('--min-rounds', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=1.0, help='minimum seconds per benchmark')
+    parser.add_argument('--max-rounds', type=int, default=1000)
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc round')
+    parser.add_argument('--output', default=None, help='report path, default stdout')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='write the results to --baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed p50 slowdown against the baseline')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    suites = [suite.strip() for suite in args.suites.split(',') if suite.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f'unknown suites {sorted(unknown)}, use {",".join(SUITES)}')
+    args.suites = suites
+    sizes = [format_size(parse_size(size)) for size in args.sizes.split(',') if size.strip()]
+    documents = {size: generate_document(args.kind, parse_size(size), args.seed) for size in sizes}
+
+    runner = Runner(args.min_rounds, args.min_time, args.max_rounds, not args.no_memory, args.filter)
+    if 'engine' in suites or 'api' in suites:
+        from src.core.presido import pii_engine
+        # 与服务启动时相同：先预热再 fork 长文档进程，子进程共享已加载的模型
+        pii_engine.warmup()
+        pii_engine.start_long_doc_pool()
+    try:
+        for suite in suites:
+            BENCHMARKS[suite](runner, documents)
+    finally:
+        if 'engine' in suites or 'api' in suites:
+            pii_engine.shutdown_long_doc_pool()
+
+    report = {'meta': meta(args, sizes), 'results': runner.results}
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f'baseline saved to {args.baseline}')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            report['comparison'] = compare(runner.results, json.load(f), args.tolerance)
+        report['comparison']['baseline'] = args.baseline
+        for name in report['comparison']['regressions']:
+            row = report['comparison']['benchmarks'][name]
+            logger.warning(f"regression {name}: p50 {row['baseline_p50_ms']:.3f}ms -> {row['p50_ms']:.3f}ms")
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.fail_on_regression and report.get('comparison', {}).get('regressions'):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/19 02:10
+# @Author : ltm
+# @Email :
+# @Desc : 基准测试用的合成中文语料：劳动合同、员工信息登记表、登记表单三类文档，格式仿照 test/presido_case_custom.py 中的真实文档，
+# 身份证号校验码、银行卡 Luhn 校验合法；同一 seed 总是生成同一份语料
+# $ python test/benchmark/corpus.py --kind hr --size 2KB --seed 1
+
+import argparse
+import os
+import random
+import sys
+from datetime import date
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.core.surrogate import (BANK_BINS, COMPANY_WORDS, EMAIL_DOMAINS, GIVEN_CHARS, INDUSTRIES, LETTERS,
+                                MOBILE_PREFIXES, REGIONS, ROADS, SURNAMES, id_check_code, luhn_check_digit)
+
+DEFAULT_SEED = 20231019
+# mixed 为三类记录随机交替
+KINDS = ('contract', 'hr', 'registration', 'mixed')
+SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 * 1024}
+DEFAULT_SIZES = ('100B', '1KB', '10KB', '100KB', '1MB', '10MB')
+
+BANKS = ('中国银行', '中国工商银行', '中国建设银行', '中国农业银行', '招商银行', '交通银行', '中国邮政储蓄银行', '浦发银行')
+DEGREES = ('大学本科', '硕士研究生', '大学专科', '博士研究生')
+UNIVERSITIES = ('北京工业大学', '浙江大学', '武汉大学', '四川大学', '南京大学', '华南理工大学', '西安交通大学', '山东大学')
+MAJORS = ('计算机科学与技术', '软件工程', '会计学', '市场营销', '机械工程', '法学', '人力资源管理', '电子信息工程')
+DEPARTMENTS = ('软件部', '财务部', '人力资源部', '市场部', '研发中心', '行政部', '销售部', '运营部')
+TITLES = ('软件工程师', '部门负责人', '会计', '销售经理', '产品经理', '测试工程师', '行政专员', '总经理')
+RELATIONS = ('夫妻', '父子', '母子', '父女', '母女')
+ETHNICITIES = ('汉族', '汉族', '汉族', '回族', '满族', '壮族')
+COMPANY_SUFFIXES = ('有限公司', '有限公司', '股份有限公司', '有限责任公司')
+BRANCHES = ('', '', '北京分公司', '上海分公司', '顺义分公司', '深圳分公司')
+# 不含 PII 的合同条款，按原样穿插在文档中
+CLAUSES = (
+    '根据相关法律法规的规定，依据甲方的项目安排，经甲乙双方协商一致，双方同意通过电子签约方式签订本合同。',
+    '本手册的最终解释权归甲方所有。本手册未做规定的，按《劳动合同法》的规定执行。',
+    '如国家新颁布的法律法规与本手册的内容不一致的，以新颁布的法律法规为准。',
+    '乙方应当遵守甲方依法制定的各项规章制度，服从甲方的工作安排，按时完成工作任务。',
+    '甲方按照国家和地方有关规定为乙方缴纳社会保险费，乙方个人应缴纳部分由甲方代扣代缴。',
+    '本合同一式两份，甲乙双方各执一份，具有同等法律效力，自双方签字（盖章）之日起生效。',
+    '乙方在合同期内因个人原因提出解除劳动合同的，应提前三十日以书面形式通知甲方。',
+    '1、此表注意事项已阅读，以上情况均如实、正确填写，如与事实不符，属于提供虚假个人资料，本人愿意接受解除劳动关系的处理结果。',
+    '2、税务系统中，个税专项扣缴填报的信息准确、真实，本人已知出现虚假填报，属于严重违纪，公司可以以此解除劳动关系。',
+)
+
+
+def parse_size(size: str) -> int:
+    """'100B' / '10KB' / '1MB' / '512' -> 字节数"""
+    size = size.strip().upper()
+    for unit in ('MB', 'KB', 'B'):
+        if size.endswith(unit):
+            return int(float(size[:-len(unit)]) * SIZE_UNITS[unit])
+    return int(size)
+
+
+def format_size(size: int) -> str:
+    for unit in ('MB', 'KB'):
+        if size >= SIZE_UNITS[unit] and size % SIZE_UNITS[unit] == 0:
+            return f'{size // SIZE_UNITS[unit]}{unit}'
+    return f'{size}B'
+
+
+class Faker:
+    """生成单个字段的值，所有随机数来自同一个 random.Random"""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def person(self) -> str:
+        return self.rng.choice(SURNAMES) + ''.join(self.rng.choice(GIVEN_CHARS) for _ in range(self.rng.randint(1, 2)))
+
+    def birth_date(self) -> date:
+        return date.fromordinal(self.rng.randint(date(1960, 1, 1).toordinal(), date(2003, 12, 31).toordinal()))
+
+    def id_card(self, birth: date) -> str:
+        body = self.rng.choice(REGIONS)[0] + birth.strftime('%Y%m%d') + f'{self.rng.randrange(1000):03d}'
+        return body + id_check_code(body)
+
+    def phone(self) -> str:
+        return self.rng.choice(MOBILE_PREFIXES) + f'{self.rng.randrange(10 ** 8):08d}'
+
+    def bank_card(self) -> str:
+        payload = self.rng.choice(BANK_BINS) + ''.join(str(self.rng.randrange(10)) for _ in range(12))
+        return payload + luhn_check_digit(payload)
+
+    def address(self) -> str:
+        address = f'{self.rng.choice(REGIONS)[1]}{self.rng.choice(ROADS)}{self.rng.randint(1, 300)}号'
+        if self.rng.random() < 0.6:
+            address += f'院{self.rng.randint(1, 30)}号楼{self.rng.randint(1, 28)}{self.rng.randint(1, 20):02d}'
+        return address
+
+    def company(self) -> str:
+        return (self.rng.choice(COMPANY_WORDS) + self.rng.choice(INDUSTRIES) + self.rng.choice(COMPANY_SUFFIXES)
+                + self.rng.choice(BRANCHES))
+
+    def email(self) -> str:
+        user = ''.join(self.rng.choice(LETTERS) for _ in range(self.rng.randint(5, 10)))
+        if self.rng.random() < 0.5:
+            user = str(self.rng.randint(10 ** 7, 10 ** 10))
+        return f'{user}@{self.rng.choice(EMAIL_DOMAINS)}'
+
+    def salary(self) -> int:
+        return self.rng.randrange(5000, 80000, 500)
+
+    def employee_id(self) -> str:
+        return f'EMP{self.rng.randrange(10 ** 6):06d}'
+
+    def dotted(self, value: date) -> str:
+        return f'{value.year}.{value.month}.{value.day}'
+
+    def clauses(self, k: int) -> str:
+        return '\n'.join(self.rng.sample(CLAUSES, k))
+
+
+def contract_record(fake: Faker) -> str:
+    """劳动合同的甲乙方信息与薪酬条款"""
+    birth = fake.birth_date()
+    address = fake.address()
+    lines = [
+        f'甲方：{fake.company()}',
+        f'住 所：{fake.address()}',
+        f'负责人：{fake.person()}',
+        f'乙方：姓 名 {fake.person()} 性别 {fake.rng.choice("男女")} 出生日期 {fake.dotted(birth)}',
+        f'身份证号 {fake.id_card(birth)} 户口所在地 {fake.address()}',
+        f'现居住地址（有效通讯地址） {address}',
+        f'手机号码： {fake.phone()} 电子邮箱 {fake.email()}',
+        f'家庭地址： {address}',
+        f'家庭电话： {fake.phone() if fake.rng.random() < 0.5 else "/"}',
+        fake.clauses(2),
+        f'乙方正常工作期间的月工资为税前人民币 {fake.salary()} 元，每月{fake.rng.randint(5, 15)}日前支付上月工资。',
+        f'工资卡卡号 {fake.bank_card()} 开户行 {fake.rng.choice(BANKS)}{fake.rng.choice(REGIONS)[1][:2]}支行',
+    ]
+    return '\n'.join(lines)
+
+
+def hr_record(fake: Faker) -> str:
+    """员工服务信息登记表，含履历和家庭成员表格"""
+    birth = fake.birth_date()
+    address = fake.address()
+    graduated = date(min(birth.year + 22, 2025), 7, 1)
+    lines = [
+        '服务信息登记表',
+        f'姓 名 {fake.person()} 身份证号 {fake.id_card(birth)}',
+        f'出生日期 {fake.dotted(birth)} 性别 {fake.rng.choice("男女")} 婚姻状态 {fake.rng.choice(("已婚", "未婚"))}',
+        f'民族 {fake.rng.choice(ETHNICITIES)} 政治面貌 {fake.rng.choice(("群众", "中共党员", "共青团员"))}',
+        f'户口所在地 {fake.address()} 户口性质 {fake.rng.choice(("北京城镇", "外埠城镇", "外埠农村"))}',
+        f'最高学历 {fake.rng.choice(DEGREES)} 毕业院校 {fake.rng.choice(UNIVERSITIES)} '
+        f'毕业时间 {graduated.year}.{graduated.month} 专业 {fake.rng.choice(MAJORS)}',
+        f'家庭地址 {address}',
+        f'家庭电话 {fake.phone()} 手机号码 {fake.phone()} 个人邮箱 {fake.email()}',
+        f'工资卡卡号 {fake.bank_card()} {fake.rng.choice(BANKS)}{fake.rng.choice(REGIONS)[1][:2]}支行',
+        f'薪酬标准：{fake.salary()}',
+        '本人履历（从最高学历起填写）',
+        '起止时间（年月） 单位 部门职务 证明人 证明人职位 证明人联系方式',
+    ]
+    year = graduated.year
+    for _ in range(fake.rng.randint(1, 3)):
+        end = min(year + fake.rng.randint(1, 8), 2025)
+        lines.append(f'{year}.{fake.rng.randint(1, 12)} – {end}.{fake.rng.randint(1, 12)} {fake.company()} '
+                     f'{fake.rng.choice(DEPARTMENTS)}/{fake.rng.choice(TITLES)} {fake.person()} '
+                     f'{fake.rng.choice(TITLES)} {fake.phone()}')
+        year = end
+    lines.append('姓名 关系 出生日期 工作单位 联系电话')
+    lines.append(f'{fake.person()} {fake.rng.choice(RELATIONS)} {fake.birth_date().year} {fake.company()} {fake.phone()}')
+    lines.append('本人声明：')
+    lines.append(fake.clauses(2))
+    return '\n'.join(lines)
+
+
+def registration_record(fake: Faker) -> str:
+    """入职登记 / 开户登记一类的短表单"""
+    birth = fake.birth_date()
+    lines = [
+        f'姓名：{fake.person()}    工号：{fake.employee_id()}',
+        f'身份证号码：{fake.id_card(birth)}    出生日期：{birth.year}年{birth.month}月{birth.day}日',
+        f'联系电话：{fake.phone()}    电子邮箱：{fake.email()}',
+        f'通讯地址：{fake.address()}',
+        f'工作单位：{fake.company()}    单位地址：{fake.address()}',
+        f'银行卡号：{fake.bank_card()}    月收入：{fake.salary()}元',
+    ]
+    return '\n'.join(lines)
+
+
+RECORDS: Dict[str, Callable[[Faker], str]] = {
+    'contract': contract_record,
+    'hr': hr_record,
+    'registration': registration_record,
+}
+
+
+def truncate_utf8(text: str, size: int) -> str:
+    """截断到不超过 size 字节，不切断多字节字符"""
+    return text.encode('utf-8')[:size].decode('utf-8', 'ignore')
+
+
+def generate_document(kind: str, size: int, seed: int = DEFAULT_SEED) -> str:
+    """
+    拼接 kind 类型的记录直到 UTF-8 编码达到 size 字节，再截断到 size 字节（100B 这样的小文档只是一条记录的开头）
+    """
+    fake = Faker(random.Random(f'{seed}:{kind}:{size}'))
+    records = list(RECORDS.values()) if kind == 'mixed' else [RECORDS[kind]]
+    parts: List[str] = []
+    total = 0
+    while total < size:
+        part = fake.rng.choice(records)(fake) + '\n\n'
+        parts.append(part)
+        total += len(part.encode('utf-8'))
+    return truncate_utf8(''.join(parts), size)
+
+
+def generate_corpus(sizes=DEFAULT_SIZES, kinds=KINDS, seed: int = DEFAULT_SEED) -> Dict[str, Dict[str, str]]:
+    """{size 标签: {kind: 文档}}"""
+    corpus = {}
+    for size in sizes:
+        nbytes = parse_size(size) if isinstance(size, str) else size
+        corpus[format_size(nbytes)] = {kind: generate_document(kind, nbytes, seed) for kind in kinds}
+    return corpus
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='print a synthetic zh document')
+    parser.add_argument('--kind', choices=KINDS, default='hr')
+    parser.add_argument('--size', default='2KB')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    args = parser.parse_args()
+    print(generate_document(args.kind, parse_size(args.size), args.seed))
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/19 10:20
+# @Author : ltm
+# @Email :
+# @Desc : pytest 从仓库根目录导入 src
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/18 21:30
+# @Author : ltm
+# @Email :
+# @Desc : 本地 OpenAI chat completions 接口桩，离线测试 llm_synthesize 的并发、超时、重试和熔断
+# $ python test/llm_stub_server.py --port 8081 --latency 1 --fail-rate 0.2
+# $ OPENAI_API_BASE=http://127.0.0.1:8081/v1 OPENAI_API_KEY=stub python start_app.py
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+import regex as re
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+PLACEHOLDER = re.compile(r'<([A-Za-z_]+)>')
+FAKE_VALUES = {
+    'PERSON': '王磊',
+    'PHONE_NUMBER': '13800138000',
+    'ID_CARD': '110101199001011234',
+    'EMAIL_ADDRESS': 'someone@example.com',
+    'LOCATION': '上海市',
+    'DATE_TIME': '2020年1月1日',
+}
+
+app = FastAPI()
+app.state.latency = 0.5
+app.state.fail_rate = 0.0
+app.state.hang_rate = 0.0
+app.state.calls = 0
+
+
+def synthesize(content: str) -> str:
+    """取 prompt 中最后一个 input 的内容，占位符替换为固定的假数据"""
+    text = content.rsplit('input: ', 1)[-1]
+    if text.endswith('\noutput: '):
+        text = text[:-len('\noutput: ')]
+    return PLACEHOLDER.sub(lambda m: FAKE_VALUES.get(m.group(1), m.group(1).lower()), text)
+
+
+@app.post('/v1/chat/completions')
+async def chat_completions(request: Request):
+    body = await request.json()
+    app.state.calls += 1
+
+    roll = random.random()
+    if roll < app.state.fail_rate:
+        return JSONResponse(status_code=503, content={'error': {'message': 'stub overloaded', 'type': 'server_error'}})
+    if roll < app.state.fail_rate + app.state.hang_rate:
+        # 模拟无响应，触发客户端超时
+        await asyncio.sleep(3600)
+
+    await asyncio.sleep(app.state.latency)
+    content = synthesize(body['messages'][-1]['content'])
+    return {
+        'id': f'chatcmpl-{uuid.uuid4().hex}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'stub'),
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+    }
+
+
+@app.get('/stats')
+async def stats():
+    return {'calls': app.state.calls}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.5, help='每次调用的响应延迟秒数')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='返回 503 的比例')
+    parser.add_argument('--hang-rate', type=float, default=0.0, help='不响应的比例')
+    args = parser.parse_args()
+
+    app.state.latency = args.latency
+    app.state.fail_rate = args.fail_rate
+    app.state.hang_rate = args.hang_rate
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/19 15:00
+# @Author : ltm
+# @Email :
+# @Desc : sqlite 缓存文件只允许属主读写
+
+import os
+import stat
+
+from src.core.cache import SqliteCache
+
+
+def test_sqlite_cache_file_is_private(tmp_path):
+    path = str(tmp_path / 'cache' / 'llm_cache.sqlite')
+    cache = SqliteCache(path, maxsize=10)
+    cache.set('key', '我叫李雷')
+    assert cache.get('key') == '我叫李雷'
+    for file in (path, path + '-wal', path + '-shm'):
+        if os.path.exists(file):
+            assert stat.S_IMODE(os.stat(file).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) == 0o700
+
+    # 已存在的文件收紧权限
+    os.chmod(path, 0o644)
+    SqliteCache(path, maxsize=10)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
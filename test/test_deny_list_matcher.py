@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/19 11:40
+# @Author : ltm
+# @Email :
+# @Desc : DenyListMatcher 与 deny list 正则在随机生成的输入上结果一致：词条相互重叠 / 互为前缀、中英文相邻、词边界
+
+import random
+
+import pytest
+import regex as re
+
+from src.core import deny_list_matcher, presidio_zh_patch
+from src.core.deny_list_matcher import DenyListMatcher
+from src.core.presidio_zh_patch import ZhPatternRecognizer
+
+# 字符少，生成的词条之间大量重叠；中文、字母数字、标点、空白相邻
+ALPHABET = 'ab1张三李-. \n'
+CASES = 300
+
+
+def deny_list_regex(deny_list, word_boundary):
+    """ZhPatternRecognizer._deny_list_to_regex 的正则，按 PatternRecognizer 的默认 flags 匹配"""
+    escaped = '|'.join(re.escape(term) for term in deny_list)
+    if word_boundary:
+        regex = r"(?:^|(?<=\W))(" + escaped + r")(?:(?=\W)|$)"
+    else:
+        regex = r"(" + escaped + r")"
+    return re.compile(regex, flags=re.DOTALL | re.MULTILINE)
+
+
+def random_case(rng):
+    terms = [''.join(rng.choice(ALPHABET.strip()) for _ in range(rng.randint(1, 4)))
+             for _ in range(rng.randint(1, 12))]
+    # 加入互为前缀 / 后缀的词条
+    for term in list(terms[:3]):
+        terms.insert(rng.randrange(len(terms) + 1), term + rng.choice(ALPHABET.strip()))
+        if len(term) > 1:
+            terms.insert(rng.randrange(len(terms) + 1), term[1:])
+    pieces = [rng.choice(terms) if rng.random() < 0.4 else rng.choice(ALPHABET) for _ in range(rng.randint(0, 60))]
+    return terms, ''.join(pieces)
+
+
+@pytest.fixture(params=['ahocorasick', 'python'])
+def automaton(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(deny_list_matcher, 'ahocorasick', None)
+    elif deny_list_matcher.ahocorasick is None:
+        pytest.skip('pyahocorasick is not installed')
+    return request.param
+
+
+@pytest.mark.parametrize('word_boundary', [False, True])
+def test_matcher_same_as_regex(automaton, word_boundary):
+    rng = random.Random(f'{automaton}-{word_boundary}')
+    for _ in range(CASES):
+        terms, text = random_case(rng)
+        expected = [m.span() for m in deny_list_regex(terms, word_boundary).finditer(text)]
+        assert list(DenyListMatcher(terms, word_boundary).iter_spans(text)) == expected, (terms, text)
+
+
+@pytest.mark.parametrize('language', ['zh', 'en'])
+def test_recognizer_same_as_regex(language, monkeypatch):
+    rng = random.Random(language)
+    for _ in range(CASES // 3):
+        terms, text = random_case(rng)
+        spans = []
+        for threshold in (len(terms) + 1, 1):
+            # 词条数达到阈值时使用自动机，否则使用正则
+            monkeypatch.setattr(presidio_zh_patch, 'DENY_LIST_AUTOMATON_THRESHOLD', threshold)
+            recognizer = ZhPatternRecognizer(supported_entity='DENY', deny_list=terms, supported_language=language)
+            assert (recognizer.deny_list_matcher is not None) == (threshold == 1)
+            results = recognizer.analyze(text, ['DENY'])
+            spans.append(sorted((r.start, r.end, r.score) for r in results))
+        assert spans[0] == spans[1], (terms, text)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/19 17:10
+# @Author : ltm
+# @Email :
+# @Desc : 未开启 decision process 时同一 pattern 的结果共用只读的 explanation，上下文增强的修改不会串到其他结果
+
+from src.core.new_recognizer import IDCardRecognizer, SalaryAmountRecognizer, SharedExplanation, decision_process
+
+TEXT = '身份证411323198303155953，配偶身份证110101199003074514'
+
+
+def analyze(recognizer, text, with_explanation):
+    token = decision_process.set(with_explanation)
+    try:
+        return recognizer.analyze(text, recognizer.supported_entities)
+    finally:
+        decision_process.reset(token)
+
+
+def test_shared_explanation_is_read_only():
+    results = analyze(IDCardRecognizer(), TEXT, False)
+    assert len(results) == 2
+    first, second = (r.analysis_explanation for r in results)
+    assert first is second and isinstance(first, SharedExplanation)
+
+    # 与 LemmaContextAwareEnhancer 对单个结果的修改相同
+    first.set_supportive_context_word('身份证')
+    first.set_improved_score(1.0)
+    assert second.supportive_context_word == '' and second.score == second.original_score
+
+
+def test_decision_process_explanation_per_result():
+    results = analyze(IDCardRecognizer(), TEXT, True)
+    first, second = (r.analysis_explanation for r in results)
+    assert first is not second and not isinstance(first, SharedExplanation)
+
+    first.set_supportive_context_word('身份证')
+    first.set_improved_score(1.0)
+    assert first.supportive_context_word == '身份证' and first.score == 1.0
+    assert second.supportive_context_word == ''
+
+
+def test_standalone_salary_uses_shared_explanation():
+    recognizer = SalaryAmountRecognizer()
+    text = '薪酬标准：8000，薪酬标准：9500'
+    token = decision_process.set(False)
+    try:
+        results = recognizer._find_standalone_amounts(text)
+    finally:
+        decision_process.reset(token)
+    assert [(r.start, r.end) for r in results] == [(5, 9), (15, 19)]
+    first, second = (r.analysis_explanation for r in results)
+    assert first is second and isinstance(first, SharedExplanation)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/19 14:10
+# @Author : ltm
+# @Email :
+# @Desc : LLMClient 的超时、重试、结果顺序和熔断，openai 调用由 fake_acreate 代替
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import openai
+import pytest
+from openai import error as openai_error
+
+from src.core import llm_client as llm_client_module
+from src.core.cache import TTLLRUCache
+from src.core.llm_client import LLMClient, CircuitBreaker, LLMUnavailableError
+
+RESET = 0.1
+
+
+class FakeLLM:
+    """按 prompt 内容决定行为：fail 返回 503，bad 为不可重试的 400，hang 不返回，其余原样返回"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def acreate(self, model, messages, temperature, request_timeout):
+        content = messages[-1]['content']
+        self.calls.append(content)
+        if content.startswith('fail'):
+            raise openai_error.ServiceUnavailableError('stub overloaded')
+        if content.startswith('bad'):
+            raise openai_error.InvalidRequestError('bad request', None)
+        if content.startswith('hang'):
+            await asyncio.sleep(3600)
+        if content.startswith('slow'):
+            await asyncio.sleep(0.05)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content.upper()))])
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    fake = FakeLLM()
+    monkeypatch.setattr(openai.ChatCompletion, 'acreate', fake.acreate)
+    # 离线环境没有 tiktoken 的编码文件
+    monkeypatch.setattr(llm_client_module, 'get_text_token', lambda text, model=None: len(text))
+    monkeypatch.setattr(llm_client_module, 'LLM_BACKOFF_MAX', 0.01)
+    return fake
+
+
+@pytest.fixture
+def make_client(fake_llm):
+    clients = []
+
+    def make(retries=0, threshold=2):
+        client = LLMClient(concurrency=4, timeout=0.2, retries=retries,
+                           breaker=CircuitBreaker(threshold, RESET), cache=TTLLRUCache(100))
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        if client._session is not None:
+            asyncio.run_coroutine_threadsafe(client._session.close(), client.loop).result(5)
+        client.loop.call_soon_threadsafe(client.loop.stop)
+
+
+def run(client, *contents):
+    messages_list = [[{'role': 'user', 'content': content}] for content in contents]
+    return asyncio.run_coroutine_threadsafe(client.chat_all(messages_list), client.loop).result(5)
+
+
+def open_breaker(client):
+    for _ in range(client.breaker.threshold):
+        with pytest.raises(LLMUnavailableError):
+            run(client, 'fail')
+    assert client.breaker.state == 'open'
+    with pytest.raises(LLMUnavailableError, match='circuit breaker is open'):
+        run(client, 'ok')
+
+
+def wait_half_open(client):
+    time.sleep(RESET)
+    assert client.breaker.state == 'half_open'
+
+
+def test_order_and_retry(fake_llm, make_client):
+    client = make_client(retries=2, threshold=0)
+    assert run(client, 'slow a', 'b', 'slow c') == ['SLOW A', 'B', 'SLOW C']
+
+    with pytest.raises(LLMUnavailableError, match='after 3 attempts'):
+        run(client, 'fail')
+    assert fake_llm.calls.count('fail') == 3
+
+
+def test_timeout(fake_llm, make_client):
+    client = make_client(retries=1, threshold=0)
+    start = time.monotonic()
+    with pytest.raises(LLMUnavailableError, match='TimeoutError'):
+        run(client, 'hang')
+    assert time.monotonic() - start < 1
+    assert fake_llm.calls.count('hang') == 2
+
+
+def test_breaker_recovers(fake_llm, make_client):
+    client = make_client()
+    open_breaker(client)
+    wait_half_open(client)
+
+    # 试探失败重新 open
+    with pytest.raises(LLMUnavailableError):
+        run(client, 'fail')
+    assert client.breaker.state == 'open'
+
+    wait_half_open(client)
+    assert run(client, 'ok') == ['OK']
+    assert client.breaker.state == 'closed'
+
+
+def test_breaker_probe_non_retryable_error(fake_llm, make_client):
+    client = make_client()
+    open_breaker(client)
+    wait_half_open(client)
+
+    with pytest.raises(openai_error.InvalidRequestError):
+        run(client, 'bad')
+    assert client.breaker.state == 'open'
+
+    wait_half_open(client)
+    assert run(client, 'ok') == ['OK']
+    assert client.breaker.state == 'closed'
+
+
+def test_breaker_probe_cancelled(fake_llm, make_client):
+    client = make_client()
+    open_breaker(client)
+    wait_half_open(client)
+
+    # 第一个片段作为试探调用挂起，第二个片段被熔断拒绝，chat_all 取消试探调用
+    with pytest.raises(LLMUnavailableError, match='circuit breaker is open'):
+        run(client, 'hang', 'ok')
+    # 等事件循环处理完对试探调用的取消
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(0.01), client.loop).result(5)
+    assert client.breaker.state == 'half_open'
+    assert not client.breaker._probing
+
+    assert run(client, 'ok') == ['OK']
+    assert client.breaker.state == 'closed'
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/19 16:20
+# @Author : ltm
+# @Email :
+# @Desc : 多进程模式下 /metrics 合并所有进程的快照，fork 出的子进程不重复计入父进程的计数
+
+import os
+
+import pytest
+
+from src.core.metrics import MetricsRegistry, Counter, Histogram
+
+
+def make_registry(directory):
+    registry = MetricsRegistry(str(directory))
+    calls = registry.register(Counter('calls_total', 'calls', ('outcome',)))
+    latency = registry.register(Histogram('latency_seconds', 'latency', ('stage',), buckets=(0.1, 1.)))
+    return registry, calls, latency
+
+
+def test_render_merges_processes(tmp_path):
+    first, calls, latency = make_registry(tmp_path)
+    calls.inc('ok', amount=2)
+    latency.observe(0.05, 'llm')
+    second, other_calls, other_latency = make_registry(tmp_path)
+    other_calls.inc('ok')
+    other_calls.inc('error')
+    other_latency.observe(0.5, 'llm')
+    second.dump()
+
+    text = first.render()
+    assert 'calls_total{outcome="ok"} 3' in text
+    assert 'calls_total{outcome="error"} 1' in text
+    assert 'latency_seconds_bucket{stage="llm",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{stage="llm",le="1.0"} 2' in text
+    assert 'latency_seconds_count{stage="llm"} 2' in text
+    assert 'latency_seconds_sum{stage="llm"} 0.55' in text
+
+    # 没有目录时只有本进程
+    local = MetricsRegistry('')
+    local.register(calls)
+    assert 'calls_total{outcome="ok"} 2' in local.render()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_child_starts_from_zero(tmp_path):
+    registry, calls, _ = make_registry(tmp_path)
+    registry.clear()
+    calls.inc('ok')
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            calls.inc('ok', amount=2)
+            registry.dump()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+    calls.inc('ok', amount=4)
+    # 父进程 1 + 4，子进程 2
+    assert 'calls_total{outcome="ok"} 7' in registry.render()
+    assert len(list(tmp_path.glob('*.json'))) == 2
+
+    registry.clear()
+    assert not list(tmp_path.glob('*.json'))
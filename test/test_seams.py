@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/19 11:05
+# @Author : ltm
+# @Email :
+# @Desc : 实体跨流式窗口接缝、长文档切块接缝时只输出一次且偏移正确，与整段一次分析的结果一致
+
+import pytest
+from presidio_analyzer import PatternRecognizer, Pattern
+from presidio_analyzer.predefined_recognizers import PhoneRecognizer
+
+from src.core.chunking import split_chunks, merge_chunk_results
+from src.core.columnar import ColumnarResults
+from src.core.new_recognizer import IDCardRecognizer
+from src.core.streaming import WindowStream
+
+RECOGNIZERS = [
+    IDCardRecognizer(),
+    PhoneRecognizer(supported_language="zh", context=["电话", "号码", "手机"], supported_regions=('CN',)),
+]
+
+# 与身份证重叠的其他类型实体：身份证中的出生日期，以及从身份证末尾跨到后文的片段
+OVERLAPPING_RECOGNIZERS = [
+    PatternRecognizer('ID_BIRTH', patterns=[Pattern('birth', r'(?<=\d{6})(19|20)\d{6}(?=\d{3}[\dxX])', 0.5)],
+                      supported_language='zh'),
+    PatternRecognizer('ID_TAIL', patterns=[Pattern('tail', r'\d{3}[\dxX]，电话', 0.5)], supported_language='zh'),
+]
+
+ID_CARD = '411323198303155953'
+PHONE = '13122832932'
+BODY = f'身份证号码是{ID_CARD}，电话{PHONE}\n手机{PHONE}和{ID_CARD}，再联系'
+
+WINDOW_SIZE = 64
+OVERLAP = 20  # 大于最长实体（身份证 18 位）
+
+
+def analyze(text, recognizers=RECOGNIZERS):
+    results = []
+    for recognizer in recognizers:
+        for r in recognizer.analyze(text, recognizer.supported_entities, None):
+            results.append({'entity_type': r.entity_type, 'start': r.start, 'end': r.end, 'score': r.score})
+    return sorted(results, key=lambda r: (r['start'], r['end'], r['entity_type']))
+
+
+def texts():
+    # 前面填充不同长度的文字，使每个实体依次跨过每个接缝位置
+    for shift in range(WINDOW_SIZE):
+        yield '文' * shift + BODY + '结束' * 40
+
+
+def stream_analyze(text, piece_size, recognizers=RECOGNIZERS):
+    stream = WindowStream(WINDOW_SIZE, OVERLAP)
+    chunks = []
+
+    def drain(final):
+        while True:
+            window = stream.next_window(final)
+            if window is None:
+                return
+            chunks.append(stream.commit(window, analyze(window.text, recognizers)))
+
+    for pos in range(0, len(text), piece_size):
+        stream.feed(text[pos:pos + piece_size])
+        drain(False)
+    drain(True)
+    return chunks
+
+
+@pytest.mark.parametrize('overlapping', [False, True])
+@pytest.mark.parametrize('piece_size', [7, 50, 1000])
+def test_window_stream_seams(piece_size, overlapping):
+    recognizers = RECOGNIZERS + OVERLAPPING_RECOGNIZERS if overlapping else RECOGNIZERS
+    for text in texts():
+        expected = analyze(text, recognizers)
+        assert len(expected) == (7 if overlapping else 4)
+
+        chunks = stream_analyze(text, piece_size, recognizers)
+        assert ''.join(chunk.text for chunk in chunks) == text
+        assert len(chunks) > 1
+
+        results = []
+        for chunk in chunks:
+            assert text[chunk.offset:chunk.offset + len(chunk.text)] == chunk.text
+            for r in chunk.results:
+                # 实体完整地落在输出它的片段内，可以按片段脱敏
+                assert 0 <= r['start'] < r['end'] <= len(chunk.text)
+                results.append(dict(r, start=r['start'] + chunk.offset, end=r['end'] + chunk.offset))
+        assert sorted(results, key=lambda r: (r['start'], r['end'], r['entity_type'])) == expected
+
+
+@pytest.mark.parametrize('overlapping', [False, True])
+@pytest.mark.parametrize('chunk_size', [16, 30, 45])
+def test_chunk_seams(chunk_size, overlapping):
+    recognizers = RECOGNIZERS + OVERLAPPING_RECOGNIZERS if overlapping else RECOGNIZERS
+    for text in texts():
+        expected = analyze(text, recognizers)
+
+        chunks = split_chunks(text, chunk_size, OVERLAP)
+        assert len(chunks) > 1
+        assert [chunk.own_start for chunk in chunks[1:]] == [chunk.own_end for chunk in chunks[:-1]]
+        assert chunks[0].own_start == 0 and chunks[-1].own_end == len(text)
+
+        chunk_results = []
+        for chunk in chunks:
+            rows = ((r['entity_type'], r['start'], r['end'], r['score'], None)
+                    for r in analyze(text[chunk.start:chunk.end], recognizers))
+            chunk_results.append(ColumnarResults.from_rows(rows))
+        merged = merge_chunk_results(chunks, chunk_results).to_records()
+        assert sorted(merged, key=lambda r: (r['start'], r['end'], r['entity_type'])) == expected
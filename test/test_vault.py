@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# @Time : 2026/10/19 10:25
+# @Author : ltm
+# @Email :
+# @Desc : 假名库：pseudonymize -> deanonymize 往返、租户隔离、write-behind 写入后跨实例加载
+
+import os
+import stat
+
+import pytest
+from presidio_anonymizer import AnonymizerEngine
+from presidio_anonymizer.entities import OperatorConfig, RecognizerResult
+
+from src.core import vault
+from src.core.vault import PseudonymVault, PSEUDONYMIZE
+
+SEED = 'test-seed'
+TEXT = '我叫李雷，电话13122832932，身份证411323198303155953'
+RESULTS = [
+    RecognizerResult('PERSON', 2, 4, 0.85),
+    RecognizerResult('PHONE_NUMBER', 7, 18, 0.75),
+    RecognizerResult('ID_CARD', 22, 40, 0.9),
+]
+
+
+@pytest.fixture
+def vault_path(tmp_path):
+    return str(tmp_path / 'vault' / 'vault.sqlite')
+
+
+@pytest.fixture
+def pseudonym_vault(vault_path, monkeypatch):
+    # 后台线程不主动写入，由测试调用 flush
+    instance = PseudonymVault(vault_path, flush_interval=3600)
+    monkeypatch.setattr(vault, 'pseudonym_vault', instance)
+    return instance
+
+
+def pseudonymize(text, tenant):
+    conf = OperatorConfig(PSEUDONYMIZE, {'tenant': tenant, 'seed': SEED})
+    return AnonymizerEngine().anonymize(text, RESULTS, {'DEFAULT': conf}).text
+
+
+def test_round_trip(pseudonym_vault):
+    anonymized = pseudonymize(TEXT, 'a')
+    for result in RESULTS:
+        assert TEXT[result.start:result.end] not in anonymized
+
+    restored, items = pseudonym_vault.restore('a', anonymized)
+    assert restored == TEXT
+    assert [(item['entity_type'], item['text']) for item in items] == \
+           [(result.entity_type, TEXT[result.start:result.end]) for result in RESULTS]
+    for item in items:
+        assert restored[item['start']:item['end']] == item['text']
+        assert item['pseudonym'] in anonymized
+
+    # 同一租户再次出现的原值复用同一替换值
+    assert pseudonymize(TEXT, 'a') == anonymized
+
+
+def test_tenant_isolation(pseudonym_vault):
+    anonymized = pseudonymize(TEXT, 'a')
+    assert pseudonym_vault.restore('b', anonymized) == (anonymized, [])
+
+    other = pseudonym_vault.pseudonym('b', 'PERSON', '韩梅梅', SEED)
+    assert pseudonym_vault.restore('a', other) == (other, [])
+    assert pseudonym_vault.restore('b', other)[0] == '韩梅梅'
+
+
+def test_flush_and_reload(pseudonym_vault, vault_path):
+    anonymized = pseudonymize(TEXT, 'a')
+    pseudonym_vault.pseudonym('b', 'PERSON', '韩梅梅', SEED)
+
+    # 写入前其他实例看不到新映射
+    assert PseudonymVault(vault_path).restore('a', anonymized) == (anonymized, [])
+
+    assert pseudonym_vault.flush() == len(RESULTS) + 1
+    assert pseudonym_vault.stats()['pending'] == 0
+
+    reloaded = PseudonymVault(vault_path)
+    assert reloaded.restore('a', anonymized)[0] == TEXT
+    assert reloaded.restore('b', anonymized) == (anonymized, [])
+    # 重新加载的实例复用已有替换值，不再生成新的
+    person = TEXT[RESULTS[0].start:RESULTS[0].end]
+    assert reloaded.pseudonym('a', 'PERSON', person, SEED) == pseudonym_vault.pseudonym('a', 'PERSON', person, SEED)
+    assert reloaded.stats()['pending'] == 0
+
+
+def test_vault_file_is_private(pseudonym_vault, vault_path):
+    pseudonymize(TEXT, 'a')
+    pseudonym_vault.flush()
+    for path in (vault_path, vault_path + '-wal', vault_path + '-shm'):
+        if os.path.exists(path):
+            assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(os.path.dirname(vault_path)).st_mode) == 0o700
+
+
+def test_memory_vault_refused_for_multi_worker_deanonymize(monkeypatch):
+    monkeypatch.setattr(vault, 'VAULT_BACKEND', 'memory')
+    monkeypatch.setattr(vault, 'DEANONYMIZE_ENABLED', 1)
+    monkeypatch.setattr(vault, 'WORKERS', 4)
+    with pytest.raises(ValueError, match='PII_VAULT_BACKEND=sqlite'):
+        vault.create_vault()
+
+    monkeypatch.setattr(vault, 'WORKERS', 1)
+    assert vault.create_vault().path is None